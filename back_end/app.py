@@ -1,14 +1,27 @@
-from flask import Flask, request, render_template_string, jsonify
+from flask import Flask, request, render_template_string, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
 import json
-import re
 from dotenv import load_dotenv
-from perplexity import Perplexity
-from PIL import Image, ImageChops, ImageStat
-from PIL.ExifTags import TAGS
-import joblib
 import io
+import copy
+import time
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+import multiprocessing
+import atexit
+import contextvars
+from contextlib import nullcontext
+from verdict_cache import VerdictCache, claim_key
+from singleflight import SingleFlight
+from history_store import VerificationHistory
+from heuristics import HeuristicEngine
+from engines import EngineRegistry
+from ensemble import LegacyEnsemble, ensemble_inputs, load_ensemble, meta_analysis_dicts
+import metrics
+from llm_json import parse_verdict, InvalidLLMResponse
+from scheduler import LLMScheduler, RateLimitedError, INTERACTIVE, BATCH, set_caller, client_id, api_key_digests
+from upstream import CircuitBreaker, ResilientUpstream, UpstreamUnavailableError, CircuitOpenError
 
 # Load environment variables
 load_dotenv()
@@ -16,28 +29,480 @@ api_key = os.getenv('PERPLEXITY_API_KEY')
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
+# Reject oversized uploads before they are read into the worker
+app.config['MAX_CONTENT_LENGTH'] = int(os.getenv('MAX_UPLOAD_BYTES', str(32 * 1024 * 1024)))
 
-# Initialize Perplexity Client
-client = None
-if api_key:
-    client = Perplexity(api_key=api_key)
-else:
+# Heavy engines (LLM client, local model, indexes, image forensics) are registered here
+# and loaded by their loader, which also does the expensive imports. STARTUP_MODE=eager
+# (default) loads them all at import time; STARTUP_MODE=lazy leaves them cold so the
+# process is up in a fraction of the time, loads each one on first use and, unless
+# STARTUP_WARMUP=0, warms them on a background thread. /api/ready reports progress.
+STARTUP_MODE = 'lazy' if os.getenv('STARTUP_MODE', 'eager').lower() == 'lazy' else 'eager'
+STARTUP_WARMUP = os.getenv('STARTUP_WARMUP', '1') == '1'
+# Spawned image-pool workers re-run the parent's main script as __mp_main__ before they
+# start. When that script is this module (python app.py), the workers must not load
+# engines or open the stores below: they only ever run image_forensics.
+POOL_WORKER_IMPORT = __name__ == '__mp_main__'
+engine_registry = EngineRegistry()
+engine_registry.mode = STARTUP_MODE
+
+if not api_key:
     print("Warning: PERPLEXITY_API_KEY not found in .env")
 
-# Load local NLP model and vectorizer for classical fake-news classification
-ml_model = None
-ml_vectorizer = None
-try:
-    model_path = os.path.join(os.path.dirname(__file__), 'model.pkl')
-    vectorizer_path = os.path.join(os.path.dirname(__file__), 'vectorizer.pkl')
+def load_llm_client():
+    # Retries are handled by the upstream wrapper below
+    if not api_key:
+        return None
+    from perplexity import Perplexity
+    return Perplexity(api_key=api_key, max_retries=0)
+
+llm_client_engine = engine_registry.register('llm_client', load_llm_client)
+
+def get_client():
+    return llm_client_engine.get()
+
+# Deadlines, retries with jittered backoff and a circuit breaker for Perplexity calls.
+# While the breaker is open, verification falls back to the local model.
+upstream = ResilientUpstream(
+    CircuitBreaker(
+        failure_threshold=int(os.getenv('UPSTREAM_BREAKER_THRESHOLD', '5')),
+        reset_seconds=float(os.getenv('UPSTREAM_BREAKER_RESET_SECONDS', '30'))
+    ),
+    max_attempts=int(os.getenv('UPSTREAM_MAX_ATTEMPTS', '3')),
+    attempt_timeout=float(os.getenv('UPSTREAM_ATTEMPT_TIMEOUT_SECONDS', '30')),
+    deadline=float(os.getenv('UPSTREAM_DEADLINE_SECONDS', '60')),
+    backoff_base=float(os.getenv('UPSTREAM_BACKOFF_BASE_SECONDS', '0.5')),
+    backoff_max=float(os.getenv('UPSTREAM_BACKOFF_MAX_SECONDS', '8')),
+    connect_timeout=float(os.getenv('UPSTREAM_CONNECT_TIMEOUT_SECONDS', '5'))
+)
+
+# Local NLP model and vectorizer for classical fake-news classification
+# MODEL_PATH / VECTORIZER_PATH can point at alternative artifacts, e.g. from `train.py --mode stream`
+model_path = os.getenv('MODEL_PATH') or os.path.join(os.path.dirname(__file__), 'model.pkl')
+vectorizer_path = os.getenv('VECTORIZER_PATH') or os.path.join(os.path.dirname(__file__), 'vectorizer.pkl')
+lean_model_path = os.getenv('LEAN_MODEL_PATH', os.path.join(os.path.dirname(__file__), 'model_lean'))
+
+def load_local_model():
+    # (model, vectorizer), or None when no artifact is available
+    # The lean NumPy artifact (see lean_model.py) is preferred: it loads without scikit-learn
+    if lean_model_path and os.path.isdir(lean_model_path):
+        try:
+            from lean_model import LeanScorer
+            scorer = LeanScorer.load(lean_model_path, source_paths=[model_path, vectorizer_path])
+            print("Loaded lean NumPy model for TruthLense.")
+            return scorer, scorer
+        except Exception as e:
+            print(f"Warning: Failed to load lean model, falling back to pickles: {e}")
     if os.path.exists(model_path) and os.path.exists(vectorizer_path):
-        ml_model = joblib.load(model_path)
-        ml_vectorizer = joblib.load(vectorizer_path)
+        import joblib
+        model = joblib.load(model_path)
+        vectorizer = joblib.load(vectorizer_path)
         print("Loaded local NLP model and vectorizer for TruthLense.")
-    else:
-        print("Warning: model.pkl or vectorizer.pkl not found; local NLP model disabled.")
+        return model, vectorizer
+    print("Warning: model.pkl or vectorizer.pkl not found; local NLP model disabled.")
+    return None
+
+local_model_engine = engine_registry.register('local_model', load_local_model)
+
+def get_local_model():
+    return local_model_engine.get() or (None, None)
+
+def vectorizer_fingerprint(vectorizer):
+    # Identifies the vector space of the loaded vectorizer, so vectors stored by the
+    # claim index are not compared against a retrained or different one
+    from lean_model import LeanScorer, file_sha256
+    if isinstance(vectorizer, LeanScorer):
+        names = ('vocab.npy', 'idf.npy', 'meta.json')
+        return 'lean:' + ':'.join(file_sha256(os.path.join(lean_model_path, name))[:16] for name in names)
+    return 'pickle:' + file_sha256(vectorizer_path)[:16]
+
+# Calibrated combination of LLM, local model and heuristics fitted by `train.py` (see
+# ensemble.py). Without ensemble.json, or with ENSEMBLE_PATH='', the legacy fixed
+# weights are used.
+legacy_ensemble = LegacyEnsemble()
+
+def load_ensemble_scorer():
+    path = os.getenv('ENSEMBLE_PATH', os.path.join(os.path.dirname(__file__), 'ensemble.json'))
+    return load_ensemble(path, source_paths=[model_path, vectorizer_path])
+
+ensemble_engine = engine_registry.register('ensemble', load_ensemble_scorer)
+
+def get_ensemble():
+    return ensemble_engine.get() or legacy_ensemble
+
+# Process pool for /api/analyze-image/batch: JPEG decode/encode is CPU-bound and holds the GIL.
+# Created on first use with the spawn start method so workers never inherit threads or sockets.
+# Workers run image_forensics.analyze_image_bytes, which never imports this module.
+IMAGE_POOL_WORKERS = int(os.getenv('IMAGE_POOL_WORKERS', str(os.cpu_count() or 1)))
+IMAGE_BATCH_MAX_FILES = int(os.getenv('IMAGE_BATCH_MAX_FILES', '1000'))
+IMAGE_BATCH_MAX_BYTES = int(os.getenv('IMAGE_BATCH_MAX_BYTES', str(512 * 1024 * 1024)))
+IMAGE_MAX_BYTES = int(os.getenv('IMAGE_MAX_BYTES', str(32 * 1024 * 1024)))
+image_executor = None
+
+def get_image_executor():
+    global image_executor
+    if image_executor is None:
+        image_executor = ProcessPoolExecutor(
+            max_workers=IMAGE_POOL_WORKERS,
+            mp_context=multiprocessing.get_context('spawn')
+        )
+    return image_executor
+
+# Perceptual-hash index of analyzed images: earlier uploads of the same picture, even
+# resized or recompressed, are reported as "seen before" with their verdict summary.
+def load_image_hash_index():
+    if os.getenv('IMAGE_HASH_INDEX_ENABLED', '1') != '1':
+        return None
+    from image_hash import ImageHashIndex
+    return ImageHashIndex(
+        max_distance=int(os.getenv('IMAGE_HASH_MAX_DISTANCE', '8')),
+        path=os.getenv('IMAGE_HASH_INDEX_PATH', os.path.join(os.path.dirname(__file__), 'image_hash_index.jsonl')) or None,
+        max_entries=int(os.getenv('IMAGE_HASH_MAX_ENTRIES', '10000'))
+    )
+
+# Image forensics pulls in PIL, so it is only imported once an image route needs it
+def load_image_forensics():
+    import image_forensics
+    return image_forensics
+
+# Verdict cache shared by the form route and /api/verify.
+# Set VERDICT_CACHE_DB to a file path to keep verdicts across restarts.
+verdict_cache = VerdictCache(
+    max_entries=int(os.getenv('VERDICT_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=float(os.getenv('VERDICT_CACHE_TTL_SECONDS', str(7 * 24 * 3600))),
+    db_path=None if POOL_WORKER_IMPORT else os.getenv('VERDICT_CACHE_DB') or None
+)
+
+# Near-duplicate index over verified claims, built on the fitted TF-IDF vectorizer.
+# Paraphrases whose cosine similarity clears the threshold reuse the stored verdict.
+def load_claim_index():
+    _, vectorizer = get_local_model()
+    if vectorizer is None or os.getenv('CLAIM_INDEX_ENABLED', '1') != '1':
+        return None
+    from claim_index import ClaimIndex
+    index = ClaimIndex(
+        vectorizer,
+        threshold=float(os.getenv('CLAIM_INDEX_THRESHOLD', '0.8')),
+        path=os.getenv('CLAIM_INDEX_PATH', os.path.join(os.path.dirname(__file__), 'claim_index.jsonl')) or None,
+        # Reused verdicts expire with the verdict cache
+        ttl_seconds=verdict_cache.ttl_seconds,
+        fingerprint=vectorizer_fingerprint(vectorizer),
+        max_entries=int(os.getenv('CLAIM_INDEX_MAX_ENTRIES', '50000'))
+    )
+    print(f"Loaded claim similarity index with {len(index)} claims.")
+    return index
+
+# Registered after the local model it depends on, so warm-up loads them in order
+# The image engines only serve the image routes, so readiness does not wait for them
+claim_index_engine = engine_registry.register('claim_index', load_claim_index)
+image_hash_engine = engine_registry.register('image_hash_index', load_image_hash_index, required=False)
+image_forensics_engine = engine_registry.register('image_forensics', load_image_forensics, required=False)
+
+if STARTUP_MODE == 'eager' and not POOL_WORKER_IMPORT:
+    engine_registry.warm_all()
+elif STARTUP_WARMUP and not POOL_WORKER_IMPORT:
+    engine_registry.start_background()
+
+# History of every answered verification, searchable via /api/history.
+# Writes are batched on a background thread; set HISTORY_DB to '' to turn it off.
+history_store = None
+history_db = '' if POOL_WORKER_IMPORT else os.getenv('HISTORY_DB', os.path.join(os.path.dirname(__file__), 'history.db'))
+if history_db:
+    try:
+        history_store = VerificationHistory(
+            history_db,
+            batch_size=int(os.getenv('HISTORY_BATCH_SIZE', '256')),
+            flush_seconds=float(os.getenv('HISTORY_FLUSH_SECONDS', '0.5')),
+            queue_size=int(os.getenv('HISTORY_QUEUE_SIZE', '10000'))
+        )
+        atexit.register(history_store.close)
+    except Exception as e:
+        print(f"Warning: Failed to open verification history: {e}")
+HISTORY_PAGE_MAX = int(os.getenv('HISTORY_PAGE_MAX', '100'))
+
+# Text heuristics; HEURISTICS_PHRASES_PATH points at a custom sensational-phrase list
+try:
+    heuristic_engine = HeuristicEngine.from_file(os.getenv('HEURISTICS_PHRASES_PATH') or None)
 except Exception as e:
-    print(f"Warning: Failed to load local NLP model: {e}")
+    print(f"Warning: Failed to load sensational phrases: {e}")
+    heuristic_engine = HeuristicEngine([])
+
+# Concurrent requests for the same normalized claim share one upstream LLM call.
+llm_flight = SingleFlight()
+
+# /api/verify/batch fans each request's LLM calls out over at most BATCH_LLM_CONCURRENCY
+# threads of its own. There is no shared pool for a big batch to queue ahead of everyone
+# else in: all calls wait in the LLM scheduler, which takes clients in turn.
+BATCH_MAX_ITEMS = int(os.getenv('BATCH_MAX_ITEMS', '500'))
+BATCH_LLM_CONCURRENCY = int(os.getenv('BATCH_LLM_CONCURRENCY', '8'))
+
+# Fair sharing of upstream LLM capacity (see scheduler.py): uncached LLM calls take one of
+# LLM_SCHEDULER_CONCURRENCY slots, interactive calls are weighted over /api/verify/batch,
+# and LLM_CLIENT_RATE > 0 adds a per-client token bucket (known API key or IP)
+llm_scheduler = LLMScheduler(
+    capacity=int(os.getenv('LLM_SCHEDULER_CONCURRENCY', '8')),
+    weights={
+        INTERACTIVE: float(os.getenv('LLM_WEIGHT_INTERACTIVE', '4')),
+        BATCH: float(os.getenv('LLM_WEIGHT_BATCH', '1'))
+    },
+    max_queue={
+        INTERACTIVE: int(os.getenv('LLM_QUEUE_MAX_INTERACTIVE', '200')),
+        BATCH: int(os.getenv('LLM_QUEUE_MAX_BATCH', '1000'))
+    },
+    rate=float(os.getenv('LLM_CLIENT_RATE', '0')),
+    burst=float(os.getenv('LLM_CLIENT_BURST', '60')),
+    queue_timeout=float(os.getenv('LLM_QUEUE_TIMEOUT_SECONDS', '30'))
+)
+# Only honour X-Forwarded-For behind a proxy that sets it; TRUSTED_PROXY_HOPS is how
+# many proxies sit in front of the app
+TRUST_PROXY_HEADERS = os.getenv('TRUST_PROXY_HEADERS', '0') == '1'
+TRUSTED_PROXY_HOPS = int(os.getenv('TRUSTED_PROXY_HOPS', '1'))
+# X-API-Key values that name their own rate-limit bucket (comma-separated); callers
+# without one of them are limited by address
+LLM_CLIENT_API_KEYS = api_key_digests(k.strip() for k in os.getenv('LLM_CLIENT_API_KEYS', '').split(','))
+
+def request_client_id(api_key, remote_addr, forwarded_for):
+    return client_id(
+        api_key, remote_addr, forwarded_for if TRUST_PROXY_HEADERS else None,
+        LLM_CLIENT_API_KEYS, TRUSTED_PROXY_HOPS
+    )
+
+# Unparseable LLM answers get one targeted "reformat as JSON" follow-up on a cheaper model
+LLM_REASK_ENABLED = os.getenv('LLM_REASK_ENABLED', '1') == '1'
+LLM_REASK_MODEL = os.getenv('LLM_REASK_MODEL', 'sonar')
+LLM_REASK_MAX_CHARS = int(os.getenv('LLM_REASK_MAX_CHARS', '8000'))
+
+# Prometheus-style metrics at /metrics; SERVER_TIMING_ENABLED=1 also reports each
+# request's stage durations to the client in a Server-Timing header
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', '1') == '1'
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING_ENABLED', '0') == '1'
+
+# (server, SingleFlight) pairs reported by /metrics; asgi.py adds its async one
+single_flights = [('wsgi', llm_flight)]
+
+def collect_cache_metrics():
+    lookups = metrics.Counter('truthlense_cache_lookups_total', 'Cache and index lookups by result.', ['cache', 'result'])
+    entries = metrics.Gauge('truthlense_cache_entries', 'Entries held by each cache and index.', ['cache'])
+    hit_ratio = metrics.Gauge('truthlense_cache_hit_ratio', 'Fraction of lookups answered by each cache since start.', ['cache'])
+    flights = metrics.Counter('truthlense_llm_single_flight_total', 'Uncached LLM fetches by single-flight outcome.', ['server', 'outcome'])
+    flights_in_flight = metrics.Gauge('truthlense_llm_single_flight_in_flight', 'Distinct claims with an LLM call in flight.', ['server'])
+
+    sources = [('verdict', verdict_cache.stats())]
+    # peek(): a scrape reports what is loaded and never triggers a load itself
+    claim_index = claim_index_engine.peek()
+    if claim_index is not None:
+        sources.append(('semantic_index', claim_index.stats()))
+    image_hash_index = image_hash_engine.peek()
+    if image_hash_index is not None:
+        sources.append(('image_hash_index', image_hash_index.stats()))
+    for name, stats in sources:
+        lookups.inc(stats['hits'], cache=name, result='hit')
+        lookups.inc(stats['misses'], cache=name, result='miss')
+        entries.set(stats['size'], cache=name)
+        total = stats['hits'] + stats['misses']
+        hit_ratio.set(round(stats['hits'] / total, 4) if total else 0.0, cache=name)
+
+    for server, flight in single_flights:
+        stats = flight.stats()
+        flights.inc(stats['executions'], server=server, outcome='executed')
+        flights.inc(stats['coalesced'], server=server, outcome='coalesced')
+        flights_in_flight.set(stats['in_flight'], server=server)
+    return [lookups, entries, hit_ratio, flights, flights_in_flight]
+
+metrics.REGISTRY.add_collector(collect_cache_metrics)
+
+def collect_upstream_metrics():
+    state = metrics.Gauge('truthlense_upstream_circuit_state', 'Circuit breaker state (1 for the current state).', ['state'])
+    failures = metrics.Gauge('truthlense_upstream_consecutive_failures', 'Consecutive retryable upstream failures.')
+    stats = upstream.breaker.stats()
+    for name in (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN):
+        state.set(1 if stats['state'] == name else 0, state=name)
+    failures.set(stats['consecutive_failures'])
+
+    queued = metrics.Gauge('truthlense_llm_scheduler_queue_depth', 'LLM calls waiting for a slot, by priority.', ['priority'])
+    active = metrics.Gauge('truthlense_llm_scheduler_active', 'LLM slots currently held.')
+    scheduler_stats = llm_scheduler.stats()
+    for priority, depth in scheduler_stats['queued'].items():
+        queued.set(depth, priority=priority)
+    active.set(scheduler_stats['active'])
+    return [state, failures, queued, active]
+
+metrics.REGISTRY.add_collector(collect_upstream_metrics)
+
+def collect_history_metrics():
+    if history_store is None:
+        return []
+    rows = metrics.Counter('truthlense_history_rows_total', 'Verification history rows by outcome.', ['outcome'])
+    queued = metrics.Gauge('truthlense_history_queue_depth', 'History rows waiting for the background writer.')
+    stats = history_store.stats()
+    rows.inc(stats['written'], outcome='written')
+    rows.inc(stats['dropped'], outcome='dropped')
+    queued.set(stats['queued'])
+    return [rows, queued]
+
+metrics.REGISTRY.add_collector(collect_history_metrics)
+
+def build_fact_check_prompt(text):
+    return (
+        "Act as a universal fact-checking assistant with access to historical records dating back to the 1800s and 1900s. "
+        "For the following statement, provide a verdict (TRUE, FALSE, MIXED, UNVERIFIABLE), confidence score (0-100%), "
+        "and a concise but thorough explanation including relevant historical evidence, scientific findings, and authoritative references. "
+        "Crucially, investigate historical context to see if this claim has roots in the 19th or 20th centuries. "
+        "List sources and indicate the first time the claim was verified or disproven in history, plus the last update.\n\n"
+        f"Statement: '{text}'\n\n"
+        "Respond ONLY in valid JSON format with the following keys: "
+        "'verdict' (enum: TRUE, FALSE, MIXED, UNVERIFIABLE), "
+        "'confidence' (string, e.g. '95%'), "
+        "'explanation' (string), "
+        "'historical_context' (string), "
+        "'first_verified' (string, date or era), "
+        "'last_updated' (string, date or era), "
+        "'sources' (list of strings)."
+    )
+
+def build_json_repair_prompt(content, error):
+    # Follow-up for an answer that could not be parsed: reformat only, no new research
+    return (
+        "The answer below was supposed to be a single JSON object but could not be used "
+        f"({'; '.join(error.problems)}). Rewrite it as exactly one valid JSON object with the keys "
+        "'verdict' (one of TRUE, FALSE, MIXED, UNVERIFIABLE), 'confidence' (string, e.g. '95%'), "
+        "'explanation', 'historical_context', 'first_verified', 'last_updated' (strings) and "
+        "'sources' (list of strings). Keep the original content; do not research again. "
+        "Output only the JSON.\n\n"
+        f"Answer:\n{content[:LLM_REASK_MAX_CHARS]}"
+    )
+
+def parse_llm_content(content):
+    # Tolerant extraction + schema coercion (see llm_json.py); raises InvalidLLMResponse
+    with metrics.stage('parse'):
+        try:
+            result, repairs = parse_verdict(content or "")
+        except InvalidLLMResponse:
+            metrics.LLM_PARSE_FAILURES.inc()
+            raise
+        for repair in repairs:
+            metrics.LLM_JSON_REPAIRS.inc(repair=repair)
+        return result
+
+def ask_perplexity(text):
+    def attempt(timeout):
+        with metrics.upstream_call():
+            return get_client().chat.completions.create(
+                model="sonar-pro",
+                messages=[
+                    {"role": "system", "content": "You are a rigorous fact-checking AI that outputs only valid JSON."},
+                    {"role": "user", "content": build_fact_check_prompt(text)}
+                ],
+                timeout=timeout
+            )
+
+    content = upstream.call(attempt).choices[0].message.content
+    try:
+        return parse_llm_content(content)
+    except InvalidLLMResponse as e:
+        if not LLM_REASK_ENABLED:
+            raise
+        return reask_for_json(content, e)
+
+def reask_for_json(content, error):
+    # One cheap reformatting call instead of repeating the whole fact-check
+    def attempt(timeout):
+        with metrics.upstream_call():
+            return get_client().chat.completions.create(
+                model=LLM_REASK_MODEL,
+                messages=[
+                    {"role": "system", "content": "You convert text into valid JSON. Output only JSON."},
+                    {"role": "user", "content": build_json_repair_prompt(content or "", error)}
+                ],
+                timeout=timeout
+            )
+
+    try:
+        result = parse_llm_content(upstream.call(attempt).choices[0].message.content)
+    except InvalidLLMResponse:
+        metrics.LLM_REASKS.inc(outcome='failed')
+        raise
+    metrics.LLM_REASKS.inc(outcome='ok')
+    return result
+
+def lookup_verdict(key, text):
+    with metrics.stage('cache'):
+        # Exact normalized-claim cache first, then the near-duplicate index
+        cached = verdict_cache.get_by_key(key)
+        if cached is not None:
+            return cached
+
+        claim_index = claim_index_engine.get()
+        if claim_index is not None:
+            match = claim_index.lookup(text)
+            if match is not None:
+                result = match['verdict']
+                result['near_duplicate_of'] = {
+                    'claim': match['text'],
+                    'similarity': match['similarity']
+                }
+                # Cached only for what is left of the original verdict's TTL
+                remaining = match['expires_at'] - time.time() if match['expires_at'] is not None else None
+                verdict_cache.set_by_key(key, result, ttl_seconds=remaining)
+                return result
+        return None
+
+def remember_verdict(key, text, result):
+    # A reply that was cut off is served to this request only, not cached or indexed
+    if result.get('truncated'):
+        return
+    verdict_cache.set_by_key(key, result)
+    claim_index = claim_index_engine.get()
+    if claim_index is not None:
+        try:
+            claim_index.add(key, text, result)
+        except Exception as e:
+            print(f"Warning: Failed to index verified claim: {e}")
+
+def llm_charge():
+    # Charges the caller's token bucket; calls the open breaker will refuse anyway answer
+    # from the local model without being counted or queued
+    if upstream.breaker.state != CircuitBreaker.OPEN:
+        llm_scheduler.charge()
+
+def llm_slot():
+    # A capacity slot for a caller that already paid its token with llm_charge()
+    if upstream.breaker.state == CircuitBreaker.OPEN:
+        return nullcontext()
+    return llm_scheduler.slot(charged=True)
+
+def request_priority(path, headers):
+    # Batch traffic is always low priority; other callers may opt down with X-Priority: batch
+    if path == '/api/verify/batch' or (headers.get('X-Priority') or '').lower() == BATCH:
+        return BATCH
+    return INTERACTIVE
+
+def rate_limited_result(error):
+    return {'error': str(error), 'retry_after': error.retry_after, 'rate_limited': True}
+
+def fact_check(text):
+    # Return the LLM verdict for a claim, reusing a cached verdict for the same or a near-duplicate claim
+    key = claim_key(text)
+    cached = lookup_verdict(key, text)
+    if cached is not None:
+        return cached
+
+    def fetch():
+        # Re-check the cache: a flight for this key may have finished while we were missing
+        cached = verdict_cache.get_by_key(key, record_stats=False)
+        if cached is not None:
+            return cached
+        # Only the caller that actually goes upstream waits for a capacity slot
+        with llm_slot():
+            result = ask_perplexity(text)
+        remember_verdict(key, text, result)
+        return result
+
+    # Every caller pays its own token before joining the flight, so a coalesced caller is
+    # still rate-limited as itself, but waiting on the shared call holds no slot
+    llm_charge()
+    # Waiters share the leader's dict, so hand each caller its own copy to mutate
+    return copy.deepcopy(llm_flight.do(key, fetch))
 
 # HTML Template with Loading Animation
 HTML_TEMPLATE = """
@@ -166,43 +631,15 @@ def index():
 
     if request.method == 'POST':
         text = request.form['text']
-        if client:
+        if get_client():
             try:
-                prompt = (
-                    "Act as a universal fact-checking assistant with access to historical records dating back to the 1800s and 1900s. "
-                    "For the following statement, provide a verdict (TRUE, FALSE, MIXED, UNVERIFIABLE), confidence score (0-100%), "
-                    "and a concise but thorough explanation including relevant historical evidence, scientific findings, and authoritative references. "
-                    "Crucially, investigate historical context to see if this claim has roots in the 19th or 20th centuries. "
-                    "List sources and indicate the first time the claim was verified or disproven in history, plus the last update.\n\n"
-                    f"Statement: '{text}'\n\n"
-                    "Respond ONLY in valid JSON format with the following keys: "
-                    "'verdict' (enum: TRUE, FALSE, MIXED, UNVERIFIABLE), "
-                    "'confidence' (string, e.g. '95%'), "
-                    "'explanation' (string), "
-                    "'historical_context' (string), "
-                    "'first_verified' (string, date or era), "
-                    "'last_updated' (string, date or era), "
-                    "'sources' (list of strings)."
-                )
-                
-                response = client.chat.completions.create(
-                    model="sonar-pro",
-                    messages=[
-                        {"role": "system", "content": "You are a rigorous fact-checking AI that outputs only valid JSON."},
-                        {"role": "user", "content": prompt}
-                    ]
-                )
-                
-                content = response.choices[0].message.content
-                # Clean up code blocks if present
-                if "```json" in content:
-                    content = content.split("```json")[1].split("```")[0]
-                elif "```" in content:
-                    content = content.split("```")[1].split("```")[0]
-                
-                result = json.loads(content.strip())
-                
-            except json.JSONDecodeError:
+                result = fact_check(text)
+                record_history(text, result, 'form')
+            except RateLimitedError as e:
+                error = f"Error: Too many requests. Please try again in {e.retry_after}s."
+            except UpstreamUnavailableError:
+                error = "Error: The AI service is temporarily unavailable. Please try again shortly."
+            except InvalidLLMResponse:
                 error = "Error: Failed to parse AI response. Please try again."
             except Exception as e:
                 error = f"Error calling AI API: {str(e)}"
@@ -211,6 +648,136 @@ def index():
 
     return render_template_string(HTML_TEMPLATE, result=result, error=error, text=text)
 
+def run_local_model_batch(texts):
+    # Score every text with the local classifier in one vectorized pass; None where unavailable
+    if not texts:
+        return []
+    with metrics.stage('local_model'):
+        return score_local_model_batch(texts)
+
+def score_local_model_batch(texts):
+    ml_results = [None] * len(texts)
+    ml_model, ml_vectorizer = get_local_model()
+    try:
+        if ml_model is not None and ml_vectorizer is not None:
+            X = ml_vectorizer.transform(texts)
+            if hasattr(ml_model, 'predict_proba'):
+                probas = ml_model.predict_proba(X)
+                for i, proba in enumerate(probas):
+                    fake_prob = float(proba[0])
+                    real_prob = float(proba[1]) if len(proba) > 1 else 1.0 - fake_prob
+                    if real_prob >= fake_prob:
+                        ml_label = 'Real'
+                        ml_conf = real_prob
+                    else:
+                        ml_label = 'Fake'
+                        ml_conf = fake_prob
+                    ml_results[i] = {
+                        'label': ml_label,
+                        'confidence': round(ml_conf * 100, 1),
+                        'raw_probs': {
+                            'real': round(real_prob, 4),
+                            'fake': round(fake_prob, 4)
+                        }
+                    }
+            else:
+                for i, pred in enumerate(ml_model.predict(X)):
+                    ml_label = 'Real' if int(pred) == 1 else 'Fake'
+                    ml_results[i] = {
+                        'label': ml_label,
+                        'confidence': 0
+                    }
+    except Exception as e:
+        print(f"Warning: local NLP model prediction failed: {e}")
+    return ml_results
+
+def run_local_model(text):
+    return run_local_model_batch([text])[0]
+
+def local_only_result(ml_result):
+    # Response used when the LLM is not available, built from the local model only
+    return {
+        'verdict': 'UNVERIFIABLE',
+        'confidence': f"{ml_result['confidence']}%",
+        'explanation': 'LLM fact-checking is unavailable. Showing local classifier output only.',
+        'historical_context': '',
+        'first_verified': '',
+        'last_updated': '',
+        'sources': [],
+        'ml_model': ml_result
+    }
+
+def upstream_fallback_result(ml_result, error):
+    # Degraded answer while the upstream is unavailable: local model only, or an error
+    # carrying retry_after when there is no local model either
+    if ml_result is None:
+        retry_after = upstream.breaker.retry_after() if isinstance(error, CircuitOpenError) else 0
+        return {'error': f'AI service unavailable: {str(error)}', 'retry_after': round(retry_after)}
+    metrics.DEGRADED_RESPONSES.inc()
+    result = local_only_result(ml_result)
+    result['degraded'] = True
+    result['upstream_error'] = str(error)
+    return result
+
+def compute_text_heuristics(text):
+    # Basic text heuristics for extra signal (see heuristics.py)
+    with metrics.stage('heuristics'):
+        return heuristic_engine.extract(text)
+
+def compute_text_heuristics_batch(texts):
+    with metrics.stage('heuristics'):
+        return heuristic_engine.extract_batch(texts)
+
+def compute_meta_analysis_batch(texts, results, ml_results, heuristics=None):
+    # Combined scores for many claims in one vectorized scorer call (see ensemble.py)
+    heuristics = list(heuristics) if heuristics is not None else [None] * len(texts)
+    missing = [i for i, h in enumerate(heuristics) if h is None]
+    if missing:
+        for i, h in zip(missing, compute_text_heuristics_batch([texts[i] for i in missing])):
+            heuristics[i] = h
+    return meta_analysis_dicts(get_ensemble(), ensemble_inputs(results, ml_results, heuristics), heuristics)
+
+def compute_meta_analysis(text, result, ml_result, heuristics=None):
+    return compute_meta_analysis_batch([text], [result], [ml_result], [heuristics])[0]
+
+def attach_local_analysis_batch(texts, results, ml_results, heuristics=None):
+    # Attach local NLP model output if available so frontend can show dual-engine verdicts
+    for result, ml_result in zip(results, ml_results):
+        if ml_result is not None:
+            result['ml_model'] = ml_result
+
+    with metrics.stage('meta_analysis'):
+        metas = compute_meta_analysis_batch(texts, results, ml_results, heuristics)
+    for result, meta in zip(results, metas):
+        result['meta_analysis'] = meta
+    return results
+
+def attach_local_analysis(text, result, ml_result, heuristics=None):
+    return attach_local_analysis_batch([text], [result], [ml_result], [heuristics])[0]
+
+def attach_batch_analysis(texts, results, ml_results, heuristics):
+    # Local analysis for every fresh LLM verdict of a batch in one pass. Errors and
+    # local-only answers (which already carry ml_model) are left as they are.
+    rows = [i for i, r in enumerate(results) if 'error' not in r and 'ml_model' not in r]
+    if rows:
+        attach_local_analysis_batch(
+            [texts[i] for i in rows],
+            [results[i] for i in rows],
+            [ml_results[i] for i in rows],
+            [heuristics[i] for i in rows]
+        )
+    return results
+
+def record_history(text, result, source):
+    # Queue an answered verification for the history store; errors are not recorded
+    if history_store is not None and 'error' not in result:
+        history_store.record(text, result, source)
+
+def verify_text(text, ml_result, heuristics=None):
+    # Full dual-engine verdict for one claim: LLM result + local model + meta analysis.
+    # Raises InvalidLLMResponse / upstream errors for the caller to report.
+    return attach_local_analysis(text, fact_check(text), ml_result, heuristics)
+
 @app.route('/api/verify', methods=['POST'])
 def verify_claim():
     data = request.get_json()
@@ -220,164 +787,287 @@ def verify_claim():
     text = data['text']
 
     # Run local NLP model if available
-    ml_result = None
-    try:
-        if ml_model is not None and ml_vectorizer is not None:
-            X = ml_vectorizer.transform([text])
-            if hasattr(ml_model, 'predict_proba'):
-                proba = ml_model.predict_proba(X)[0]
-                fake_prob = float(proba[0])
-                real_prob = float(proba[1]) if len(proba) > 1 else 1.0 - fake_prob
-                if real_prob >= fake_prob:
-                    ml_label = 'Real'
-                    ml_conf = real_prob
-                else:
-                    ml_label = 'Fake'
-                    ml_conf = fake_prob
-                ml_result = {
-                    'label': ml_label,
-                    'confidence': round(ml_conf * 100, 1),
-                    'raw_probs': {
-                        'real': round(real_prob, 4),
-                        'fake': round(fake_prob, 4)
-                    }
-                }
-            else:
-                pred = ml_model.predict(X)[0]
-                ml_label = 'Real' if int(pred) == 1 else 'Fake'
-                ml_result = {
-                    'label': ml_label,
-                    'confidence': 0
-                }
-    except Exception as e:
-        print(f"Warning: local NLP model prediction failed: {e}")
+    ml_result = run_local_model(text)
 
-    if not client:
+    if not get_client():
         # If LLM is not available, fall back to local model only
         if ml_result is None:
             return jsonify({'error': 'Perplexity API Key not configured and no local model available'}), 500
-        return jsonify({
-            'verdict': 'UNVERIFIABLE',
-            'confidence': f"{ml_result['confidence']}%",
-            'explanation': 'LLM fact-checking is unavailable. Showing local classifier output only.',
-            'historical_context': '',
-            'first_verified': '',
-            'last_updated': '',
-            'sources': [],
-            'ml_model': ml_result
-        })
+        result = local_only_result(ml_result)
+        record_history(text, result, 'api')
+        return jsonify(result)
 
     try:
-        prompt = (
-            "Act as a universal fact-checking assistant with access to historical records dating back to the 1800s and 1900s. "
-            "For the following statement, provide a verdict (TRUE, FALSE, MIXED, UNVERIFIABLE), confidence score (0-100%), "
-            "and a concise but thorough explanation including relevant historical evidence, scientific findings, and authoritative references. "
-            "Crucially, investigate historical context to see if this claim has roots in the 19th or 20th centuries. "
-            "List sources and indicate the first time the claim was verified or disproven in history, plus the last update.\n\n"
-            f"Statement: '{text}'\n\n"
-            "Respond ONLY in valid JSON format with the following keys: "
-            "'verdict' (enum: TRUE, FALSE, MIXED, UNVERIFIABLE), "
-            "'confidence' (string, e.g. '95%'), "
-            "'explanation' (string), "
-            "'historical_context' (string), "
-            "'first_verified' (string, date or era), "
-            "'last_updated' (string, date or era), "
-            "'sources' (list of strings)."
-        )
-        
-        response = client.chat.completions.create(
-            model="sonar-pro",
-            messages=[
-                {"role": "system", "content": "You are a rigorous fact-checking AI that outputs only valid JSON."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-        
-        content = response.choices[0].message.content
-        # Clean up code blocks if present
-        if "```json" in content:
-            content = content.split("```json")[1].split("```")[0]
-        elif "```" in content:
-            content = content.split("```")[1].split("```")[0]
-        
-        result = json.loads(content.strip())
+        result = verify_text(text, ml_result)
+    except RateLimitedError as e:
+        return jsonify(rate_limited_result(e)), 429, {'Retry-After': str(e.retry_after)}
+    except UpstreamUnavailableError as e:
+        result = upstream_fallback_result(ml_result, e)
+        if 'error' in result:
+            return jsonify(result), 503, {'Retry-After': str(max(1, result['retry_after']))}
+    except InvalidLLMResponse:
+        return jsonify({'error': 'Failed to parse AI response'}), 500
+    except Exception as e:
+        return jsonify({'error': f'Error calling AI API: {str(e)}'}), 500
+    record_history(text, result, 'api')
+    return jsonify(result)
 
-        # Attach local NLP model output if available so frontend can show dual-engine verdicts
-        if ml_result is not None:
-            result['ml_model'] = ml_result
+def format_stream_event(event, data, fmt):
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({'event': event, 'data': data}) + "\n"
 
-        # --- Heuristic + combined scoring layer ---
-        # Parse LLM confidence (string like "95%") into a float 0-100
-        llm_conf = 0.0
-        try:
-            if isinstance(result.get('confidence'), str):
-                llm_conf = float(result['confidence'].replace('%', '').strip())
-        except Exception:
-            llm_conf = 0.0
-
-        # Basic text heuristics for extra signal
-        text_len = len(text or "")
-        words = text.split()
-        num_words = len(words)
-        num_exclam = text.count('!')
-        has_all_caps_word = any(len(w) > 4 and w.isupper() for w in words)
-        url_matches = re.findall(r"https?://\S+", text)
-        num_urls = len(url_matches)
-        sensational_phrases = [
-            "you won't believe",
-            "shocking truth",
-            "what they don't want you to know",
-            "breaking news"
-        ]
-        has_sensational_phrase = any(p.lower() in text.lower() for p in sensational_phrases)
-
-        heuristic_risk = 0
-        if num_exclam >= 3:
-            heuristic_risk += 10
-        if has_all_caps_word:
-            heuristic_risk += 10
-        if num_urls >= 2:
-            heuristic_risk += 10
-        if has_sensational_phrase:
-            heuristic_risk += 15
-        if num_words < 8 or num_words > 200:
-            heuristic_risk += 5
-        heuristic_risk = min(40, heuristic_risk)
-
-        # Combined risk score from LLM + local model (+ heuristics)
-        combined_score = llm_conf
-        engines_agree = None
-        ml_conf = ml_result['confidence'] if ml_result and 'confidence' in ml_result else None
-        if ml_result and ml_conf is not None:
-            # If engines agree, average them closer to their agreement; if they disagree, penalize confidence
-            engines_agree = (ml_result.get('label') == ('Real' if result.get('verdict') == 'TRUE' else 'Fake'))
-            if engines_agree:
-                combined_score = (llm_conf * 0.6) + (ml_conf * 0.4)
+@app.route('/api/verify/stream', methods=['POST'])
+def verify_claim_stream():
+    # Progressive variant of /api/verify: local results first, then the LLM verdict,
+    # then the combined meta analysis. NDJSON by default, SSE with ?format=sse.
+    data = request.get_json()
+    if not data or 'text' not in data:
+        return jsonify({'error': 'No text provided'}), 400
+
+    text = data['text']
+    fmt = 'sse' if request.args.get('format') == 'sse' else 'ndjson'
+
+    def generate():
+        ml_result = run_local_model(text)
+        heuristics = compute_text_heuristics(text)
+        yield format_stream_event('ml_model', ml_result, fmt)
+        yield format_stream_event('heuristics', heuristics, fmt)
+
+        if not get_client():
+            if ml_result is None:
+                yield format_stream_event('error', {'error': 'Perplexity API Key not configured and no local model available'}, fmt)
             else:
-                combined_score = max(0, (llm_conf * 0.5) + (ml_conf * 0.5) - 15)
-
-        combined_score = max(0, min(100, combined_score + heuristic_risk * 0.5))
-
-        result['meta_analysis'] = {
-            'combined_confidence_score': round(combined_score, 1),
-            'engines_agree': engines_agree,
-            'heuristics': {
-                'length_chars': text_len,
-                'length_words': num_words,
-                'num_exclamation_marks': num_exclam,
-                'num_urls': num_urls,
-                'has_all_caps_word': has_all_caps_word,
-                'has_sensational_phrase': has_sensational_phrase,
-                'heuristic_risk_bonus': heuristic_risk
-            }
-        }
+                result = local_only_result(ml_result)
+                record_history(text, result, 'stream')
+                yield format_stream_event('result', result, fmt)
+            yield format_stream_event('done', {}, fmt)
+            return
 
-        return jsonify(result)
-        
-    except json.JSONDecodeError:
-        return jsonify({'error': 'Failed to parse AI response'}), 500
+        try:
+            result = fact_check(text)
+        except RateLimitedError as e:
+            yield format_stream_event('error', rate_limited_result(e), fmt)
+            yield format_stream_event('done', {}, fmt)
+            return
+        except UpstreamUnavailableError as e:
+            fallback = upstream_fallback_result(ml_result, e)
+            record_history(text, fallback, 'stream')
+            yield format_stream_event('error' if 'error' in fallback else 'result', fallback, fmt)
+            yield format_stream_event('done', {}, fmt)
+            return
+        except InvalidLLMResponse:
+            yield format_stream_event('error', {'error': 'Failed to parse AI response'}, fmt)
+            yield format_stream_event('done', {}, fmt)
+            return
+        except Exception as e:
+            yield format_stream_event('error', {'error': f'Error calling AI API: {str(e)}'}, fmt)
+            yield format_stream_event('done', {}, fmt)
+            return
+        yield format_stream_event('llm', result, fmt)
+
+        attach_local_analysis(text, result, ml_result, heuristics)
+        record_history(text, result, 'stream')
+        yield format_stream_event('meta_analysis', result['meta_analysis'], fmt)
+        yield format_stream_event('result', result, fmt)
+        yield format_stream_event('done', {}, fmt)
+
+    mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def verify_batch_item(text, ml_result):
+    # Same outcomes as /api/verify, but errors are returned in-place instead of as HTTP statuses.
+    # LLM verdicts come back without local analysis; the batch attaches it in one pass.
+    if not get_client():
+        if ml_result is None:
+            return {'error': 'Perplexity API Key not configured and no local model available'}
+        return local_only_result(ml_result)
+    try:
+        return fact_check(text)
+    except RateLimitedError as e:
+        return rate_limited_result(e)
+    except UpstreamUnavailableError as e:
+        return upstream_fallback_result(ml_result, e)
+    except InvalidLLMResponse:
+        return {'error': 'Failed to parse AI response'}
     except Exception as e:
-        return jsonify({'error': f'Error calling AI API: {str(e)}'}), 500
+        return {'error': f'Error calling AI API: {str(e)}'}
+
+@app.route('/api/verify/batch', methods=['POST'])
+def verify_batch():
+    data = request.get_json(silent=True)
+    if not data or not isinstance(data.get('texts'), list):
+        return jsonify({'error': 'Expected JSON body with a "texts" list'}), 400
+
+    items = data['texts']
+    if not items:
+        return jsonify({'error': 'No texts provided'}), 400
+    if len(items) > BATCH_MAX_ITEMS:
+        return jsonify({'error': f'Batch too large: at most {BATCH_MAX_ITEMS} texts per request'}), 413
+
+    valid = [i for i, t in enumerate(items) if isinstance(t, str) and t.strip()]
+    results = [{'error': 'No text provided'} for _ in items]
+
+    # One vectorizer/predict_proba call and one heuristic pass for the whole batch
+    texts = [items[i] for i in valid]
+    ml_results = run_local_model_batch(texts)
+    heuristics = compute_text_heuristics_batch(texts)
+
+    # Fan the LLM calls out over this request's own bounded pool; results keep input order.
+    # Each task runs in a copy of this request's context so it is scheduled as this caller.
+    fetched = []
+    if texts:
+        workers = min(BATCH_LLM_CONCURRENCY, len(texts))
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify-batch') as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, verify_batch_item, items[i], ml_result)
+                for i, ml_result in zip(valid, ml_results)
+            ]
+            fetched = [future.result() for future in futures]
+    verified = attach_batch_analysis(texts, fetched, ml_results, heuristics)
+    for i, result in zip(valid, verified):
+        results[i] = result
+        record_history(items[i], result, 'batch')
+
+    return jsonify({
+        'count': len(results),
+        'errors': sum(1 for r in results if 'error' in r),
+        'results': results
+    })
+
+@app.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    stats = verdict_cache.stats()
+    stats['single_flight'] = llm_flight.stats()
+    claim_index = claim_index_engine.peek()
+    image_hash_index = image_hash_engine.peek()
+    stats['semantic_index'] = claim_index.stats() if claim_index is not None else None
+    stats['image_hash_index'] = image_hash_index.stats() if image_hash_index is not None else None
+    return jsonify(stats)
+
+def parse_history_time(value):
+    # Unix seconds or an ISO 8601 timestamp (naive means UTC); None if absent
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    moment = datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+@app.route('/api/history', methods=['GET'])
+def history_search():
+    # Paginated history, newest first. Filters: q (full text), text (same normalized claim),
+    # verdict, source, since/until; follow next_cursor for the next page.
+    if history_store is None:
+        return jsonify({'error': 'Verification history is disabled'}), 404
+    args = request.args
+    try:
+        limit = min(max(1, int(args.get('limit', 20))), HISTORY_PAGE_MAX)
+        cursor = int(args['cursor']) if args.get('cursor') else None
+        since = parse_history_time(args.get('since'))
+        until = parse_history_time(args.get('until'))
+    except ValueError:
+        return jsonify({'error': 'limit and cursor must be integers; since/until unix seconds or ISO 8601'}), 400
+    items, next_cursor = history_store.search(
+        q=args.get('q') or None,
+        text=args.get('text'),
+        verdict=(args.get('verdict') or '').upper() or None,
+        source=args.get('source') or None,
+        since=since,
+        until=until,
+        cursor=cursor,
+        limit=limit
+    )
+    return jsonify({'items': items, 'count': len(items), 'next_cursor': next_cursor})
+
+@app.route('/api/history/<int:record_id>', methods=['GET'])
+def history_record(record_id):
+    if history_store is None:
+        return jsonify({'error': 'Verification history is disabled'}), 404
+    item = history_store.get(record_id)
+    if item is None:
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify(item)
+
+@app.route('/api/history/stats', methods=['GET'])
+def history_stats():
+    if history_store is None:
+        return jsonify({'error': 'Verification history is disabled'}), 404
+    return jsonify(history_store.stats())
+
+@app.route('/api/upstream/status', methods=['GET'])
+def upstream_status():
+    status = upstream.stats()
+    status['configured'] = bool(api_key)
+    status['scheduler'] = llm_scheduler.stats()
+    return jsonify(status)
+
+@app.route('/api/ready', methods=['GET'])
+def readiness():
+    # 200 once every required engine has finished loading (or failed to), 503 while
+    # warming up. With STARTUP_WARMUP=0 nothing is warming, so it is 200 from the start.
+    # Liveness needs no route of its own: any answer here means the process is up.
+    status = engine_registry.status()
+    return jsonify(status), 200 if status['ready'] else 503
+
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    if not METRICS_ENABLED:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.before_request
+def start_request_metrics():
+    g.metrics_route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+    g.metrics_start = time.perf_counter()
+    g.metrics_timings = metrics.start_timings()
+    metrics.HTTP_IN_FLIGHT.inc(route=g.metrics_route)
+
+@app.before_request
+def identify_llm_caller():
+    set_caller(
+        request_client_id(request.headers.get('X-API-Key'), request.remote_addr, request.headers.get('X-Forwarded-For')),
+        request_priority(request.path, request.headers)
+    )
+
+@app.after_request
+def record_request_metrics(response):
+    start = g.pop('metrics_start', None)
+    if start is None:
+        return response
+    route = g.metrics_route
+    if SERVER_TIMING_ENABLED:
+        response.headers['Server-Timing'] = metrics.server_timing_header(
+            g.metrics_timings, time.perf_counter() - start
+        )
+
+    def finish():
+        # Called once the body has been sent, so streamed responses count in full
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route=route)
+        metrics.HTTP_REQUESTS.inc(route=route, status=response.status_code)
+        metrics.HTTP_IN_FLIGHT.dec(route=route)
+
+    response.call_on_close(finish)
+    return response
+
+@app.errorhandler(413)
+def request_too_large(e):
+    return jsonify({'error': f"Upload too large: the limit is {request.max_content_length} bytes"}), 413
+
+def annotate_seen_before(result, phash, matches):
+    if phash is not None:
+        from image_hash import format_hash
+        result['perceptual_hash'] = format_hash(phash)
+        result['seen_before'] = matches
+    return result
 
 @app.route('/api/analyze-image', methods=['POST'])
 def analyze_image():
@@ -388,110 +1078,146 @@ def analyze_image():
     if file.filename == '':
         return jsonify({'error': 'No selected file'}), 400
 
+    forensics = image_forensics_engine.get()
+    if forensics is None:
+        return jsonify({'error': 'Image analysis is unavailable'}), 503
+    image_hash_index = image_hash_engine.get()
     try:
-        image = Image.open(file)
-        exif_data = {}
-
-        # Extract EXIF data
-        if hasattr(image, '_getexif'):
-            exif = image._getexif()
-            if exif:
-                for tag_id, value in exif.items():
-                    tag = TAGS.get(tag_id, tag_id)
-                    # Decode bytes to string if necessary
-                    if isinstance(value, bytes):
-                        try:
-                            value = value.decode()
-                        except:
-                            value = str(value)
-                    exif_data[tag] = str(value)
-
-        # Basic Forensic Analysis Simulation (since we don't have a real forensic model yet)
-        # In a real app, we would check for compression artifacts, metadata inconsistencies, etc.
-        software = exif_data.get('Software', 'Unknown')
-        camera = exif_data.get('Model', 'Unknown')
-
-        # Simple heuristic: if 'Photoshop' or 'GIMP' is in software, flag it
-        is_suspicious = 'photoshop' in software.lower() or 'gimp' in software.lower()
-
-        # Lightweight CV-style Error Level Analysis (ELA)
-        ela_score = 0.0
-        ela_summary = ""
-        try:
-            rgb_image = image.convert('RGB')
-            
-            # Use in-memory buffer instead of file to avoid locking issues
-            buffer = io.BytesIO()
-            rgb_image.save(buffer, 'JPEG', quality=90)
-            buffer.seek(0)
-            
-            recompressed = Image.open(buffer).convert('RGB')
-            diff = ImageChops.difference(rgb_image, recompressed)
-            stat = ImageStat.Stat(diff)
-            mean_diff = sum(stat.mean) / (3 * 255.0)
-            ela_score = float(round(mean_diff, 4))
-            if ela_score < 0.02:
-                ela_summary = "Low compression anomalies; image appears structurally consistent."
-            elif ela_score < 0.06:
-                ela_summary = "Moderate localized anomalies; possible light editing."
-            else:
-                ela_summary = "Strong localized anomalies; potential heavy editing or compositing detected."
-        except Exception as e:
-            print(f"ELA Error: {e}")
-            ela_summary = f"ELA analysis unavailable: {e}"
-
-        # Combine metadata suspicion and ELA score into an authenticity score
-        base_score = 95
-        if is_suspicious:
-            base_score -= 40
-        base_score -= min(40, int(ela_score * 100))
-
-        # Additional image heuristics
-        width, height = image.size
-        has_small_resolution = (width * height) < (512 * 512)
-        extreme_aspect_ratio = (width / float(height)) > 3 or (height / float(width)) > 3
-        has_no_exif = len(exif_data) == 0
-
-        tamper_risk = 0
-        if has_small_resolution:
-            tamper_risk += 5
-        if extreme_aspect_ratio:
-            tamper_risk += 5
-        if has_no_exif:
-            tamper_risk += 10
-        if is_suspicious:
-            tamper_risk += 15
-        if ela_score >= 0.06:
-            tamper_risk += 20
-        tamper_risk = max(0, min(100, tamper_risk))
-
-        authenticity_score = max(0, min(100, base_score))
-        verdict = "Tampering Detected" if authenticity_score < 60 or tamper_risk >= 40 else "Original"
-
-        return jsonify({
-            'verdict': verdict,
-            'authenticity_score': authenticity_score,
-            'exif_metadata': {
-                'camera': camera,
-                'software': software,
-                'datetime': exif_data.get('DateTime', 'Unknown')
-            },
-            'ela_score': ela_score,
-            'ela_summary': ela_summary,
-            'tamper_risk': tamper_risk,
-            'forensic_flags': {
-                'has_no_exif': has_no_exif,
-                'is_suspicious_software': is_suspicious,
-                'has_small_resolution': has_small_resolution,
-                'extreme_aspect_ratio': extreme_aspect_ratio,
-                'width': width,
-                'height': height
-            }
-        })
+        phash = None
+        digest = None
+        matches = []
+        if image_hash_index is not None:
+            try:
+                digest = forensics.sha256_image_file(file)
+                phash = forensics.phash_image_file(file)
+                matches = image_hash_index.lookup(phash, sha256=digest)
+            except forensics.ImageTooLargeError:
+                raise
+            except Exception as e:
+                print(f"Warning: perceptual hashing failed: {e}")
+
+        # Matches are only reported: pHash ignores the local edits (a splice, rewritten
+        # EXIF) that ELA and the EXIF check exist to catch, so every upload is analyzed
+        result = forensics.analyze_image_file(file)
+        if phash is not None:
+            image_hash_index.add(phash, result, sha256=digest)
 
+        return jsonify(annotate_seen_before(result, phash, matches))
+    except forensics.ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
         return jsonify({'error': f'Failed to process image: {str(e)}'}), 500
 
+def detach_upload(file):
+    # Flask closes request.files when the view returns, before a streamed response is
+    # consumed; keep a private handle on the spooled upload for the generator instead
+    try:
+        handle = os.fdopen(os.dup(file.stream.fileno()), 'rb')
+        handle.seek(0)
+    except (AttributeError, OSError, io.UnsupportedOperation):
+        handle = io.BytesIO(file.stream.read())
+    return file.filename, handle
+
+def iter_uploaded_images(images, archives, forensics):
+    # (name, bytes or None, error) for every uploaded image and every image inside uploaded archives
+    for name, handle in images:
+        data = handle.read(IMAGE_MAX_BYTES + 1)
+        if len(data) > IMAGE_MAX_BYTES:
+            yield name, None, f"Image is larger than {IMAGE_MAX_BYTES} bytes"
+        else:
+            yield name, data, None
+    for name, handle in archives:
+        try:
+            yield from forensics.iter_archive_images(handle, IMAGE_MAX_BYTES)
+        except Exception as e:
+            yield name, None, f"Failed to read archive: {str(e)}"
+
+@app.route('/api/analyze-image/batch', methods=['POST'])
+def analyze_image_batch():
+    # Accepts many 'images' files and/or 'archive' zip/tar uploads; results stream back
+    # as NDJSON 'image' events in completion order (each carries its input index).
+    request.max_content_length = IMAGE_BATCH_MAX_BYTES
+    if not request.files.getlist('images') and not request.files.getlist('archive'):
+        return jsonify({'error': "No 'images' files or 'archive' provided"}), 400
+    forensics = image_forensics_engine.get()
+    if forensics is None:
+        return jsonify({'error': 'Image analysis is unavailable'}), 503
+    image_hash_index = image_hash_engine.get()
+
+    images = [detach_upload(f) for f in request.files.getlist('images')]
+    archives = [detach_upload(f) for f in request.files.getlist('archive')]
+    executor = get_image_executor()
+    max_pending = IMAGE_POOL_WORKERS * 2
+
+    def generate():
+        pending = {}
+        count = 0
+        errors = 0
+
+        def drain(block):
+            # Emit finished results; with block=True wait for at least one first
+            nonlocal errors
+            if not pending:
+                return
+            done, _ = wait(pending, timeout=None if block else 0, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, name = pending.pop(future)
+                metrics.IMAGE_JOBS_IN_FLIGHT.dec()
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {'error': f'Failed to process image: {str(e)}'}
+                # Stage timings measured in the worker process
+                for stage_name, seconds in outcome.pop('timings', {}).items():
+                    metrics.observe_stage(stage_name, seconds)
+                phash = outcome.pop('phash', None)
+                digest = outcome.pop('sha256', None)
+                if 'result' in outcome and phash is not None and image_hash_index is not None:
+                    matches = image_hash_index.lookup(phash, sha256=digest)
+                    image_hash_index.add(phash, outcome['result'], sha256=digest)
+                    annotate_seen_before(outcome['result'], phash, matches)
+                if 'error' in outcome:
+                    errors += 1
+                yield format_stream_event('image', dict(index=index, filename=name, **outcome), 'ndjson')
+
+        for name, data, error in iter_uploaded_images(images, archives, forensics):
+            index = count
+            count += 1
+            if index >= IMAGE_BATCH_MAX_FILES:
+                errors += 1
+                yield format_stream_event('image', {
+                    'index': index, 'filename': name,
+                    'error': f'Batch limit of {IMAGE_BATCH_MAX_FILES} images exceeded'
+                }, 'ndjson')
+                continue
+            if error is not None:
+                errors += 1
+                yield format_stream_event('image', {'index': index, 'filename': name, 'error': error}, 'ndjson')
+                continue
+            # Bound the bytes held in memory: wait for a slot before reading further
+            if len(pending) >= max_pending:
+                yield from drain(True)
+            pending[executor.submit(forensics.analyze_image_bytes, data)] = (index, name)
+            metrics.IMAGE_JOBS_IN_FLIGHT.inc()
+            yield from drain(False)
+
+        while pending:
+            yield from drain(True)
+        yield format_stream_event('done', {'count': count, 'errors': errors}, 'ndjson')
+
+    def generate_and_close():
+        try:
+            yield from generate()
+        finally:
+            for _, handle in images + archives:
+                handle.close()
+
+    return Response(
+        generate_and_close(),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 if __name__ == '__main__':
     print("Starting TruthLense AI App...")
     print("Go to http://127.0.0.1:5000 in your browser.")
@@ -0,0 +1,383 @@
+import asyncio
+import copy
+import json
+import os
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+
+import app as core
+import metrics
+from llm_json import InvalidLLMResponse
+from singleflight import AsyncSingleFlight
+from scheduler import RateLimitedError, set_caller
+from upstream import CircuitBreaker, UpstreamUnavailableError
+from verdict_cache import claim_key
+
+# Async serving mode for TruthLense.
+#
+#     uvicorn asgi:application --host 0.0.0.0 --port 5000
+#
+# /api/verify, /api/verify/batch and /api/verify/stream are served natively on the
+# event loop with a non-blocking Perplexity client over a pooled keep-alive HTTP
+# connection pool, so a single process can hold hundreds of verifications in flight.
+# Every other route (form page, image analysis, stats) is handed to the Flask app.
+
+LLM_MAX_CONCURRENCY = int(os.getenv('ASGI_LLM_MAX_CONCURRENCY', '256'))
+HTTP_MAX_CONNECTIONS = int(os.getenv('ASGI_HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('ASGI_HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv('ASGI_HTTP_KEEPALIVE_EXPIRY_SECONDS', '30'))
+MAX_BODY_BYTES = int(os.getenv('ASGI_MAX_BODY_BYTES', str(4 * 1024 * 1024)))
+
+wsgi_application = WsgiToAsgi(core.app)
+
+async_client = None
+llm_semaphore = None
+llm_flight = AsyncSingleFlight()
+core.single_flights.append(('asgi', llm_flight))
+# LLM slots are cheap to hold on the event loop, so unless LLM_SCHEDULER_CONCURRENCY is
+# set the shared scheduler admits as many calls as the ASGI concurrency limit
+if not os.getenv('LLM_SCHEDULER_CONCURRENCY'):
+    core.llm_scheduler.set_capacity(LLM_MAX_CONCURRENCY)
+
+
+def get_async_client():
+    # Created lazily so the client and semaphore bind to the server's event loop
+    global async_client, llm_semaphore
+    if async_client is None and core.api_key:
+        import httpx
+        from perplexity import AsyncPerplexity, DefaultAsyncHttpxClient
+        http_client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            # Per-attempt timeouts are passed by core.upstream; this is only the default
+            timeout=httpx.Timeout(core.upstream.attempt_timeout, connect=core.upstream.connect_timeout)
+        )
+        # Retries, deadlines and circuit breaking come from core.upstream
+        async_client = AsyncPerplexity(api_key=core.api_key, http_client=http_client, max_retries=0)
+    if llm_semaphore is None:
+        llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return async_client
+
+
+async def complete_async(model, messages):
+    client = get_async_client()
+
+    async def attempt(timeout):
+        # The semaphore is held per attempt, not across backoff sleeps
+        queued = time.perf_counter()
+        async with llm_semaphore:
+            metrics.observe_stage('llm_queue', time.perf_counter() - queued)
+            with metrics.upstream_call():
+                return await client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    timeout=timeout
+                )
+
+    response = await core.upstream.call_async(attempt)
+    return response.choices[0].message.content
+
+
+async def ask_perplexity_async(text):
+    content = await complete_async("sonar-pro", [
+        {"role": "system", "content": "You are a rigorous fact-checking AI that outputs only valid JSON."},
+        {"role": "user", "content": core.build_fact_check_prompt(text)}
+    ])
+    try:
+        return core.parse_llm_content(content)
+    except InvalidLLMResponse as e:
+        if not core.LLM_REASK_ENABLED:
+            raise
+        return await reask_for_json_async(content, e)
+
+
+async def reask_for_json_async(content, error):
+    reply = await complete_async(core.LLM_REASK_MODEL, [
+        {"role": "system", "content": "You convert text into valid JSON. Output only JSON."},
+        {"role": "user", "content": core.build_json_repair_prompt(content or "", error)}
+    ])
+    try:
+        result = core.parse_llm_content(reply)
+    except InvalidLLMResponse:
+        metrics.LLM_REASKS.inc(outcome='failed')
+        raise
+    metrics.LLM_REASKS.inc(outcome='ok')
+    return result
+
+
+async def fact_check_async(text):
+    # Async twin of core.fact_check: same cache, coalesced on the event loop
+    key = claim_key(text)
+    # Cache and index reads hit SQLite (and may load the index), so keep them off the loop
+    cached = await asyncio.to_thread(core.lookup_verdict, key, text)
+    if cached is not None:
+        return cached
+
+    async def fetch():
+        cached = await asyncio.to_thread(core.verdict_cache.get_by_key, key, False)
+        if cached is not None:
+            return cached
+        if core.upstream.breaker.state == CircuitBreaker.OPEN:
+            result = await ask_perplexity_async(text)
+        else:
+            async with core.llm_scheduler.slot_async(charged=True):
+                result = await ask_perplexity_async(text)
+        await asyncio.to_thread(core.remember_verdict, key, text, result)
+        return result
+
+    # As in core.fact_check: every caller pays its token, only the leader takes a slot
+    core.llm_charge()
+    return copy.deepcopy(await llm_flight.do(key, fetch))
+
+
+async def verify_text_async(text, ml_result, heuristics=None):
+    result = await fact_check_async(text)
+    return core.attach_local_analysis(text, result, ml_result, heuristics)
+
+
+async def verify_item_async(text, ml_result, analyze=True):
+    # Mirrors core.verify_batch_item: errors are returned in-place. With analyze=False,
+    # LLM verdicts come back without local analysis (see core.attach_batch_analysis).
+    if get_async_client() is None:
+        if ml_result is None:
+            return {'error': 'Perplexity API Key not configured and no local model available'}
+        return core.local_only_result(ml_result)
+    try:
+        if not analyze:
+            return await fact_check_async(text)
+        return await verify_text_async(text, ml_result)
+    except RateLimitedError as e:
+        return core.rate_limited_result(e)
+    except UpstreamUnavailableError as e:
+        return core.upstream_fallback_result(ml_result, e)
+    except InvalidLLMResponse:
+        return {'error': 'Failed to parse AI response'}
+    except Exception as e:
+        return {'error': f'Error calling AI API: {str(e)}'}
+
+
+async def handle_verify(data):
+    if not isinstance(data, dict) or 'text' not in data:
+        return 400, {'error': 'No text provided'}
+
+    text = data['text']
+    ml_result = await asyncio.to_thread(core.run_local_model, text)
+    result = await verify_item_async(text, ml_result)
+    if result.get('rate_limited'):
+        return 429, result
+    if 'retry_after' in result:
+        return 503, result
+    if 'error' in result:
+        return 500, result
+    core.record_history(text, result, 'api')
+    return 200, result
+
+
+async def handle_verify_batch(data):
+    if not isinstance(data, dict) or not isinstance(data.get('texts'), list):
+        return 400, {'error': 'Expected JSON body with a "texts" list'}
+
+    items = data['texts']
+    if not items:
+        return 400, {'error': 'No texts provided'}
+    if len(items) > core.BATCH_MAX_ITEMS:
+        return 413, {'error': f'Batch too large: at most {core.BATCH_MAX_ITEMS} texts per request'}
+
+    valid = [i for i, t in enumerate(items) if isinstance(t, str) and t.strip()]
+    results = [{'error': 'No text provided'} for _ in items]
+
+    # One vectorized local-model pass and one heuristic pass, off the event loop
+    texts = [items[i] for i in valid]
+    ml_results = await asyncio.to_thread(core.run_local_model_batch, texts)
+    heuristics = await asyncio.to_thread(core.compute_text_heuristics_batch, texts)
+    # Concurrency is bounded by llm_semaphore; gather keeps input order
+    verified = await asyncio.gather(*(
+        verify_item_async(items[i], ml_result, analyze=False)
+        for i, ml_result in zip(valid, ml_results)
+    ))
+    # Combined scores for the whole batch in one vectorized pass
+    verified = core.attach_batch_analysis(texts, list(verified), ml_results, heuristics)
+    for i, result in zip(valid, verified):
+        results[i] = result
+        core.record_history(items[i], result, 'batch')
+
+    return 200, {
+        'count': len(results),
+        'errors': sum(1 for r in results if 'error' in r),
+        'results': results
+    }
+
+
+async def stream_verify(data, fmt, send):
+    # Same event sequence as core.verify_claim_stream
+    async def emit(event, payload):
+        body = core.format_stream_event(event, payload, fmt).encode('utf-8')
+        await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+
+    text = data['text']
+    ml_result = await asyncio.to_thread(core.run_local_model, text)
+    heuristics = core.compute_text_heuristics(text)
+    await emit('ml_model', ml_result)
+    await emit('heuristics', heuristics)
+
+    if get_async_client() is None:
+        if ml_result is None:
+            await emit('error', {'error': 'Perplexity API Key not configured and no local model available'})
+        else:
+            result = core.local_only_result(ml_result)
+            core.record_history(text, result, 'stream')
+            await emit('result', result)
+    else:
+        try:
+            result = await fact_check_async(text)
+        except RateLimitedError as e:
+            await emit('error', core.rate_limited_result(e))
+        except UpstreamUnavailableError as e:
+            fallback = core.upstream_fallback_result(ml_result, e)
+            core.record_history(text, fallback, 'stream')
+            await emit('error' if 'error' in fallback else 'result', fallback)
+        except InvalidLLMResponse:
+            await emit('error', {'error': 'Failed to parse AI response'})
+        except Exception as e:
+            await emit('error', {'error': f'Error calling AI API: {str(e)}'})
+        else:
+            await emit('llm', result)
+            core.attach_local_analysis(text, result, ml_result, heuristics)
+            core.record_history(text, result, 'stream')
+            await emit('meta_analysis', result['meta_analysis'])
+            await emit('result', result)
+    await emit('done', {})
+    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+async def read_json_body(receive):
+    chunks = []
+    size = 0
+    more_body = True
+    while more_body:
+        message = await receive()
+        chunk = message.get('body', b'')
+        size += len(chunk)
+        if size > MAX_BODY_BYTES:
+            raise ValueError('Request body too large')
+        chunks.append(chunk)
+        more_body = message.get('more_body', False)
+    try:
+        return json.loads(b''.join(chunks) or b'null')
+    except ValueError:
+        return None
+
+
+async def send_json(send, status, payload, extra_headers=None):
+    body = core.app.json.dumps(payload).encode('utf-8') + b'\n'
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(body)).encode('ascii')),
+        (b'access-control-allow-origin', b'*')
+    ]
+    headers.extend(extra_headers or [])
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+NATIVE_ROUTES = {
+    '/api/verify': handle_verify,
+    '/api/verify/batch': handle_verify_batch
+}
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # In lazy startup mode the client (and its imports) wait for the first LLM call
+            if core.STARTUP_MODE == 'eager':
+                get_async_client()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if async_client is not None:
+                await async_client.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+
+    path = scope.get('path', '')
+    is_native = scope['type'] == 'http' and scope['method'] == 'POST' and (
+        path in NATIVE_ROUTES or path == '/api/verify/stream'
+    )
+    if not is_native:
+        # CORS preflight and all other routes keep their Flask behaviour
+        await wsgi_application(scope, receive, send)
+        return
+
+    # Same caller identity as app.identify_llm_caller; tasks spawned below inherit it
+    headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope.get('headers', [])}
+    remote_addr = (scope.get('client') or ('unknown', 0))[0]
+    set_caller(
+        core.request_client_id(headers.get('x-api-key'), remote_addr, headers.get('x-forwarded-for')),
+        core.request_priority(path, {'X-Priority': headers.get('x-priority')})
+    )
+
+    # Same request metrics and Server-Timing header as the Flask hooks in app.py
+    start = time.perf_counter()
+    timings = metrics.start_timings()
+    status_holder = {'status': 500}
+
+    async def instrumented_send(message):
+        if message['type'] == 'http.response.start':
+            status_holder['status'] = message['status']
+            if core.SERVER_TIMING_ENABLED:
+                header = metrics.server_timing_header(timings, time.perf_counter() - start)
+                message = dict(message, headers=list(message['headers']) + [(b'server-timing', header.encode('latin-1'))])
+        await send(message)
+
+    metrics.HTTP_IN_FLIGHT.inc(route=path)
+    try:
+        await serve_native(path, scope, receive, instrumented_send)
+    finally:
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, route=path)
+        metrics.HTTP_REQUESTS.inc(route=path, status=status_holder['status'])
+        metrics.HTTP_IN_FLIGHT.dec(route=path)
+
+
+async def serve_native(path, scope, receive, send):
+    try:
+        data = await read_json_body(receive)
+    except ValueError as e:
+        await send_json(send, 413, {'error': str(e)})
+        return
+
+    if path == '/api/verify/stream':
+        if not isinstance(data, dict) or 'text' not in data:
+            await send_json(send, 400, {'error': 'No text provided'})
+            return
+        query = scope.get('query_string', b'').decode('latin-1')
+        fmt = 'sse' if 'format=sse' in query.split('&') else 'ndjson'
+        content_type = b'text/event-stream' if fmt == 'sse' else b'application/x-ndjson'
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', content_type),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+                (b'access-control-allow-origin', b'*')
+            ]
+        })
+        await stream_verify(data, fmt, send)
+        return
+
+    status, payload = await NATIVE_ROUTES[path](data)
+    extra_headers = None
+    if status in (429, 503):
+        extra_headers = [(b'retry-after', str(max(1, payload['retry_after'])).encode('ascii'))]
+    await send_json(send, status, payload, extra_headers)
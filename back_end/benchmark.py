@@ -0,0 +1,750 @@
+import argparse
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import numpy as np
+from PIL import Image
+
+# Load tests for the TruthLense backend that never touch the real Perplexity API.
+#
+#     python benchmark.py run --scenarios verify,image,index --requests 500 --concurrency 16
+#     python benchmark.py compare bench_results/old.json bench_results/new.json
+#     python benchmark.py mock --port 8099    # stand-alone mock, e.g. for a manual app run
+#     python benchmark.py startup --modes eager,lazy --repeat 5
+#
+# `run` starts a local stand-in for the chat completions API (configurable latency,
+# failure rate and malformed-JSON rate), launches app.py (or asgi.py under uvicorn)
+# in a subprocess pointed at it through PERPLEXITY_BASE_URL with a dummy key, and
+# drives it with seeded synthetic claim and image corpora from a closed-loop pool
+# of client threads. Each scenario reports p50/p95/p99 latency, requests/s and the
+# app's RSS; the whole run is written as JSON so runs can be compared.
+#
+# `startup` measures cold start instead: it imports app.py in fresh interpreters under
+# `python -X importtime` for each STARTUP_MODE and reports the import time, the time
+# until every engine is loaded, peak RSS, and which imports the time went to.
+# `--max-import-ms` turns it into a regression check.
+
+BENCHMARK_FORMAT_VERSION = 1
+DUMMY_API_KEY = 'benchmark-dummy-key'
+SCENARIOS = ['verify', 'image', 'index']
+
+CLAIM_SUBJECTS = [
+    "The Eiffel Tower", "Thomas Edison", "The Great Wall of China", "Vitamin C", "The moon landing",
+    "Napoleon Bonaparte", "The 1918 influenza pandemic", "Coffee", "The Titanic", "Albert Einstein",
+    "The printing press", "Lightning", "Antibiotics", "The Roman Empire", "Goldfish", "5G towers",
+    "The Berlin Wall", "Marie Curie", "Chocolate", "The Amazon rainforest"
+]
+CLAIM_PREDICATES = [
+    "was invented in {year}", "can be seen from space", "cures the common cold", "was faked by the government in {year}",
+    "was first documented in {year}", "causes memory loss", "was banned in Europe in {year}",
+    "is responsible for most global oxygen", "was secretly funded by bankers in {year}",
+    "never strikes the same place twice", "only has a three-second memory", "was built by slaves in {year}",
+    "was shorter than average", "spreads viruses", "was demolished in {year}"
+]
+CLAIM_DECORATIONS = [
+    "", "", "", "BREAKING NEWS: ", "You won't believe this: ", "Shocking truth!!! ",
+    "Read more at https://example.com/a and https://example.org/b ", "My uncle says "
+]
+MALFORMED_CONTENTS = [
+    '{"verdict": "FALSE", "confidence": "80%", "explanation": "Truncated',
+    'Sure! Here is the fact check you asked for. The claim is mostly false.',
+    '```json\n{"verdict": "TRUE", "confidence": "70%",}\n```',
+    '{verdict: FALSE, confidence: 90%}'
+]
+
+
+def percentile_summary(latencies):
+    if not latencies:
+        return {'mean': None, 'min': None, 'p50': None, 'p95': None, 'p99': None, 'max': None}
+    values = np.asarray(latencies, dtype=np.float64) * 1000.0
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        'mean': round(float(values.mean()), 3),
+        'min': round(float(values.min()), 3),
+        'p50': round(float(p50), 3),
+        'p95': round(float(p95), 3),
+        'p99': round(float(p99), 3),
+        'max': round(float(values.max()), 3)
+    }
+
+
+def read_rss_bytes(pid):
+    # Resident set size from /proc (Linux); None where unavailable
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except Exception:
+        return None
+
+
+# --- Synthetic corpora ---
+
+def make_claims(count, seed, repeat_fraction=0.0):
+    rng = random.Random(seed)
+    claims = []
+    for i in range(count):
+        if claims and rng.random() < repeat_fraction:
+            claims.append(rng.choice(claims))
+            continue
+        predicate = rng.choice(CLAIM_PREDICATES).format(year=rng.randint(1800, 2020))
+        claims.append(f"{rng.choice(CLAIM_DECORATIONS)}{rng.choice(CLAIM_SUBJECTS)} {predicate} (claim {i}).")
+    return claims
+
+
+def make_images(count, seed, sizes):
+    # JPEGs with smooth gradients plus noise; some carry editing-software EXIF tags
+    rng = np.random.default_rng(seed)
+    images = []
+    for i in range(count):
+        width, height = sizes[i % len(sizes)]
+        x = np.linspace(0, 255, width)
+        y = np.linspace(0, 255, height)[:, None]
+        base = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=2)
+        noise = rng.normal(0, 12, size=(height, width, 3))
+        pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+        image = Image.fromarray(pixels, 'RGB')
+        exif = Image.Exif()
+        exif[0x0110] = 'Bench Camera'
+        if i % 4 == 0:
+            exif[0x0131] = 'Adobe Photoshop 24.0'
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=int(rng.integers(70, 96)), exif=exif)
+        images.append((f'bench_{i}.jpg', buffer.getvalue()))
+    return images
+
+
+# --- Mock Perplexity chat completions API ---
+
+class MockPerplexityServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency_ms=800.0, jitter_ms=200.0, failure_rate=0.0, malformed_rate=0.0, seed=0):
+        super().__init__(address, MockPerplexityHandler)
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.failure_rate = failure_rate
+        self.malformed_rate = malformed_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {'requests': 0, 'ok': 0, 'failures': 0, 'malformed': 0}
+
+    def next_outcome(self):
+        with self._lock:
+            self.counts['requests'] += 1
+            delay = max(0.0, self._rng.gauss(self.latency, self.jitter))
+            roll = self._rng.random()
+            if roll < self.failure_rate:
+                outcome = 'failures'
+            elif roll < self.failure_rate + self.malformed_rate:
+                outcome = 'malformed'
+            else:
+                outcome = 'ok'
+            self.counts[outcome] += 1
+            verdict = self._rng.choice(['TRUE', 'FALSE', 'MIXED', 'UNVERIFIABLE'])
+            confidence = self._rng.randint(50, 99)
+            malformed = self._rng.choice(MALFORMED_CONTENTS)
+        return delay, outcome, verdict, confidence, malformed
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counts)
+        stats.update({
+            'latency_ms': self.latency * 1000.0,
+            'jitter_ms': self.jitter * 1000.0,
+            'failure_rate': self.failure_rate,
+            'malformed_rate': self.malformed_rate
+        })
+        return stats
+
+
+class MockPerplexityHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if self.path.rstrip('/') != '/chat/completions':
+            self.send_json(404, {'error': {'message': f'Unknown path {self.path}'}})
+            return
+        try:
+            model = json.loads(body).get('model', 'sonar-pro')
+        except ValueError:
+            self.send_json(400, {'error': {'message': 'Invalid JSON body'}})
+            return
+
+        delay, outcome, verdict, confidence, malformed = self.server.next_outcome()
+        time.sleep(delay)
+        if outcome == 'failures':
+            self.send_json(500, {'error': {'message': 'Injected upstream failure'}})
+            return
+        if outcome == 'malformed':
+            content = malformed
+        else:
+            content = "```json\n" + json.dumps({
+                'verdict': verdict,
+                'confidence': f'{confidence}%',
+                'explanation': 'Synthetic verdict from the benchmark mock server.',
+                'historical_context': 'None; this response was generated locally.',
+                'first_verified': '1900s',
+                'last_updated': '2024',
+                'sources': ['https://example.com/benchmark-source']
+            }) + "\n```"
+        self.send_json(200, {
+            'id': f'bench-{time.time_ns()}',
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': model,
+            'choices': [{
+                'index': 0,
+                'finish_reason': 'stop',
+                'message': {'role': 'assistant', 'content': content}
+            }],
+            'usage': {'prompt_tokens': 200, 'completion_tokens': 150, 'total_tokens': 350}
+        })
+
+    def send_json(self, status, payload):
+        data = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # The app gave up on this attempt (timeout); nothing left to answer
+            self.close_connection = True
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_mock_server(port, **options):
+    server = MockPerplexityServer(('127.0.0.1', port), **options)
+    thread = threading.Thread(target=server.serve_forever, name='mock-perplexity', daemon=True)
+    thread.start()
+    return server
+
+
+# --- App under test ---
+
+def serve_app(server, port):
+    # Entry point of the app subprocess
+    if server == 'asgi':
+        import uvicorn
+        uvicorn.run('asgi:application', host='127.0.0.1', port=port, log_level='warning')
+    else:
+        from werkzeug.serving import run_simple
+        import app as core
+        run_simple('127.0.0.1', port, core.app, threaded=True)
+
+
+def start_app(server, port, mock_url, extra_env, log_file):
+    env = dict(os.environ)
+    env.update({
+        # Dummy key and local base URL; load_dotenv() never overrides these
+        'PERPLEXITY_API_KEY': DUMMY_API_KEY,
+        'PERPLEXITY_BASE_URL': mock_url,
+        # Keep benchmark traffic out of the persistent caches, indexes and history
+        'HISTORY_DB': '',
+        'VERDICT_CACHE_DB': '',
+        'CLAIM_INDEX_PATH': '',
+        'IMAGE_HASH_INDEX_PATH': ''
+    })
+    env.update(extra_env)
+    return subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), 'serve', '--server', server, '--port', str(port)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=log_file,
+        stderr=subprocess.STDOUT
+    )
+
+
+def wait_until_ready(base_url, process, timeout=120.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"App exited during startup with code {process.returncode}")
+        try:
+            # /api/ready answers 503 until every required engine is loaded (STARTUP_MODE=lazy)
+            if httpx.get(base_url + '/api/ready', timeout=2.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"App did not become ready within {timeout:.0f}s")
+
+
+# --- Load generation ---
+
+def build_requests(scenario, args):
+    # List of (method, path, request kwargs) cycled through by the load generator
+    total = args.requests + args.warmup
+    if scenario == 'verify':
+        return [('POST', '/api/verify', {'json': {'text': c}})
+                for c in make_claims(total, args.seed, args.repeat_fraction)]
+    if scenario == 'index':
+        return [('POST', '/', {'data': {'text': c}})
+                for c in make_claims(total, args.seed + 1, args.repeat_fraction)]
+    if scenario == 'image':
+        images = make_images(args.images, args.seed, args.image_sizes)
+        return [('POST', '/api/analyze-image', {'files': {'image': (name, data, 'image/jpeg')}})
+                for name, data in images]
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def sample_rss(pid, stop, samples):
+    while not stop.is_set():
+        rss = read_rss_bytes(pid)
+        if rss is not None:
+            samples.append(rss)
+        stop.wait(0.1)
+
+
+def run_scenario(scenario, base_url, app_pid, args):
+    requests_list = build_requests(scenario, args)
+    total = args.requests + args.warmup
+    counter = itertools.count()
+    lock = threading.Lock()
+    records = []
+
+    def worker():
+        with httpx.Client(base_url=base_url, timeout=args.timeout) as client:
+            while True:
+                i = next(counter)
+                if i >= total:
+                    return
+                method, path, kwargs = requests_list[i % len(requests_list)]
+                start = time.perf_counter()
+                try:
+                    response = client.request(method, path, **kwargs)
+                    outcome = response.status_code
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                elapsed = time.perf_counter() - start
+                if i >= args.warmup:
+                    with lock:
+                        records.append((start, elapsed, outcome))
+
+    rss_start = read_rss_bytes(app_pid) if app_pid else None
+    rss_samples = []
+    stop = threading.Event()
+    sampler = None
+    if app_pid:
+        sampler = threading.Thread(target=sample_rss, args=(app_pid, stop, rss_samples), daemon=True)
+        sampler.start()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, name=f'bench-{n}') for n in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stop.set()
+    if sampler is not None:
+        sampler.join()
+
+    # Throughput over the measured window only (first measured request start to last finish)
+    if records:
+        window = max(s + e for s, e, _ in records) - min(s for s, _, _ in records)
+    else:
+        window = time.perf_counter() - started
+    status_counts = {}
+    for _, _, outcome in records:
+        status_counts[str(outcome)] = status_counts.get(str(outcome), 0) + 1
+    errors = sum(1 for _, _, o in records if not (isinstance(o, int) and o < 400))
+    rss_end = read_rss_bytes(app_pid) if app_pid else None
+
+    summary = {
+        'requests': len(records),
+        'errors': errors,
+        'error_rate': round(errors / len(records), 4) if records else 0.0,
+        'status_counts': status_counts,
+        'duration_s': round(window, 3),
+        'throughput_rps': round(len(records) / window, 2) if window > 0 else None,
+        'latency_ms': percentile_summary([e for _, e, _ in records]),
+        'rss_mb': {
+            'start': round(rss_start / 2 ** 20, 1) if rss_start else None,
+            'peak': round(max(rss_samples) / 2 ** 20, 1) if rss_samples else None,
+            'end': round(rss_end / 2 ** 20, 1) if rss_end else None
+        }
+    }
+    try:
+        summary['app_cache_stats'] = httpx.get(base_url + '/api/cache/stats', timeout=5.0).json()
+    except Exception:
+        summary['app_cache_stats'] = None
+    return summary
+
+
+def print_summary(scenario, summary):
+    latency = summary['latency_ms']
+    rss = summary['rss_mb']
+    print(f"{scenario:>8}: {summary['requests']} requests, {summary['errors']} errors, "
+          f"{summary['throughput_rps']} req/s | p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+          f"p99 {latency['p99']} ms | RSS peak {rss['peak']} MB")
+
+
+def run_benchmark(args):
+    scenarios = [s.strip() for s in args.scenarios.split(',') if s.strip()]
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario '{scenario}'; choose from {', '.join(SCENARIOS)}")
+
+    mock = start_mock_server(
+        args.mock_port or free_port(),
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        failure_rate=args.failure_rate,
+        malformed_rate=args.malformed_rate,
+        seed=args.seed
+    )
+    mock_url = f'http://127.0.0.1:{mock.server_address[1]}'
+
+    extra_env = {}
+    for item in args.app_env:
+        key, _, value = item.partition('=')
+        extra_env[key] = value
+
+    port = args.app_port or free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    log_file = tempfile.NamedTemporaryFile(mode='w+', prefix='truthlense-bench-', suffix='.log', delete=False)
+    process = start_app(args.server, port, mock_url, extra_env, log_file)
+    results = {
+        'format_version': BENCHMARK_FORMAT_VERSION,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': git_commit(),
+        'host': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'config': {
+            'server': args.server,
+            'scenarios': scenarios,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'repeat_fraction': args.repeat_fraction,
+            'images': args.images,
+            'image_sizes': [list(s) for s in args.image_sizes],
+            'app_env': extra_env
+        },
+        'scenarios': {}
+    }
+    try:
+        wait_until_ready(base_url, process)
+        rss_idle = read_rss_bytes(process.pid)
+        results['app_rss_idle_mb'] = round(rss_idle / 2 ** 20, 1) if rss_idle else None
+        for scenario in scenarios:
+            summary = run_scenario(scenario, base_url, process.pid, args)
+            results['scenarios'][scenario] = summary
+            print_summary(scenario, summary)
+    except RuntimeError as e:
+        log_file.seek(0)
+        print(log_file.read()[-4000:])
+        raise SystemExit(f"Benchmark failed: {e}")
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        mock.shutdown()
+        log_file.close()
+        os.unlink(log_file.name)
+
+    results['mock'] = mock.stats()
+    out = args.out or os.path.join('bench_results', f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+    return results
+
+
+# --- Cold start ---
+
+# Runs in the child interpreter: import app, then load every engine. Warm-up runs on
+# this thread rather than in the background, because -X importtime output from two
+# importing threads interleaves and loses the nesting.
+STARTUP_PROBE = """
+import json, resource, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter() - start
+app.engine_registry.warm_all()
+print(json.dumps({
+    'import_seconds': imported,
+    'ready_seconds': time.perf_counter() - start,
+    'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'engines': app.engine_registry.status()['engines']
+}))
+"""
+
+
+def parse_importtime(stderr):
+    # (module, self_us, cumulative_us, children) from `-X importtime` output. A module
+    # is printed after everything it imported, one indent level (2 spaces) deeper.
+    modules = []
+    pending = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entry = (name.strip(), int(self_us), int(cumulative_us), pending.pop(depth + 1, []))
+        pending.setdefault(depth, []).append(entry)
+        modules.append(entry)
+    return modules
+
+
+def profile_startup(mode, args, extra_env):
+    env = dict(os.environ)
+    env.update({
+        'PERPLEXITY_API_KEY': DUMMY_API_KEY,
+        'STARTUP_MODE': mode,
+        'STARTUP_WARMUP': '0',
+        # No persistent state: nothing on disk to load or create
+        'HISTORY_DB': '',
+        'VERDICT_CACHE_DB': '',
+        'CLAIM_INDEX_PATH': '',
+        'IMAGE_HASH_INDEX_PATH': ''
+    })
+    env.update(extra_env)
+    runs = []
+    for _ in range(args.repeat):
+        process = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', STARTUP_PROBE],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=args.timeout
+        )
+        if process.returncode != 0:
+            raise SystemExit(f"Importing app failed in {mode} mode:\n{process.stderr[-4000:]}")
+        probe = json.loads(process.stdout.strip().splitlines()[-1])
+        runs.append((probe, parse_importtime(process.stderr)))
+
+    def median_ms(values):
+        values = [v for v in values if v is not None]
+        return round(float(np.median(values)) * 1000, 1) if values else None
+
+    # Per-import breakdown from the median run
+    probe, modules = sorted(runs, key=lambda run: run[0]['import_seconds'])[len(runs) // 2]
+    app_module = next((m for m in modules if m[0] == 'app'), None)
+    direct = sorted(app_module[3] if app_module else [], key=lambda m: -m[2])
+    return {
+        'runs': len(runs),
+        'import_ms': median_ms([run[0]['import_seconds'] for run in runs]),
+        'ready_ms': median_ms([run[0]['ready_seconds'] for run in runs]),
+        'peak_rss_mb': round(max(run[0]['peak_rss_kb'] for run in runs) / 1024, 1),
+        'modules_imported': len(modules),
+        'app_imports_ms': {m[0]: round(m[2] / 1000, 1) for m in direct[:args.top]},
+        'slowest_modules_ms': {
+            m[0]: round(m[1] / 1000, 1) for m in sorted(modules, key=lambda m: -m[1])[:args.top]
+        },
+        'engines': {name: status['load_seconds'] for name, status in probe['engines'].items()}
+    }
+
+
+def run_startup_profile(args):
+    modes = [m.strip() for m in args.modes.split(',') if m.strip()]
+    for mode in modes:
+        if mode not in ('eager', 'lazy'):
+            raise SystemExit(f"Unknown startup mode '{mode}'; choose from eager, lazy")
+    extra_env = {}
+    for item in args.app_env:
+        key, _, value = item.partition('=')
+        extra_env[key] = value
+
+    results = {
+        'format_version': BENCHMARK_FORMAT_VERSION,
+        'kind': 'startup',
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'git_commit': git_commit(),
+        'host': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count()
+        },
+        'config': {'modes': modes, 'repeat': args.repeat, 'app_env': extra_env},
+        'modes': {}
+    }
+    over_budget = []
+    for mode in modes:
+        summary = profile_startup(mode, args, extra_env)
+        results['modes'][mode] = summary
+        print(f"{mode:>6}: import {summary['import_ms']} ms, ready {summary['ready_ms']} ms, "
+              f"peak RSS {summary['peak_rss_mb']} MB, {summary['modules_imported']} modules")
+        for name, ms in summary['app_imports_ms'].items():
+            print(f"        {ms:>8} ms  {name}")
+        if args.max_import_ms is not None and summary['import_ms'] > args.max_import_ms:
+            over_budget.append(mode)
+
+    out = args.out or os.path.join('bench_results', f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {out}")
+    if over_budget:
+        raise SystemExit(f"Import time over {args.max_import_ms} ms in: {', '.join(over_budget)}")
+    return results
+
+
+def compare_results(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+
+    def change(a, b):
+        if a in (None, 0) or b is None:
+            return ''
+        return f'{(b - a) / a * 100:+.1f}%'
+
+    if new.get('kind') == 'startup':
+        print(f"{'mode':>8}  {'metric':<14} {'old':>10} {'new':>10} {'change':>8}")
+        for mode in new['modes']:
+            if mode not in old.get('modes', {}):
+                continue
+            a = old['modes'][mode]
+            b = new['modes'][mode]
+            for name, key in (('import ms', 'import_ms'), ('ready ms', 'ready_ms'), ('peak RSS MB', 'peak_rss_mb')):
+                print(f"{mode:>8}  {name:<14} {str(a[key]):>10} {str(b[key]):>10} {change(a[key], b[key]):>8}")
+        return
+
+    print(f"{'scenario':>8}  {'metric':<14} {'old':>10} {'new':>10} {'change':>8}")
+    for scenario in new['scenarios']:
+        if scenario not in old['scenarios']:
+            continue
+        a = old['scenarios'][scenario]
+        b = new['scenarios'][scenario]
+        rows = [
+            ('req/s', a['throughput_rps'], b['throughput_rps']),
+            ('p50 ms', a['latency_ms']['p50'], b['latency_ms']['p50']),
+            ('p95 ms', a['latency_ms']['p95'], b['latency_ms']['p95']),
+            ('p99 ms', a['latency_ms']['p99'], b['latency_ms']['p99']),
+            ('error rate', a['error_rate'], b['error_rate']),
+            ('peak RSS MB', a['rss_mb']['peak'], b['rss_mb']['peak'])
+        ]
+        for name, x, y in rows:
+            print(f"{scenario:>8}  {name:<14} {str(x):>10} {str(y):>10} {change(x, y):>8}")
+
+
+def parse_size(value):
+    width, _, height = value.lower().partition('x')
+    return int(width), int(height)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the TruthLense backend against a mock Perplexity API.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', help="Start the mock API and the app, run the scenarios, save JSON results")
+    run.add_argument('--scenarios', default=','.join(SCENARIOS), help="Comma-separated: verify, image, index")
+    run.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi',
+                     help="Serve app.py with threaded werkzeug, or asgi.py with uvicorn")
+    run.add_argument('--requests', type=int, default=200, help="Measured requests per scenario")
+    run.add_argument('--warmup', type=int, default=10, help="Unmeasured requests sent first in each scenario")
+    run.add_argument('--concurrency', type=int, default=8, help="Client threads issuing requests back to back")
+    run.add_argument('--timeout', type=float, default=120.0, help="Client timeout per request in seconds")
+    run.add_argument('--seed', type=int, default=1234)
+    run.add_argument('--repeat-fraction', type=float, default=0.0,
+                     help="Fraction of claims that repeat an earlier one (exercises the verdict cache)")
+    run.add_argument('--images', type=int, default=20, help="Distinct synthetic images, cycled through")
+    run.add_argument('--image-sizes', type=parse_size, nargs='+',
+                     default=[(640, 480), (1280, 720), (1920, 1080), (4000, 3000)])
+    run.add_argument('--latency-ms', type=float, default=800.0, help="Mean mock API latency")
+    run.add_argument('--jitter-ms', type=float, default=200.0, help="Standard deviation of the mock latency")
+    run.add_argument('--failure-rate', type=float, default=0.0, help="Fraction of mock calls answered with HTTP 500")
+    run.add_argument('--malformed-rate', type=float, default=0.0, help="Fraction of mock calls with non-JSON content")
+    run.add_argument('--mock-port', type=int, default=0)
+    run.add_argument('--app-port', type=int, default=0)
+    run.add_argument('--app-env', action='append', default=[], metavar='KEY=VALUE',
+                     help="Extra environment for the app, e.g. CLAIM_INDEX_ENABLED=0 (repeatable)")
+    run.add_argument('--out', default=None, help="Results file (default bench_results/bench-<timestamp>.json)")
+
+    mock = commands.add_parser('mock', help="Run only the mock Perplexity API")
+    mock.add_argument('--port', type=int, default=8099)
+    mock.add_argument('--latency-ms', type=float, default=800.0)
+    mock.add_argument('--jitter-ms', type=float, default=200.0)
+    mock.add_argument('--failure-rate', type=float, default=0.0)
+    mock.add_argument('--malformed-rate', type=float, default=0.0)
+    mock.add_argument('--seed', type=int, default=1234)
+
+    compare = commands.add_parser('compare', help="Compare two results files")
+    compare.add_argument('old')
+    compare.add_argument('new')
+
+    startup = commands.add_parser('startup', help="Profile cold start: import time, time to ready, slowest imports")
+    startup.add_argument('--modes', default='eager,lazy', help="Comma-separated STARTUP_MODE values to measure")
+    startup.add_argument('--repeat', type=int, default=3, help="Fresh interpreters per mode; medians are reported")
+    startup.add_argument('--timeout', type=float, default=120.0, help="Seconds allowed per interpreter")
+    startup.add_argument('--top', type=int, default=10, help="Imports listed in the breakdown")
+    startup.add_argument('--max-import-ms', type=float, default=None,
+                         help="Exit non-zero if a mode's median import time exceeds this")
+    startup.add_argument('--app-env', action='append', default=[], metavar='KEY=VALUE',
+                         help="Extra environment for the app (repeatable)")
+    startup.add_argument('--out', default=None, help="Results file (default bench_results/startup-<timestamp>.json)")
+
+    serve = commands.add_parser('serve', help=argparse.SUPPRESS)
+    serve.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+    serve.add_argument('--port', type=int, required=True)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run_benchmark(args)
+    elif args.command == 'mock':
+        server = MockPerplexityServer(
+            ('127.0.0.1', args.port),
+            latency_ms=args.latency_ms,
+            jitter_ms=args.jitter_ms,
+            failure_rate=args.failure_rate,
+            malformed_rate=args.malformed_rate,
+            seed=args.seed
+        )
+        print(f"Mock Perplexity API on http://127.0.0.1:{args.port}; set PERPLEXITY_BASE_URL to this URL.")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    elif args.command == 'compare':
+        compare_results(args.old, args.new)
+    elif args.command == 'startup':
+        run_startup_profile(args)
+    else:
+        serve_app(args.server, args.port)
@@ -0,0 +1,433 @@
+import argparse
+import csv
+import importlib.util
+import io
+import json
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ensemble import CalibratedEnsemble
+from heuristics import FEATURE_NAMES, HeuristicEngine
+from lean_model import LeanScorer
+
+# Offline bulk scoring with the local classifier and text heuristics, no HTTP involved.
+#
+#     python bulk_score.py Truth_Seeker_Model_Dataset.csv scores.csv
+#     python bulk_score.py dump.jsonl scores.parquet --text-column title --text-column body
+#
+# The input (CSV or JSONL) is read as a stream of records with their byte offsets and
+# cut into chunks. Each chunk is scored on a process pool with one vectorized
+# predict_proba call; workers also run the heuristics and serialize the output rows,
+# so the parent only reads, appends and checkpoints. Chunks are written in input
+# order. After every chunk, the output is flushed and fsynced, and the checkpoint
+# (<output>.checkpoint.json) records the input byte offset to continue from and the
+# output size it belongs to. Re-running the same command after an interruption
+# truncates anything written past the checkpoint and resumes from that offset.
+# Parquet output is a directory with one part file per chunk. When train.py has fitted
+# an ensemble.json for the model, a calibrated_prob_real column combines the classifier
+# and the heuristics the same way the API does (no LLM evidence offline).
+
+CHECKPOINT_FORMAT_VERSION = 1
+OUTPUT_FORMATS = ['csv', 'jsonl', 'parquet']
+INPUT_FORMATS = ['csv', 'jsonl']
+DEFAULT_TEXT_COLUMNS = {'csv': ['tweet'], 'jsonl': ['text']}
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Per-process model state, set by init_worker()
+_scorer = None
+
+
+def load_scorer(model_path, vectorizer_path, lean_path):
+    # (vectorizer, model) with the same preference order as app.py: lean artifact, then pickles
+    if lean_path and os.path.isdir(lean_path):
+        try:
+            scorer = LeanScorer.load(lean_path, source_paths=[model_path, vectorizer_path])
+            return scorer, scorer
+        except Exception as e:
+            print(f"Warning: Failed to load lean model, falling back to pickles: {e}")
+    if not (os.path.exists(model_path) and os.path.exists(vectorizer_path)):
+        raise SystemExit(f"No local model found ({model_path}, {vectorizer_path}); run train.py first")
+    import joblib
+    return joblib.load(vectorizer_path), joblib.load(model_path)
+
+
+def init_worker(model_path, vectorizer_path, lean_path, phrases_path, ensemble_path):
+    global _scorer
+    vectorizer, model = load_scorer(model_path, vectorizer_path, lean_path)
+    ensemble = CalibratedEnsemble.load(ensemble_path) if ensemble_path else None
+    _scorer = (vectorizer, model, HeuristicEngine.from_file(phrases_path), ensemble)
+
+
+def score_texts(texts):
+    # Column dict for one chunk: one predict_proba call, labels as in app.score_local_model_batch
+    vectorizer, model, engine, ensemble = _scorer
+    X = vectorizer.transform(texts)
+    if hasattr(model, 'predict_proba'):
+        probas = np.asarray(model.predict_proba(X), dtype=np.float64)
+        fake = probas[:, 0]
+        real = probas[:, 1] if probas.shape[1] > 1 else 1.0 - fake
+        confidence = np.round(np.maximum(real, fake) * 100, 1)
+        prob_real = real
+    else:
+        real = np.asarray(model.predict(X), dtype=np.float64)
+        fake = 1.0 - real
+        confidence = np.zeros(len(texts))
+        prob_real = np.full(len(texts), np.nan)
+    columns = {
+        'ml_label': np.where(real >= fake, 'Real', 'Fake').tolist(),
+        'ml_confidence': confidence.tolist(),
+        'prob_real': np.round(real, 4).tolist(),
+        'prob_fake': np.round(fake, 4).tolist()
+    }
+    heuristics = engine.extract_batch(texts)
+    for name in FEATURE_NAMES:
+        columns[name] = [h[name] for h in heuristics]
+    if ensemble is not None:
+        combined = ensemble.probability_real(
+            prob_real,
+            columns['heuristic_risk_bonus'],
+            np.full(len(texts), '', dtype=object),
+            np.full(len(texts), np.nan)
+        )
+        columns['calibrated_prob_real'] = np.round(combined, 4).tolist()
+    return columns
+
+
+def score_chunk(chunk, output_format, include_text, parts_dir=None):
+    # Runs in a worker: returns the serialized rows (csv/jsonl) or the temporary part file (parquet)
+    columns = {'offset': chunk['offsets']}
+    if chunk['ids'] is not None:
+        columns['id'] = chunk['ids']
+    if include_text:
+        columns['text'] = chunk['texts']
+    columns.update(score_texts(chunk['texts']))
+    names = list(columns)
+    if output_format == 'parquet':
+        import pandas as pd
+        path = os.path.join(parts_dir, f"part-{chunk['index']:06d}.parquet.tmp")
+        pd.DataFrame(columns, columns=names).to_parquet(path, index=False)
+        return path
+    rows = zip(*(columns[name] for name in names))
+    if output_format == 'csv':
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator='\n').writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+    return ''.join(json.dumps(dict(zip(names, row))) + '\n' for row in rows).encode('utf-8')
+
+
+def output_columns(has_ids, include_text, has_ensemble):
+    names = ['offset']
+    if has_ids:
+        names.append('id')
+    if include_text:
+        names.append('text')
+    names += ['ml_label', 'ml_confidence', 'prob_real', 'prob_fake'] + FEATURE_NAMES
+    return names + ['calibrated_prob_real'] if has_ensemble else names
+
+
+# --- Input ---
+
+def read_csv_record(f):
+    # One CSV record as bytes; quoted fields may span lines (an odd quote count means "continue")
+    record = f.readline()
+    while record and record.count(b'"') % 2:
+        line = f.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+def parse_csv_record(record):
+    return next(csv.reader(io.StringIO(record.decode('utf-8', errors='replace'), newline='')), [])
+
+
+def iter_csv_records(f, start, text_columns, id_column):
+    # (offset, next_offset, text, id) for every record at or after byte offset start
+    header = parse_csv_record(read_csv_record(f))
+    missing = [c for c in text_columns + ([id_column] if id_column else []) if c not in header]
+    if missing:
+        raise SystemExit(f"Column(s) not found in CSV header: {', '.join(missing)}")
+    text_idx = [header.index(c) for c in text_columns]
+    id_idx = header.index(id_column) if id_column else None
+    if start > f.tell():
+        f.seek(start)
+    while True:
+        offset = f.tell()
+        record = read_csv_record(f)
+        if not record:
+            return
+        if not record.strip():
+            continue
+        row = parse_csv_record(record)
+        text = '\n'.join(row[i] for i in text_idx if i < len(row) and row[i])
+        record_id = row[id_idx] if id_idx is not None and id_idx < len(row) else None
+        yield offset, f.tell(), text, record_id
+
+
+def iter_jsonl_records(f, start, text_columns, id_column):
+    f.seek(start)
+    while True:
+        offset = f.tell()
+        line = f.readline()
+        if not line:
+            return
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            print(f"Warning: skipping invalid JSON line at byte {offset}")
+            yield offset, f.tell(), None, None
+            continue
+        if not isinstance(record, dict):
+            record = {}
+        text = '\n'.join(str(record[c]) for c in text_columns if record.get(c) not in (None, ''))
+        record_id = record.get(id_column) if id_column else None
+        yield offset, f.tell(), text, record_id
+
+
+def iter_chunks(records, chunk_size, first_index, has_ids):
+    # Groups records into chunks; invalid records (text None) are counted, not scored
+    chunk = None
+    index = first_index
+    for offset, next_offset, text, record_id in records:
+        if chunk is None:
+            chunk = {'index': index, 'offsets': [], 'texts': [], 'ids': [] if has_ids else None, 'skipped': 0}
+        if text is None:
+            chunk['skipped'] += 1
+        else:
+            chunk['offsets'].append(offset)
+            chunk['texts'].append(text)
+            if has_ids:
+                chunk['ids'].append(record_id)
+        chunk['end'] = next_offset
+        if len(chunk['offsets']) + chunk['skipped'] >= chunk_size:
+            yield chunk
+            chunk = None
+            index += 1
+    if chunk is not None:
+        yield chunk
+
+
+# --- Output and checkpoint ---
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('format_version') != CHECKPOINT_FORMAT_VERSION:
+        raise SystemExit(f"Unsupported checkpoint format in {path}; rerun with --restart")
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    checkpoint['updated_at'] = time.time()
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def checkpoint_settings(args):
+    # Everything that must match for a resumed run to continue the same output
+    return {
+        'input': os.path.abspath(args.input),
+        'input_format': args.input_format,
+        'output_format': args.format,
+        'text_columns': args.text_columns,
+        'id_column': args.id_column,
+        'include_text': args.include_text,
+        'ensemble': os.path.abspath(args.ensemble) if args.ensemble else None
+    }
+
+
+def prepare_parts_dir(path, parts):
+    # Parquet: keep the first `parts` committed part files, drop the rest and any temporaries
+    os.makedirs(path, exist_ok=True)
+    for name in os.listdir(path):
+        if not name.startswith('part-'):
+            continue
+        committed = name.endswith('.parquet') and int(name[5:11]) < parts
+        if not committed:
+            os.remove(os.path.join(path, name))
+
+
+def make_executor(args):
+    init_args = (args.model, args.vectorizer, args.lean_model, args.phrases, args.ensemble)
+    if args.workers <= 1:
+        init_worker(*init_args)
+        return None
+    return ProcessPoolExecutor(
+        max_workers=args.workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=init_args
+    )
+
+
+def run(args):
+    settings = checkpoint_settings(args)
+    checkpoint = None if args.restart else load_checkpoint(args.checkpoint)
+    if checkpoint is not None:
+        if checkpoint['settings'] != settings:
+            raise SystemExit(f"{args.checkpoint} belongs to a run with different settings; rerun with --restart")
+        if checkpoint.get('complete'):
+            print(f"{args.output} is already complete ({checkpoint['rows']} rows); rerun with --restart to score again.")
+            return checkpoint
+        print(f"Resuming at byte {checkpoint['input_offset']} after {checkpoint['rows']} rows.")
+    else:
+        if os.path.exists(args.output) and not args.restart:
+            raise SystemExit(f"{args.output} already exists without a checkpoint; rerun with --restart to overwrite")
+        checkpoint = {
+            'format_version': CHECKPOINT_FORMAT_VERSION,
+            'settings': settings,
+            'input_offset': 0,
+            'output_bytes': 0,
+            'chunks': 0,
+            'rows': 0,
+            'skipped': 0,
+            'complete': False
+        }
+
+    parts_dir = None
+    out = None
+    if args.format == 'parquet':
+        parts_dir = args.output
+        prepare_parts_dir(parts_dir, checkpoint['chunks'])
+    else:
+        out = open(args.output, 'r+b' if checkpoint['output_bytes'] else 'wb')
+        # Anything past the checkpoint is a partial chunk from the interrupted run
+        out.truncate(checkpoint['output_bytes'])
+        out.seek(checkpoint['output_bytes'])
+        if checkpoint['output_bytes'] == 0 and args.format == 'csv':
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator='\n').writerow(
+                output_columns(bool(args.id_column), args.include_text, bool(args.ensemble))
+            )
+            out.write(buffer.getvalue().encode('utf-8'))
+
+    executor = make_executor(args)
+    pending = deque()
+    started = time.perf_counter()
+    start_rows = checkpoint['rows']
+
+    def commit(chunk, result):
+        if parts_dir is not None:
+            os.replace(result, result[:-len('.tmp')])
+        else:
+            out.write(result)
+            out.flush()
+            os.fsync(out.fileno())
+            checkpoint['output_bytes'] = out.tell()
+        checkpoint['input_offset'] = chunk['end']
+        checkpoint['chunks'] += 1
+        checkpoint['rows'] += len(chunk['offsets'])
+        checkpoint['skipped'] += chunk['skipped']
+        save_checkpoint(args.checkpoint, checkpoint)
+        elapsed = time.perf_counter() - started
+        scored = checkpoint['rows'] - start_rows
+        print(f"{checkpoint['rows']} rows scored ({scored / elapsed if elapsed else 0:.0f} rows/s)")
+
+    def finish(item):
+        chunk, future = item
+        commit(chunk, future.result() if executor is not None else future)
+
+    iter_records = iter_csv_records if args.input_format == 'csv' else iter_jsonl_records
+    try:
+        with open(args.input, 'rb') as f:
+            records = iter_records(f, checkpoint['input_offset'], args.text_columns, args.id_column)
+            for chunk in iter_chunks(records, args.chunk_size, checkpoint['chunks'], bool(args.id_column)):
+                task = (chunk, args.format, args.include_text, parts_dir)
+                if executor is None:
+                    # Inline: score and commit in order, nothing to pipeline
+                    commit(chunk, score_chunk(*task))
+                    continue
+                pending.append((chunk, executor.submit(score_chunk, *task)))
+                # Bounded read-ahead keeps memory flat while every worker stays busy
+                if len(pending) >= args.workers * 2:
+                    finish(pending.popleft())
+            while pending:
+                finish(pending.popleft())
+        checkpoint['complete'] = True
+        save_checkpoint(args.checkpoint, checkpoint)
+    except KeyboardInterrupt:
+        print(f"Interrupted after {checkpoint['rows']} rows; rerun the same command to resume.")
+        raise SystemExit(130)
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if out is not None:
+            out.close()
+
+    print(f"Scored {checkpoint['rows']} rows into {args.output} "
+          f"({checkpoint['skipped']} skipped, {time.perf_counter() - started:.1f}s).")
+    return checkpoint
+
+
+def detect_format(path, choices):
+    ext = os.path.splitext(path.rstrip('/'))[1].lower().lstrip('.')
+    ext = {'ndjson': 'jsonl', 'pq': 'parquet'}.get(ext, ext)
+    return ext if ext in choices else None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Score a CSV/JSONL corpus with the local classifier and heuristics.")
+    parser.add_argument('input', help="CSV or JSONL file to score")
+    parser.add_argument('output', help="Output .csv, .jsonl or .parquet (a directory of part files)")
+    parser.add_argument('--input-format', choices=INPUT_FORMATS, default=None, help="Default: from the input extension")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None, help="Default: from the output extension")
+    parser.add_argument('--text-column', dest='text_columns', action='append', default=None,
+                        help="Column/field holding the text; repeat to join several (default: tweet for CSV, text for JSONL)")
+    parser.add_argument('--id-column', default=None, help="Column/field copied to the output as 'id'")
+    parser.add_argument('--include-text', action='store_true', help="Copy the scored text to the output")
+    parser.add_argument('--chunk-size', type=int, default=10000, help="Records per chunk")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Scoring processes (1 = inline)")
+    parser.add_argument('--checkpoint', default=None, help="Default: <output>.checkpoint.json")
+    parser.add_argument('--restart', action='store_true', help="Ignore any checkpoint and overwrite the output")
+    parser.add_argument('--model', default=os.getenv('MODEL_PATH') or os.path.join(MODULE_DIR, 'model.pkl'))
+    parser.add_argument('--vectorizer', default=os.getenv('VECTORIZER_PATH') or os.path.join(MODULE_DIR, 'vectorizer.pkl'))
+    parser.add_argument('--lean-model', default=os.getenv('LEAN_MODEL_PATH', os.path.join(MODULE_DIR, 'model_lean')),
+                        help="Lean NumPy artifact, preferred over the pickles (empty to skip)")
+    parser.add_argument('--phrases', default=os.getenv('HEURISTICS_PHRASES_PATH') or None,
+                        help="Sensational phrase list for the heuristics")
+    parser.add_argument('--ensemble', default=None,
+                        help="Calibrated ensemble from train.py for the calibrated_prob_real column "
+                             "(default: ensemble.json next to this script if present; empty to skip)")
+    args = parser.parse_args(argv)
+
+    args.input_format = args.input_format or detect_format(args.input, INPUT_FORMATS)
+    if args.input_format is None:
+        parser.error("cannot tell the input format from its extension; pass --input-format")
+    args.format = args.format or detect_format(args.output, OUTPUT_FORMATS)
+    if args.format is None:
+        parser.error("cannot tell the output format from its extension; pass --format")
+    if args.format == 'parquet':
+        if importlib.util.find_spec('pyarrow') is None:
+            parser.error("parquet output needs pyarrow (pip install pyarrow)")
+    args.text_columns = args.text_columns or DEFAULT_TEXT_COLUMNS[args.input_format]
+    args.chunk_size = max(1, args.chunk_size)
+    args.checkpoint = args.checkpoint or args.output.rstrip('/') + '.checkpoint.json'
+    if args.ensemble is None:
+        default = os.getenv('ENSEMBLE_PATH', os.path.join(MODULE_DIR, 'ensemble.json'))
+        args.ensemble = default if default and os.path.exists(default) else ''
+    if args.ensemble:
+        # Fail before scoring anything if the ensemble was fitted for another model
+        try:
+            CalibratedEnsemble.load(args.ensemble, source_paths=[args.model, args.vectorizer])
+        except (OSError, ValueError, KeyError) as e:
+            parser.error(f"cannot use ensemble {args.ensemble}: {e}")
+    return args
+
+
+if __name__ == '__main__':
+    run(parse_args())
@@ -0,0 +1,239 @@
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+# The TF-IDF vocabulary drops stop words such as "not" and most numbers, so
+# "X does not cause Y" and "X causes Y in 2019" look identical to the vectors.
+# A match is only reused when the negations and numbers of both claims agree.
+_NEGATION_RE = re.compile(
+    r"\b(?:not|no|never|none|nobody|nothing|nowhere|neither|nor|cannot|without)\b|n['’]t\b"
+)
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def claim_guard(text):
+    # (number of negations, sorted numbers) that must match exactly before reuse
+    text = (text or "").casefold()
+    numbers = sorted(n.replace(',', '') for n in _NUMBER_RE.findall(text))
+    return len(_NEGATION_RE.findall(text)), numbers
+
+
+# In-memory near-duplicate index over previously verified claims.
+# Claims are embedded with the fitted TF-IDF vectorizer (rows are L2-normalized,
+# so a sparse matrix-vector product gives cosine similarity). Inserts are appended
+# to a JSONL log so the index can be rebuilt on restart without re-vectorizing.
+# Each record carries the fingerprint of the vectorizer that produced it; records
+# from another vectorizer (a retrain, the streaming model) are re-vectorized from
+# their text on load and the log is rewritten. Entries older than ttl_seconds are
+# never served, the same TTL as the exact verdict cache.
+# Past max_entries the oldest claims are evicted in one batch, down to 90% of the
+# cap, so the matrix is rebuilt and the log compacted once per batch of inserts.
+class ClaimIndex:
+    def __init__(self, vectorizer, threshold=0.8, path=None, ttl_seconds=None, fingerprint=None,
+                 max_entries=50000):
+        self.vectorizer = vectorizer
+        self.threshold = float(threshold)
+        self.path = path
+        self.ttl_seconds = float(ttl_seconds) if ttl_seconds else None
+        self.max_entries = max(1, int(max_entries))
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        # Works for vocabulary-based and hashing vectorizers alike
+        self._dim = vectorizer.transform(['']).shape[1]
+        self._matrix = sp.csr_matrix((0, self._dim), dtype=np.float64)
+        self._pending = []
+        self._entries = []
+        self._positions = {}
+        self._log_lines = 0
+        self._stats = {'hits': 0, 'misses': 0, 'inserts': 0, 'expired': 0, 'guard_rejections': 0, 'evictions': 0}
+        if path:
+            self._load(path)
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return
+        rows = []
+        rewrite = False
+        now = time.time()
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                self._log_lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write; everything before it is intact
+                    continue
+                if self._expired(record.get('created_at'), now):
+                    rewrite = True
+                    continue
+                if record.get('fingerprint') != self.fingerprint:
+                    # Built by another vectorizer: its stored vector means nothing here
+                    rewrite = True
+                    row = self._vectorize(record['text'])
+                    if row.nnz == 0:
+                        continue
+                else:
+                    indices = np.asarray(record['indices'], dtype=np.int32)
+                    data = np.asarray(record['data'], dtype=np.float64)
+                    row = sp.csr_matrix((data, indices, [0, len(indices)]), shape=(1, self._dim))
+                position = self._positions.get(record['key'])
+                if self._store_entry(record):
+                    rows.append(row)
+                elif self._entries[position]['created_at'] != record.get('created_at'):
+                    rewrite = True
+        if rows:
+            self._matrix = sp.vstack(rows, format='csr')
+        if self._evict():
+            rewrite = True
+        if rewrite:
+            try:
+                self._rewrite(path)
+            except OSError as e:
+                print(f"Warning: Failed to compact claim index log: {e}")
+
+    def _rewrite(self, path):
+        # Compact the log to one current record per live claim; written aside, then swapped in
+        self._flush_pending()
+        temp_path = path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for position, entry in enumerate(self._entries):
+                row = self._matrix[position]
+                f.write(json.dumps(self._record(entry['key'], entry['text'], row, entry['verdict'], entry['created_at'])) + "\n")
+        os.replace(temp_path, path)
+        self._log_lines = len(self._entries)
+
+    def _evict(self):
+        # Over max_entries: keep the newest claims (an expired claim is always among
+        # the oldest) and rebuild the matrix from their rows. True if anything went.
+        if len(self._entries) <= self.max_entries:
+            return False
+        self._flush_pending()
+        keep_count = self.max_entries - self.max_entries // 10
+        by_age = sorted(range(len(self._entries)), key=lambda p: self._entries[p]['created_at'] or 0)
+        keep = sorted(by_age[len(by_age) - keep_count:])
+        self._stats['evictions'] += len(self._entries) - len(keep)
+        self._matrix = self._matrix[keep]
+        self._entries = [self._entries[p] for p in keep]
+        self._positions = {entry['key']: p for p, entry in enumerate(self._entries)}
+        return True
+
+    def _record(self, key, text, row, verdict, created_at):
+        return {
+            'key': key,
+            'text': text,
+            'indices': row.indices.tolist(),
+            'data': [round(float(v), 6) for v in row.data],
+            'verdict': verdict,
+            'created_at': created_at,
+            'fingerprint': self.fingerprint
+        }
+
+    def _store_entry(self, record):
+        # Returns True when the record needs a new matrix row. A re-verified claim
+        # keeps its existing row and just serves the newest verdict from now on.
+        position = self._positions.get(record['key'])
+        if position is not None:
+            self._entries[position]['verdict'] = record['verdict']
+            self._entries[position]['created_at'] = record.get('created_at')
+            return False
+        self._positions[record['key']] = len(self._entries)
+        self._entries.append({
+            'key': record['key'],
+            'text': record['text'],
+            'guard': claim_guard(record['text']),
+            'verdict': record['verdict'],
+            'created_at': record.get('created_at')
+        })
+        return True
+
+    def _expired(self, created_at, now):
+        if self.ttl_seconds is None:
+            return False
+        return created_at is None or created_at + self.ttl_seconds <= now
+
+    def _vectorize(self, text):
+        row = self.vectorizer.transform([text]).tocsr()
+        row.sort_indices()
+        return row
+
+    def _flush_pending(self):
+        # Appends are buffered and merged into the CSR matrix on the next lookup
+        if self._pending:
+            self._matrix = sp.vstack([self._matrix] + self._pending, format='csr')
+            self._pending = []
+
+    def lookup(self, text):
+        # Best live match above the threshold whose negations and numbers agree, or None.
+        # 'expires_at' tells the caller how long the reused verdict may still be cached.
+        row = self._vectorize(text)
+        guard = claim_guard(text)
+        now = time.time()
+        with self._lock:
+            self._flush_pending()
+            if row.nnz == 0 or self._matrix.shape[0] == 0:
+                self._stats['misses'] += 1
+                return None
+            scores = (self._matrix @ row.T).toarray().ravel()
+            candidates = np.flatnonzero(scores >= self.threshold)
+            for position in candidates[np.argsort(-scores[candidates], kind='stable')]:
+                entry = self._entries[position]
+                if self._expired(entry['created_at'], now):
+                    self._stats['expired'] += 1
+                    continue
+                if entry['guard'] != guard:
+                    self._stats['guard_rejections'] += 1
+                    continue
+                self._stats['hits'] += 1
+                return {
+                    'key': entry['key'],
+                    'text': entry['text'],
+                    'similarity': round(float(scores[position]), 4),
+                    'verdict': json.loads(json.dumps(entry['verdict'])),
+                    'expires_at': entry['created_at'] + self.ttl_seconds if self.ttl_seconds is not None else None
+                }
+            self._stats['misses'] += 1
+            return None
+
+    def add(self, key, text, verdict):
+        row = self._vectorize(text)
+        if row.nnz == 0:
+            return False
+        record = self._record(key, text, row, verdict, time.time())
+        with self._lock:
+            if self._store_entry(record):
+                self._pending.append(row)
+            self._stats['inserts'] += 1
+            evicted = self._evict()
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+                self._log_lines += 1
+                # Re-verified claims also leave stale lines behind
+                if evicted or self._log_lines > 2 * self.max_entries:
+                    try:
+                        self._rewrite(self.path)
+                    except OSError as e:
+                        print(f"Warning: Failed to compact claim index log: {e}")
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._positions)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._positions)
+            stats['threshold'] = self.threshold
+            stats['ttl_seconds'] = self.ttl_seconds
+            stats['max_entries'] = self.max_entries
+            stats['persistent'] = bool(self.path)
+        return stats
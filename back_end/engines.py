@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Deferred initialisation of the backend's heavy engines (LLM client, local model,
+# indexes, image forensics).
+#
+# Each Engine wraps a loader that does the expensive imports and file loads. get()
+# runs the loader once, on first use, and later calls return the cached value without
+# taking a lock. The registry can warm every engine up front (eager start) or on a
+# background thread, so a new instance can answer /api/ready before its engines are
+# loaded. A fork waits for any load in progress to finish, since a child must never
+# inherit a half-imported module. The child then resumes warming where the parent
+# left off. Only engines marked required hold back readiness; optional ones (image
+# forensics) keep warming after /api/ready turns 200, or load on their first request.
+
+COLD = 'cold'
+WARMING = 'warming'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class Engine:
+    def __init__(self, name, loader, required=True):
+        self.name = name
+        self.loader = loader
+        self.required = required
+        self.state = COLD
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self.state in (READY, FAILED):
+            return self.value
+        with self._lock:
+            if self.state in (READY, FAILED):
+                return self.value
+            self.state = WARMING
+            start = time.perf_counter()
+            try:
+                value = self.loader()
+            except Exception as e:
+                print(f"Warning: Failed to load {self.name}: {e}")
+                self.error = str(e)
+                self.state = FAILED
+            else:
+                self.value = value
+                self.state = READY
+            finally:
+                self.load_seconds = time.perf_counter() - start
+        return self.value
+
+    def peek(self):
+        # The value if already loaded, without triggering a load (e.g. for /metrics)
+        return self.value if self.state == READY else None
+
+    def status(self):
+        return {
+            'state': self.state,
+            'required': self.required,
+            'available': self.value is not None,
+            'load_seconds': round(self.load_seconds, 4) if self.load_seconds is not None else None,
+            'error': self.error
+        }
+
+
+class EngineRegistry:
+    def __init__(self):
+        self.engines = OrderedDict()
+        self.mode = 'eager'
+        self._warming = False
+        self._started_at = time.perf_counter()
+        self._ready_seconds = None
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(
+                before=self._before_fork,
+                after_in_parent=self._after_fork_in_parent,
+                after_in_child=self._after_fork_in_child
+            )
+
+    def register(self, name, loader, required=True):
+        engine = self.engines[name] = Engine(name, loader, required)
+        return engine
+
+    def warm_all(self):
+        # Load in registration order; dependencies are simply registered first.
+        # seconds_to_ready is taken as soon as the required engines have settled,
+        # while optional ones registered after them may still be loading.
+        for engine in list(self.engines.values()):
+            if self._ready_seconds is None and self._required_settled():
+                self._ready_seconds = time.perf_counter() - self._started_at
+            engine.get()
+        if self._ready_seconds is None:
+            self._ready_seconds = time.perf_counter() - self._started_at
+
+    def start_background(self):
+        self._warming = True
+        thread = threading.Thread(target=self.warm_all, name='engine-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def _before_fork(self):
+        # Loaders only call engines registered before them, so taking the locks in
+        # reverse order cannot deadlock with a load in progress
+        for engine in reversed(list(self.engines.values())):
+            engine._lock.acquire()
+
+    def _after_fork_in_parent(self):
+        for engine in self.engines.values():
+            engine._lock.release()
+
+    def _after_fork_in_child(self):
+        for engine in self.engines.values():
+            engine._lock = threading.Lock()
+        # Resume warming anything still cold, optional engines included
+        if self._warming and any(e.state not in (READY, FAILED) for e in self.engines.values()):
+            self.start_background()
+
+    def _required_settled(self):
+        return all(e.state in (READY, FAILED) for e in self.engines.values() if e.required)
+
+    def is_ready(self):
+        # Without a warm-up, engines load on first use and a cold one is not waiting on anything
+        settled = (READY, FAILED) if self._warming else (COLD, READY, FAILED)
+        return all(e.state in settled for e in self.engines.values() if e.required)
+
+    def status(self):
+        return {
+            'ready': self.is_ready(),
+            'startup_mode': self.mode,
+            'seconds_to_ready': round(self._ready_seconds, 4) if self._ready_seconds is not None else None,
+            'engines': {name: engine.status() for name, engine in self.engines.items()}
+        }
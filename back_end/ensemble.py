@@ -0,0 +1,202 @@
+import json
+import os
+
+import numpy as np
+
+# Combination of the LLM verdict, the local classifier and the text heuristics into
+# the meta_analysis score.
+#
+# Scorers work on whole batches: ensemble_inputs() turns result dicts into NumPy
+# arrays and score() returns arrays, so one request and a 500-claim batch take the
+# same code path. LegacyEnsemble is the original hand-tuned formula. CalibratedEnsemble
+# is fitted offline by `train.py` and written to ensemble.json next to model.pkl. It
+# first calibrates the classifier's probability (Platt or isotonic), then pools the
+# evidence as log-odds, P(real) = sigmoid(b + w . features), so the combined score
+# is an actual probability. Training and serving build features with the same
+# functions below.
+
+ENSEMBLE_FORMAT_VERSION = 1
+# Column order of the combination weights
+FEATURE_NAMES = ['ml_logit', 'heuristic_risk', 'llm_evidence']
+HEURISTIC_RISK_MAX = 40.0
+_EPS = 1e-4
+
+
+def logit(p):
+    p = np.clip(np.asarray(p, dtype=np.float64), _EPS, 1.0 - _EPS)
+    return np.log(p / (1.0 - p))
+
+
+def sigmoid(z):
+    return 1.0 / (1.0 + np.exp(-np.asarray(z, dtype=np.float64)))
+
+
+def verdict_confidence(result):
+    # LLM confidence as 0-100; verdicts cached before confidence_score only carry "95%"
+    score = result.get('confidence_score')
+    if isinstance(score, (int, float)) and not isinstance(score, bool):
+        return float(score)
+    try:
+        return float(str(result.get('confidence', '')).replace('%', '').strip())
+    except ValueError:
+        return np.nan
+
+
+def verdict_direction(verdicts):
+    # +1 for TRUE, -1 for FALSE, 0 for MIXED / UNVERIFIABLE / missing
+    verdicts = np.asarray(verdicts, dtype=object)
+    return (verdicts == 'TRUE').astype(np.float64) - (verdicts == 'FALSE').astype(np.float64)
+
+
+def llm_evidence(verdicts, confidence):
+    # Stated confidence read as log-odds for "real"; below 50% or missing counts as none
+    p = np.clip(np.nan_to_num(np.asarray(confidence, dtype=np.float64) / 100.0, nan=0.5), 0.5, 0.99)
+    return verdict_direction(verdicts) * logit(p)
+
+
+def feature_matrix(ml_logits, heuristic_risk, evidence):
+    return np.column_stack([
+        np.nan_to_num(np.asarray(ml_logits, dtype=np.float64)),
+        np.asarray(heuristic_risk, dtype=np.float64) / HEURISTIC_RISK_MAX,
+        np.asarray(evidence, dtype=np.float64)
+    ])
+
+
+def ensemble_inputs(results, ml_results, heuristics):
+    # Column arrays for score() from per-claim result, ml_result and heuristics dicts
+    ml_results = [m if m and 'confidence' in m else None for m in ml_results]
+    return {
+        'verdict': np.array([str(r.get('verdict', '')).upper() for r in results], dtype=object),
+        'llm_confidence': np.array([verdict_confidence(r) for r in results], dtype=np.float64),
+        'ml_available': np.array([m is not None for m in ml_results], dtype=bool),
+        'ml_real': np.array([m is not None and m.get('label') == 'Real' for m in ml_results], dtype=bool),
+        'ml_confidence': np.array([float(m['confidence']) if m else 0.0 for m in ml_results], dtype=np.float64),
+        'ml_prob_real': np.array(
+            [float((m.get('raw_probs') or {}).get('real', np.nan)) if m else np.nan for m in ml_results],
+            dtype=np.float64
+        ),
+        'heuristic_risk': np.array([h['heuristic_risk_bonus'] for h in heuristics], dtype=np.float64)
+    }
+
+
+def engines_agree(inputs):
+    # Local label matches the LLM verdict (TRUE <-> Real); only meaningful where ml_available
+    return inputs['ml_real'] == (inputs['verdict'] == 'TRUE')
+
+
+class LegacyEnsemble:
+    # The original fixed weights: 0.6/0.4 when the engines agree, 0.5/0.5 - 15 when
+    # they disagree, then + 0.5 x heuristic risk, clipped to 0-100
+    name = 'legacy'
+
+    def score(self, inputs):
+        llm = np.nan_to_num(inputs['llm_confidence'], nan=0.0)
+        ml = inputs['ml_confidence']
+        agree = engines_agree(inputs)
+        combined = np.where(
+            inputs['ml_available'],
+            np.where(agree, llm * 0.6 + ml * 0.4, np.maximum(0.0, llm * 0.5 + ml * 0.5 - 15)),
+            llm
+        )
+        return {
+            'combined_confidence_score': np.clip(combined + inputs['heuristic_risk'] * 0.5, 0, 100),
+            'engines_agree': agree,
+            'probability_real': None
+        }
+
+
+class CalibratedEnsemble:
+    name = 'calibrated'
+
+    def __init__(self, params):
+        self.params = params
+        calibration = params['calibration']
+        self.method = calibration['method']
+        if self.method == 'platt':
+            self.platt = (float(calibration['a']), float(calibration['b']))
+        elif self.method == 'isotonic':
+            self.iso_x = np.asarray(calibration['x'], dtype=np.float64)
+            self.iso_y = np.asarray(calibration['y'], dtype=np.float64)
+        else:
+            raise ValueError(f"Unknown calibration method: {self.method}")
+        weights = params['weights']
+        self.intercept = float(weights['intercept'])
+        self.weights = np.array([float(weights[name]) for name in FEATURE_NAMES])
+
+    @classmethod
+    def load(cls, path, source_paths=None):
+        with open(path) as f:
+            params = json.load(f)
+        if params.get('format_version') != ENSEMBLE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported ensemble format: {params.get('format_version')}")
+        if params.get('llm_weight_fitted') is False:
+            # Its LLM weight is 0: serving it would drop the Perplexity verdict from the score
+            raise ValueError("Ensemble was fitted without LLM verdicts; re-run train.py with --llm-verdicts")
+        # Calibration only holds for the exact model it was fitted on
+        from lean_model import file_sha256
+        recorded = params.get('source_sha256') or {}
+        for source in source_paths or []:
+            if recorded and os.path.exists(source) and recorded.get(os.path.basename(source)) != file_sha256(source):
+                raise ValueError(f"Ensemble was fitted for a different {os.path.basename(source)}; re-run train.py")
+        return cls(params)
+
+    def calibrate(self, prob_real):
+        # Calibrated P(real) from the classifier's raw probability; NaN stays NaN
+        prob_real = np.asarray(prob_real, dtype=np.float64)
+        if self.method == 'platt':
+            a, b = self.platt
+            calibrated = sigmoid(a * logit(prob_real) + b)
+        else:
+            calibrated = np.interp(prob_real, self.iso_x, self.iso_y)
+        return np.where(np.isnan(prob_real), np.nan, calibrated)
+
+    def probability_real(self, ml_prob_real, heuristic_risk, verdicts, llm_confidence):
+        features = feature_matrix(
+            logit(self.calibrate(ml_prob_real)),
+            heuristic_risk,
+            llm_evidence(verdicts, llm_confidence)
+        )
+        return sigmoid(self.intercept + features @ self.weights)
+
+    def score(self, inputs):
+        prob_real = inputs['ml_prob_real']
+        # Without a local model the ml feature is 0: no evidence either way
+        prob_real = np.where(inputs['ml_available'], prob_real, np.nan)
+        p = self.probability_real(prob_real, inputs['heuristic_risk'], inputs['verdict'], inputs['llm_confidence'])
+        direction = verdict_direction(inputs['verdict'])
+        # Confidence in the verdict's direction; MIXED/UNVERIFIABLE get the likelier side
+        combined = np.where(direction > 0, p, np.where(direction < 0, 1.0 - p, np.maximum(p, 1.0 - p)))
+        return {
+            'combined_confidence_score': combined * 100.0,
+            'engines_agree': engines_agree(inputs),
+            'probability_real': p
+        }
+
+
+def load_ensemble(path, source_paths=None):
+    # The fitted ensemble when one is present and matches the model, else the legacy formula
+    if path and os.path.exists(path):
+        try:
+            scorer = CalibratedEnsemble.load(path, source_paths)
+            print(f"Loaded calibrated ensemble ({scorer.method}) for TruthLense.")
+            return scorer
+        except Exception as e:
+            print(f"Warning: Failed to load ensemble, using the legacy combined score: {e}")
+    return LegacyEnsemble()
+
+
+def meta_analysis_dicts(scorer, inputs, heuristics):
+    # One meta_analysis dict per claim from a single vectorized score() call
+    scores = scorer.score(inputs)
+    combined = scores['combined_confidence_score']
+    probability = scores['probability_real']
+    return [
+        {
+            'combined_confidence_score': round(float(combined[i]), 1),
+            'engines_agree': bool(scores['engines_agree'][i]) if inputs['ml_available'][i] else None,
+            'probability_real': round(float(probability[i]), 4) if probability is not None else None,
+            'scorer': scorer.name,
+            'heuristics': heuristics[i]
+        }
+        for i in range(len(heuristics))
+    ]
@@ -0,0 +1,169 @@
+import os
+from collections import deque
+
+import numpy as np
+
+# Text heuristics shared by single, batch and offline scoring.
+#
+# Sensational phrases are matched with an Aho-Corasick automaton over the lowercased
+# text, so the cost per document depends on its length, not on the size of the
+# phrase dictionary. The automaton pass also counts '!'; words, all-caps words and
+# URLs come from a separate walk over str.split(), which costs one step per word
+# instead of word-boundary tracking on every character of the automaton loop.
+# Phrases are loaded from a plain-text file (one per line, '#' starts a comment) so
+# they can be extended without code changes.
+
+DEFAULT_PHRASES_PATH = os.path.join(os.path.dirname(__file__), 'sensational_phrases.txt')
+
+# Column order of HeuristicEngine.feature_matrix()
+FEATURE_NAMES = [
+    'length_chars',
+    'length_words',
+    'num_exclamation_marks',
+    'num_urls',
+    'has_all_caps_word',
+    'has_sensational_phrase',
+    'heuristic_risk_bonus'
+]
+
+
+def is_url_word(word):
+    # Same test as re.search(r"https?://\S+", word) on a whitespace-free word: a scheme
+    # with at least one character after it. A first occurrence that ends the word has
+    # no later one.
+    for scheme in ('http://', 'https://'):
+        position = word.find(scheme)
+        if position != -1 and position + len(scheme) < len(word):
+            return True
+    return False
+
+
+def load_phrases(path):
+    phrases = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                phrases.append(line)
+    return phrases
+
+
+class PhraseMatcher:
+    def __init__(self, phrases):
+        self.phrases = []
+        # Trie as parallel lists: transitions, failure links, matched phrase ids
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [()]
+        for phrase in phrases:
+            self._add(phrase.lower())
+        self._build()
+
+    def _add(self, phrase):
+        if not phrase:
+            return
+        state = 0
+        for ch in phrase:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = nxt
+        self._out[state] = self._out[state] + (len(self.phrases),)
+        self.phrases.append(phrase)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                # Inherit matches that end at the failure state
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, lowered):
+        # One pass over already-lowercased text: (matched phrase ids, '!' count)
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+        matched = set()
+        exclamations = 0
+        for ch in lowered:
+            if ch == '!':
+                exclamations += 1
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                matched.update(out[state])
+        return matched, exclamations
+
+
+class HeuristicEngine:
+    def __init__(self, phrases):
+        self.matcher = PhraseMatcher(phrases)
+
+    @classmethod
+    def from_file(cls, path=None):
+        return cls(load_phrases(path or DEFAULT_PHRASES_PATH))
+
+    def matched_phrases(self, text):
+        matched, _ = self.matcher.scan((text or "").lower())
+        return sorted(self.matcher.phrases[i] for i in matched)
+
+    def extract(self, text):
+        text = text or ""
+        words = text.split()
+        num_words = len(words)
+        has_all_caps_word = False
+        num_urls = 0
+        for w in words:
+            if not has_all_caps_word and len(w) > 4 and w.isupper():
+                has_all_caps_word = True
+            # Same count as re.findall(r"https?://\S+", text): at most one match per word
+            if 'http' in w and is_url_word(w):
+                num_urls += 1
+        matched, num_exclam = self.matcher.scan(text.lower())
+        has_sensational_phrase = bool(matched)
+
+        heuristic_risk = 0
+        if num_exclam >= 3:
+            heuristic_risk += 10
+        if has_all_caps_word:
+            heuristic_risk += 10
+        if num_urls >= 2:
+            heuristic_risk += 10
+        if has_sensational_phrase:
+            heuristic_risk += 15
+        if num_words < 8 or num_words > 200:
+            heuristic_risk += 5
+        heuristic_risk = min(40, heuristic_risk)
+
+        return {
+            'length_chars': len(text),
+            'length_words': num_words,
+            'num_exclamation_marks': num_exclam,
+            'num_urls': num_urls,
+            'has_all_caps_word': has_all_caps_word,
+            'has_sensational_phrase': has_sensational_phrase,
+            'heuristic_risk_bonus': heuristic_risk
+        }
+
+    def extract_batch(self, texts):
+        return [self.extract(text) for text in texts]
+
+    def feature_matrix(self, texts):
+        # (n_texts, len(FEATURE_NAMES)) float array for vectorized batch scoring
+        matrix = np.zeros((len(texts), len(FEATURE_NAMES)), dtype=np.float64)
+        for i, text in enumerate(texts):
+            features = self.extract(text)
+            matrix[i] = [float(features[name]) for name in FEATURE_NAMES]
+        return matrix
@@ -0,0 +1,276 @@
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+
+from verdict_cache import claim_key
+
+# Persistent history of every verification the API answered.
+#
+# Rows live in SQLite (WAL, so readers never block the writer) with indexes on
+# verdict, time and the normalized claim key, plus an FTS5 index over the claim text.
+# record() only puts the row on a bounded queue; one background thread drains it and
+# commits up to batch_size rows per transaction, so the request path never waits on
+# disk. When the queue is full, records are dropped and counted instead of applying
+# backpressure to requests. search() uses keyset pagination (id < cursor, newest first),
+# so every page costs the same no matter how deep it is or how large the table grows.
+
+SUMMARY_COLUMNS = (
+    'id', 'claim', 'verdict', 'confidence', 'combined_score',
+    'ml_label', 'ml_confidence', 'degraded', 'source', 'created_at'
+)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS verifications ("
+    " id INTEGER PRIMARY KEY,"
+    " claim_key TEXT NOT NULL,"
+    " claim TEXT NOT NULL,"
+    " verdict TEXT,"
+    " confidence REAL,"
+    " combined_score REAL,"
+    " ml_label TEXT,"
+    " ml_confidence REAL,"
+    " degraded INTEGER NOT NULL DEFAULT 0,"
+    " source TEXT,"
+    " created_at REAL NOT NULL,"
+    " result TEXT NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_verifications_created_at ON verifications (created_at)",
+    "CREATE INDEX IF NOT EXISTS idx_verifications_verdict ON verifications (verdict, id)",
+    "CREATE INDEX IF NOT EXISTS idx_verifications_claim_key ON verifications (claim_key, id)"
+)
+_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS verifications_fts USING fts5("
+    " claim, content='verifications', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS verifications_fts_insert AFTER INSERT ON verifications BEGIN"
+    " INSERT INTO verifications_fts (rowid, claim) VALUES (new.id, new.claim); END",
+    "CREATE TRIGGER IF NOT EXISTS verifications_fts_delete AFTER DELETE ON verifications BEGIN"
+    " INSERT INTO verifications_fts (verifications_fts, rowid, claim) VALUES ('delete', old.id, old.claim); END"
+)
+
+
+def fts_query(text):
+    # Every word must match, each as a quoted phrase so user input is never FTS syntax
+    return ' '.join('"' + token + '"' for token in _TOKEN_RE.findall(text or ''))
+
+
+def parse_confidence(result):
+    score = result.get('confidence_score')
+    if isinstance(score, (int, float)) and not isinstance(score, bool):
+        return float(score)
+    try:
+        return float(str(result.get('confidence', '')).replace('%', '').strip())
+    except ValueError:
+        return None
+
+
+class VerificationHistory:
+    def __init__(self, db_path, batch_size=256, flush_seconds=0.5, queue_size=10000):
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.flush_seconds = float(flush_seconds)
+        self._queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'write_errors': 0}
+        self._closed = False
+
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._writer = self._connect()
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        self._writer.execute("PRAGMA synchronous=NORMAL")
+        for statement in _SCHEMA:
+            self._writer.execute(statement)
+        self.full_text = True
+        try:
+            for statement in _FTS_SCHEMA:
+                self._writer.execute(statement)
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5: search falls back to LIKE
+            print(f"Warning: FTS5 unavailable, history search will use LIKE: {e}")
+            self.full_text = False
+        self._writer.commit()
+
+        self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+        self._thread.start()
+
+    def _connect(self):
+        db = sqlite3.connect(self.db_path, check_same_thread=False, timeout=5.0)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def _reader(self):
+        # One read connection per thread; WAL readers see the last committed batch
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = self._local.db = self._connect()
+            db.execute("PRAGMA query_only=1")
+        return db
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+    # --- Writes ---
+
+    def record(self, text, result, source=None):
+        # Non-blocking; the row is written by the background thread
+        if self._closed:
+            return False
+        row = (
+            claim_key(text),
+            text,
+            result.get('verdict'),
+            parse_confidence(result),
+            (result.get('meta_analysis') or {}).get('combined_confidence_score'),
+            (result.get('ml_model') or {}).get('label'),
+            (result.get('ml_model') or {}).get('confidence'),
+            1 if result.get('degraded') else 0,
+            source,
+            time.time(),
+            json.dumps(result)
+        )
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('recorded')
+        return True
+
+    def _run(self):
+        while True:
+            row = self._queue.get()
+            if row is None:
+                self._queue.task_done()
+                return
+            batch = [row]
+            deadline = time.monotonic() + self.flush_seconds
+            stop = False
+            # Gather more rows until the batch is full or the flush interval is up
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    row = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if row is None:
+                    stop = True
+                    break
+                batch.append(row)
+            self._write(batch)
+            for _ in range(len(batch) + (1 if stop else 0)):
+                self._queue.task_done()
+            if stop:
+                return
+
+    def _write(self, batch):
+        try:
+            with self._writer:
+                self._writer.executemany(
+                    "INSERT INTO verifications (claim_key, claim, verdict, confidence, combined_score,"
+                    " ml_label, ml_confidence, degraded, source, created_at, result)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    batch
+                )
+        except sqlite3.Error as e:
+            print(f"Warning: failed to write {len(batch)} history rows: {e}")
+            self._count('write_errors')
+            return
+        self._count('written', len(batch))
+        self._count('batches')
+
+    def flush(self):
+        # Block until everything recorded so far is committed
+        self._queue.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self._writer.close()
+
+    # --- Reads ---
+
+    def search(self, q=None, text=None, verdict=None, source=None, since=None, until=None,
+               cursor=None, limit=20):
+        # Newest first; returns (summaries, next_cursor or None)
+        where = []
+        params = []
+        joins = ''
+        order = 'v.id'
+        if q:
+            match = fts_query(q)
+            if not match:
+                return [], None
+            if self.full_text:
+                # FTS drives the scan in rowid order, so LIMIT stops it early
+                joins = ' JOIN verifications_fts f ON f.rowid = v.id'
+                where.append('verifications_fts MATCH ?')
+                params.append(match)
+                order = 'f.rowid'
+            else:
+                for token in _TOKEN_RE.findall(q):
+                    where.append("v.claim LIKE ? ESCAPE '\\'")
+                    params.append('%' + token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+        if text is not None:
+            where.append('v.claim_key = ?')
+            params.append(claim_key(text))
+        if verdict:
+            where.append('v.verdict = ?')
+            params.append(verdict)
+        if source:
+            where.append('v.source = ?')
+            params.append(source)
+        if since is not None:
+            where.append('v.created_at >= ?')
+            params.append(since)
+        if until is not None:
+            where.append('v.created_at < ?')
+            params.append(until)
+        if cursor is not None:
+            where.append(f'{order} < ?')
+            params.append(cursor)
+        sql = (
+            'SELECT ' + ', '.join('v.' + c for c in SUMMARY_COLUMNS) + ' FROM verifications v' + joins
+            + (' WHERE ' + ' AND '.join(where) if where else '')
+            + f' ORDER BY {order} DESC LIMIT ?'
+        )
+        # One extra row tells whether another page exists
+        rows = self._reader().execute(sql, params + [limit + 1]).fetchall()
+        items = [self._summary(row) for row in rows[:limit]]
+        next_cursor = items[-1]['id'] if len(rows) > limit else None
+        return items, next_cursor
+
+    def get(self, record_id):
+        row = self._reader().execute(
+            'SELECT ' + ', '.join(SUMMARY_COLUMNS) + ', result FROM verifications WHERE id = ?', (record_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        item = self._summary(row)
+        item['result'] = json.loads(row['result'])
+        return item
+
+    def _summary(self, row):
+        item = {name: row[name] for name in SUMMARY_COLUMNS}
+        item['degraded'] = bool(item['degraded'])
+        return item
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['queue_size'] = self._queue.maxsize
+        stats['batch_size'] = self.batch_size
+        stats['full_text'] = self.full_text
+        stats['db_path'] = self.db_path
+        # MAX(id) is an O(1) b-tree lookup; COUNT(*) would scan millions of rows
+        (stats['last_id'],) = self._reader().execute('SELECT MAX(id) FROM verifications').fetchone()
+        return stats
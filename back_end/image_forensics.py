@@ -0,0 +1,297 @@
+import hashlib
+import io
+import os
+import tarfile
+import zipfile
+
+import numpy as np
+from PIL import Image
+from PIL.ExifTags import TAGS
+
+import metrics
+from image_hash import phash_image
+
+# Image forensics used by /api/analyze-image.
+#
+# Memory stays bounded regardless of upload size:
+#   * uploads above IMAGE_MAX_PIXELS are rejected from the header, before decoding;
+#   * JPEGs are decoded in draft mode (DCT scaling) straight to roughly the
+#     ELA working resolution, other formats are reduced right after decoding;
+#   * ELA recompresses the working image in horizontal strips whose height is a
+#     multiple of the 16px JPEG MCU, so a strip recompresses like the same rows of
+#     the full frame and only one strip's copies are alive at a time;
+#   * difference statistics are NumPy reductions, accumulated into a per-tile
+#     heatmap instead of a single global number.
+
+IMAGE_MAX_PIXELS = int(os.getenv('IMAGE_MAX_PIXELS', str(100 * 1000 * 1000)))
+ELA_MAX_PIXELS = int(os.getenv('ELA_MAX_PIXELS', str(4 * 1000 * 1000)))
+ELA_TILE_SIZE = max(16, int(os.getenv('ELA_TILE_SIZE', '64')) // 16 * 16)
+ELA_JPEG_QUALITY = 90
+
+# Let PIL's own decompression-bomb guard agree with our limit
+Image.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff', '.bmp', '.gif'}
+
+
+class ImageTooLargeError(ValueError):
+    pass
+
+
+def extract_exif(image):
+    exif_data = {}
+    if hasattr(image, '_getexif'):
+        exif = image._getexif()
+        if exif:
+            for tag_id, value in exif.items():
+                tag = TAGS.get(tag_id, tag_id)
+                # Decode bytes to string if necessary
+                if isinstance(value, bytes):
+                    try:
+                        value = value.decode()
+                    except:
+                        value = str(value)
+                exif_data[tag] = str(value)
+    return exif_data
+
+
+def load_working_image(image, max_pixels=None):
+    # Decode to RGB at no more than max_pixels, using JPEG draft mode where possible
+    max_pixels = max_pixels or ELA_MAX_PIXELS
+    width, height = image.size
+    scale = min(1.0, (max_pixels / float(width * height)) ** 0.5)
+    target = (max(1, int(width * scale)), max(1, int(height * scale)))
+    if image.format == 'JPEG' and scale < 1.0:
+        # Picks the largest DCT scale (1/2, 1/4, 1/8) that still covers the target
+        image.draft('RGB', target)
+    image = image.convert('RGB')
+    if image.size[0] * image.size[1] > max_pixels:
+        factor = int(np.ceil(max(image.size[0] / target[0], image.size[1] / target[1])))
+        image = image.reduce(max(1, factor))
+    return image
+
+
+def error_level_analysis(image, tile_size=None, quality=ELA_JPEG_QUALITY):
+    tile_size = tile_size or ELA_TILE_SIZE
+    width, height = image.size
+    cols = -(-width // tile_size)
+    rows = -(-height // tile_size)
+    col_starts = np.arange(0, width, tile_size)
+    col_widths = np.minimum(tile_size, width - col_starts)
+
+    tile_means = np.zeros((rows, cols), dtype=np.float64)
+    total = 0.0
+    for row in range(rows):
+        top = row * tile_size
+        strip = image.crop((0, top, width, min(height, top + tile_size)))
+        buffer = io.BytesIO()
+        strip.save(buffer, 'JPEG', quality=quality)
+        buffer.seek(0)
+        recompressed = np.asarray(Image.open(buffer).convert('RGB'), dtype=np.int16)
+        diff = np.abs(np.asarray(strip, dtype=np.int16) - recompressed)
+
+        # Sum over rows and channels, then per tile column
+        column_sums = diff.sum(axis=(0, 2), dtype=np.int64)
+        tile_sums = np.add.reduceat(column_sums, col_starts)
+        strip_height = diff.shape[0]
+        tile_means[row] = tile_sums / (col_widths * strip_height * 3 * 255.0)
+        total += float(column_sums.sum())
+
+    ela_score = total / (width * height * 3 * 255.0)
+    return ela_score, tile_means
+
+
+def summarize_ela(ela_score):
+    if ela_score < 0.02:
+        return "Low compression anomalies; image appears structurally consistent."
+    elif ela_score < 0.06:
+        return "Moderate localized anomalies; possible light editing."
+    return "Strong localized anomalies; potential heavy editing or compositing detected."
+
+
+def open_image(fp):
+    # Lazy open (header only) with the pixel limit enforced before any decoding
+    try:
+        image = Image.open(fp)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e))
+    width, height = image.size
+    if width * height > IMAGE_MAX_PIXELS:
+        raise ImageTooLargeError(
+            f"Image is {width}x{height}; the limit is {IMAGE_MAX_PIXELS} pixels"
+        )
+    return image
+
+
+def phash_image_file(fp):
+    # Perceptual hash of an uploaded file; rewinds it so it can be analyzed afterwards
+    try:
+        with metrics.stage('image_phash'):
+            return phash_image(open_image(fp))
+    finally:
+        fp.seek(0)
+
+
+def sha256_image_file(fp):
+    # Content hash of an uploaded file; rewinds it so it can be analyzed afterwards
+    digest = hashlib.sha256()
+    try:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(block)
+        return digest.hexdigest()
+    finally:
+        fp.seek(0)
+
+
+def analyze_image_file(fp):
+    image = open_image(fp)
+    width, height = image.size
+
+    # Extract EXIF data
+    with metrics.stage('image_exif'):
+        exif_data = extract_exif(image)
+
+    # Basic Forensic Analysis Simulation (since we don't have a real forensic model yet)
+    # In a real app, we would check for compression artifacts, metadata inconsistencies, etc.
+    software = exif_data.get('Software', 'Unknown')
+    camera = exif_data.get('Model', 'Unknown')
+
+    # Simple heuristic: if 'Photoshop' or 'GIMP' is in software, flag it
+    is_suspicious = 'photoshop' in software.lower() or 'gimp' in software.lower()
+
+    # Lightweight CV-style Error Level Analysis (ELA)
+    ela_score = 0.0
+    ela_summary = ""
+    ela_heatmap = None
+    try:
+        with metrics.stage('image_decode'):
+            working = load_working_image(image)
+        with metrics.stage('image_ela'):
+            raw_score, tile_means = error_level_analysis(working)
+        ela_score = float(round(raw_score, 4))
+        ela_summary = summarize_ela(ela_score)
+        ela_heatmap = {
+            'tile_size': ELA_TILE_SIZE,
+            'rows': int(tile_means.shape[0]),
+            'cols': int(tile_means.shape[1]),
+            # Working resolution relative to the original; tiles map back via tile_size / scale
+            'scale': round(working.size[0] / float(width), 4),
+            'max_tile_score': round(float(tile_means.max()), 4),
+            'hotspot_ratio': round(float((tile_means >= 0.06).mean()), 4),
+            'values': np.round(tile_means, 4).tolist()
+        }
+    except Exception as e:
+        print(f"ELA Error: {e}")
+        ela_summary = f"ELA analysis unavailable: {e}"
+
+    # Combine metadata suspicion and ELA score into an authenticity score
+    base_score = 95
+    if is_suspicious:
+        base_score -= 40
+    base_score -= min(40, int(ela_score * 100))
+
+    # Additional image heuristics
+    has_small_resolution = (width * height) < (512 * 512)
+    extreme_aspect_ratio = (width / float(height)) > 3 or (height / float(width)) > 3
+    has_no_exif = len(exif_data) == 0
+
+    tamper_risk = 0
+    if has_small_resolution:
+        tamper_risk += 5
+    if extreme_aspect_ratio:
+        tamper_risk += 5
+    if has_no_exif:
+        tamper_risk += 10
+    if is_suspicious:
+        tamper_risk += 15
+    if ela_score >= 0.06:
+        tamper_risk += 20
+    tamper_risk = max(0, min(100, tamper_risk))
+
+    authenticity_score = max(0, min(100, base_score))
+    verdict = "Tampering Detected" if authenticity_score < 60 or tamper_risk >= 40 else "Original"
+
+    return {
+        'verdict': verdict,
+        'authenticity_score': authenticity_score,
+        'exif_metadata': {
+            'camera': camera,
+            'software': software,
+            'datetime': exif_data.get('DateTime', 'Unknown')
+        },
+        'ela_score': ela_score,
+        'ela_summary': ela_summary,
+        'ela_heatmap': ela_heatmap,
+        'tamper_risk': tamper_risk,
+        'forensic_flags': {
+            'has_no_exif': has_no_exif,
+            'is_suspicious_software': is_suspicious,
+            'has_small_resolution': has_small_resolution,
+            'extreme_aspect_ratio': extreme_aspect_ratio,
+            'width': width,
+            'height': height
+        }
+    }
+
+
+def analyze_image_bytes(data):
+    # Process-pool entry point: never raises, so one bad image cannot fail a batch.
+    # The hashes and stage timings ride along for the parent's image index and
+    # metrics (the worker's own metrics registry is never scraped).
+    timings = metrics.start_timings()
+    try:
+        fp = io.BytesIO(data)
+        phash = phash_image_file(fp)
+        return {
+            'result': analyze_image_file(fp),
+            'phash': phash,
+            'sha256': hashlib.sha256(data).hexdigest(),
+            'timings': timings
+        }
+    except ImageTooLargeError as e:
+        return {'error': str(e), 'timings': timings}
+    except Exception as e:
+        return {'error': f'Failed to process image: {str(e)}', 'timings': timings}
+
+
+def is_image_name(name):
+    base = os.path.basename(name)
+    if not base or base.startswith('.') or '__MACOSX/' in name:
+        return False
+    return os.path.splitext(base)[1].lower() in IMAGE_EXTENSIONS
+
+
+def iter_archive_images(fileobj, max_member_bytes):
+    # Yield (name, bytes or None, error) for each image member of a zip/tar archive,
+    # reading one member at a time from the upload stream without extracting to disk
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or not is_image_name(info.filename):
+                    continue
+                if info.file_size > max_member_bytes:
+                    yield info.filename, None, f"Archive member is {info.file_size} bytes; the limit is {max_member_bytes}"
+                    continue
+                with archive.open(info) as member:
+                    data = member.read(max_member_bytes + 1)
+                if len(data) > max_member_bytes:
+                    yield info.filename, None, f"Archive member is larger than {max_member_bytes} bytes"
+                else:
+                    yield info.filename, data, None
+        return
+
+    fileobj.seek(0)
+    try:
+        archive = tarfile.open(fileobj=fileobj, mode='r|*')
+    except tarfile.TarError:
+        raise ValueError("Archive must be a zip or tar file")
+    with archive:
+        for info in archive:
+            if not info.isfile() or not is_image_name(info.name):
+                continue
+            if info.size > max_member_bytes:
+                yield info.name, None, f"Archive member is {info.size} bytes; the limit is {max_member_bytes}"
+                continue
+            yield info.name, archive.extractfile(info).read(), None
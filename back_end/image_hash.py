@@ -0,0 +1,255 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+from scipy.fft import dctn
+
+# Perceptual hashing and a Hamming-distance index for image forensics deduplication.
+#
+# pHash: grayscale 32x32 thumbnail -> 2D DCT -> top-left 8x8 low frequencies ->
+# one bit per coefficient above the median. Resizing and recompression barely move
+# the low frequencies, so re-uploads land within a few bits of the original.
+# The index is a BK-tree, which prunes subtrees with the triangle inequality so a
+# radius query touches a small fraction of the stored hashes.
+
+HASH_SIZE = 8
+HASH_SAMPLE_SIZE = 32
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+def phash_image(image):
+    if image.format == 'JPEG':
+        # Decode at 1/8 scale straight from the DCT; plenty for a 32x32 thumbnail
+        image.draft('L', (HASH_SAMPLE_SIZE * 4, HASH_SAMPLE_SIZE * 4))
+    gray = image.convert('L').resize((HASH_SAMPLE_SIZE, HASH_SAMPLE_SIZE), Image.LANCZOS)
+    pixels = np.asarray(gray, dtype=np.float64)
+    low = dctn(pixels, type=2, norm='ortho')[:HASH_SIZE, :HASH_SIZE]
+    # The DC term only encodes overall brightness; leave it out of the threshold
+    median = np.median(low.ravel()[1:])
+    bits = (low > median).ravel()
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def format_hash(value):
+    return f"{value:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+class BKTree:
+    def __init__(self):
+        # node = [hash, items, {distance: child node}]
+        self._root = None
+        self._size = 0
+
+    def add(self, value, item):
+        self._size += 1
+        if self._root is None:
+            self._root = [value, [item], {}]
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def remove(self, value, item):
+        # The node stays in place (possibly empty) so its subtree remains reachable
+        node = self._root
+        while node is not None:
+            distance = hamming_distance(value, node[0])
+            if distance == 0:
+                if item in node[1]:
+                    node[1].remove(item)
+                    self._size -= 1
+                    return True
+                return False
+            node = node[2].get(distance)
+        return False
+
+    def query(self, value, radius):
+        # All (distance, item) pairs within radius, nearest first
+        if self._root is None:
+            return []
+        found = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            distance = hamming_distance(value, node[0])
+            if distance <= radius:
+                found.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+    def __len__(self):
+        return self._size
+
+
+def verdict_summary(result):
+    # The part of a forensic result kept in the index and shown in seen_before
+    return {
+        'verdict': result.get('verdict'),
+        'authenticity_score': result.get('authenticity_score'),
+        'tamper_risk': result.get('tamper_risk')
+    }
+
+
+# Index of analyzed images keyed by pHash, persisted as an append-only JSONL log.
+# A record holds only the image's hashes, when it was first seen and a verdict
+# summary: never the uploader's filename or the full result with its heatmap.
+# Matches are only reported ("seen before"); the forensic checks always run, since
+# pHash is built to ignore local edits such as a splice or rewritten EXIF.
+# At most max_entries images are kept and the least recently matched one is evicted
+# first. The log is compacted, in recency order, once most of its lines are stale.
+class ImageHashIndex:
+    def __init__(self, max_distance=8, path=None, max_entries=10000):
+        self.max_distance = int(max_distance)
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self._tree = BKTree()
+        # key (sha256, or the pHash when there is none) -> record, least recent first
+        self._entries = OrderedDict()
+        self._removed = 0
+        self._log_lines = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'inserts': 0, 'evictions': 0, 'compactions': 0}
+        if path and os.path.exists(path):
+            self._load(path)
+
+    def _load(self, path):
+        rewrite = False
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                self._log_lines += 1
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write; everything before it is intact
+                    continue
+                if 'result' in record:
+                    # Written before records were trimmed: drop the filename and full result
+                    record = self._record(record['phash'], verdict_summary(record['result']),
+                                          record.get('sha256'), record.get('created_at'))
+                    rewrite = True
+                if self._key(record) in self._entries:
+                    continue
+                self._insert(record)
+                rewrite = self._evict() or rewrite
+        if rewrite or self._log_lines > len(self._entries):
+            try:
+                self._compact()
+            except OSError as e:
+                print(f"Warning: Failed to compact image hash index log: {e}")
+
+    def _record(self, phash, summary, sha256, created_at):
+        return {'phash': phash, 'sha256': sha256, 'created_at': created_at, 'summary': summary}
+
+    def _key(self, record):
+        return record.get('sha256') or record['phash']
+
+    def _insert(self, record):
+        key = self._key(record)
+        self._entries[key] = record
+        self._tree.add(int(record['phash'], 16), key)
+
+    def _evict(self):
+        evicted = False
+        while len(self._entries) > self.max_entries:
+            key, record = self._entries.popitem(last=False)
+            self._tree.remove(int(record['phash'], 16), key)
+            self._removed += 1
+            self._stats['evictions'] += 1
+            evicted = True
+        if self._removed > len(self._entries):
+            # Evicted entries leave empty nodes behind; rebuild once they dominate
+            tree = BKTree()
+            for key, record in self._entries.items():
+                tree.add(int(record['phash'], 16), key)
+            self._tree = tree
+            self._removed = 0
+        return evicted
+
+    def _compact(self):
+        # One line per live entry, least recent first; written aside, then swapped in
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for record in self._entries.values():
+                f.write(json.dumps(record) + "\n")
+        os.replace(temp_path, self.path)
+        self._log_lines = len(self._entries)
+        self._stats['compactions'] += 1
+
+    def lookup(self, value, sha256=None, limit=5):
+        # Earlier images within max_distance, identical content first, then nearest
+        with self._lock:
+            matches = self._tree.query(value, self.max_distance)
+            matches.sort(key=lambda pair: (pair[1] != sha256, pair[0]))
+            matches = matches[:limit]
+            self._stats['hits' if matches else 'misses'] += 1
+            found = []
+            for distance, key in matches:
+                self._entries.move_to_end(key)
+                record = self._entries[key]
+                found.append(dict(
+                    phash=record['phash'],
+                    distance=distance,
+                    identical=sha256 is not None and key == sha256,
+                    first_seen=record['created_at'],
+                    **record['summary']
+                ))
+        return found
+
+    def add(self, value, result, sha256=None):
+        record = self._record(format_hash(value), verdict_summary(result), sha256, time.time())
+        key = self._key(record)
+        with self._lock:
+            if key in self._entries:
+                # Byte-identical content is stored once
+                self._entries.move_to_end(key)
+                return False
+            self._insert(record)
+            self._stats['inserts'] += 1
+            self._evict()
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record) + "\n")
+                self._log_lines += 1
+                if self._log_lines > 2 * self.max_entries:
+                    try:
+                        self._compact()
+                    except OSError as e:
+                        print(f"Warning: Failed to compact image hash index log: {e}")
+        return True
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['max_distance'] = self.max_distance
+            stats['persistent'] = bool(self.path)
+        return stats
@@ -0,0 +1,182 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+import scipy.sparse as sp
+
+# Compact inference artifact for the local TF-IDF + LogisticRegression classifier.
+#
+# export_lean_model() writes a directory of plain .npy arrays (sorted vocabulary,
+# per-term IDF and coefficients) plus a small meta.json. LeanScorer loads the arrays
+# memory-mapped, so many gunicorn workers share the same pages, and reproduces the
+# fitted pipeline's predict_proba without importing scikit-learn or unpickling the
+# vectorizer's vocabulary dict and stop-word list.
+#
+# Only the unigram word analyzer is supported. Stop words are not needed at
+# inference time: they were removed before the vocabulary was built, so a stop
+# word can never match a vocabulary entry.
+
+LEAN_FORMAT_VERSION = 1
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def export_lean_model(model, vectorizer, out_dir, source_paths=None):
+    params = vectorizer.get_params()
+    if params.get('analyzer') != 'word' or tuple(params.get('ngram_range', (1, 1))) != (1, 1):
+        raise ValueError("Lean export supports only unigram word analyzers")
+    if params.get('tokenizer') is not None or params.get('preprocessor') is not None:
+        raise ValueError("Lean export does not support custom tokenizers or preprocessors")
+    if params.get('strip_accents') is not None:
+        raise ValueError("Lean export does not support strip_accents")
+    if not hasattr(vectorizer, 'vocabulary_') or not hasattr(vectorizer, 'idf_'):
+        raise ValueError("Vectorizer must be a fitted TfidfVectorizer")
+    coef = np.asarray(model.coef_, dtype=np.float64)
+    if coef.shape[0] != 1 or list(model.classes_) != [0, 1]:
+        raise ValueError("Lean export supports only binary classifiers with classes [0, 1]")
+
+    terms = sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+    columns = np.array([vectorizer.vocabulary_[t] for t in terms])
+    order = np.argsort(np.array(terms, dtype=str), kind='stable')
+    vocab = np.array(terms, dtype=str)[order]
+    idf = np.asarray(vectorizer.idf_, dtype=np.float64)[columns[order]]
+    weights = coef[0][columns[order]]
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, 'vocab.npy'), vocab)
+    np.save(os.path.join(out_dir, 'idf.npy'), idf)
+    np.save(os.path.join(out_dir, 'coef.npy'), weights)
+    meta = {
+        'format_version': LEAN_FORMAT_VERSION,
+        'intercept': float(np.asarray(model.intercept_).ravel()[0]),
+        'token_pattern': params['token_pattern'],
+        'lowercase': bool(params['lowercase']),
+        'use_idf': bool(params['use_idf']),
+        'sublinear_tf': bool(params['sublinear_tf']),
+        'binary': bool(params['binary']),
+        'norm': params['norm'],
+        # Fingerprints of the pickles this was exported from, so a retrained
+        # model.pkl/vectorizer.pkl is never shadowed by a stale lean artifact
+        'source_sha256': {
+            os.path.basename(p): file_sha256(p) for p in (source_paths or [])
+        }
+    }
+    with open(os.path.join(out_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return out_dir
+
+
+# Drop-in for both ml_vectorizer and ml_model in app.py: transform() yields the
+# same L2-normalized TF-IDF rows (columns in sorted-vocabulary order) and
+# predict_proba() applies the logistic regression to them.
+class LeanScorer:
+    def __init__(self, vocab, idf, coef, meta):
+        self.vocab = vocab
+        self.idf = idf
+        self.coef = coef
+        self.intercept = meta['intercept']
+        self.lowercase = meta['lowercase']
+        self.use_idf = meta['use_idf']
+        self.sublinear_tf = meta['sublinear_tf']
+        self.binary = meta['binary']
+        self.norm = meta['norm']
+        self._token_re = re.compile(meta['token_pattern'])
+        self.classes_ = np.array([0, 1])
+
+    @classmethod
+    def load(cls, path, mmap=True, source_paths=None):
+        mode = 'r' if mmap else None
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format_version') != LEAN_FORMAT_VERSION:
+            raise ValueError(f"Unsupported lean model format: {meta.get('format_version')}")
+        recorded = meta.get('source_sha256') or {}
+        for source in source_paths or []:
+            if recorded and os.path.exists(source) and recorded.get(os.path.basename(source)) != file_sha256(source):
+                raise ValueError(f"Lean model does not match {source}; re-export it with lean_model.py")
+        return cls(
+            np.load(os.path.join(path, 'vocab.npy'), mmap_mode=mode),
+            np.load(os.path.join(path, 'idf.npy'), mmap_mode=mode),
+            np.load(os.path.join(path, 'coef.npy'), mmap_mode=mode),
+            meta
+        )
+
+    def _term_ids(self, text):
+        if self.lowercase:
+            text = text.lower()
+        tokens = self._token_re.findall(text)
+        if not tokens:
+            return np.empty(0, dtype=np.int64)
+        tokens = np.array(tokens, dtype=str)
+        positions = np.searchsorted(self.vocab, tokens)
+        positions[positions == len(self.vocab)] = 0
+        return positions[self.vocab[positions] == tokens]
+
+    def transform(self, texts):
+        indptr = [0]
+        indices = []
+        data = []
+        for text in texts:
+            ids, counts = np.unique(self._term_ids(text), return_counts=True)
+            values = counts.astype(np.float64)
+            if self.binary:
+                values[:] = 1.0
+            elif self.sublinear_tf:
+                values = np.log(values) + 1.0
+            if self.use_idf:
+                values *= self.idf[ids]
+            if self.norm == 'l2':
+                length = np.sqrt(np.dot(values, values))
+            elif self.norm == 'l1':
+                length = np.abs(values).sum()
+            else:
+                length = 0.0
+            if length > 0:
+                values /= length
+            indices.append(ids)
+            data.append(values)
+            indptr.append(indptr[-1] + len(ids))
+        return sp.csr_matrix(
+            (
+                np.concatenate(data) if data else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int64),
+                np.array(indptr)
+            ),
+            shape=(len(indptr) - 1, len(self.vocab))
+        )
+
+    def decision_function(self, X):
+        return np.asarray(X @ self.coef).ravel() + self.intercept
+
+    def predict_proba(self, X):
+        real = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - real, real])
+
+    def predict(self, X):
+        return (self.decision_function(X) > 0).astype(int)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Export model.pkl/vectorizer.pkl as a lean NumPy artifact.")
+    parser.add_argument('--model', default='model.pkl')
+    parser.add_argument('--vectorizer', default='vectorizer.pkl')
+    parser.add_argument('--out', default='model_lean')
+    args = parser.parse_args()
+
+    import joblib
+    export_lean_model(
+        joblib.load(args.model),
+        joblib.load(args.vectorizer),
+        args.out,
+        source_paths=[args.model, args.vectorizer]
+    )
+    print(f"Lean model written to {args.out}/")
@@ -0,0 +1,304 @@
+import json
+import re
+
+# Tolerant parsing of the fact-check verdict returned by the LLM.
+#
+# JsonObjectScanner walks the reply once, character by character, and yields every
+# balanced top-level {...} it finds, wherever it sits (code fences, prose before or
+# after). Chunks can be fed as they arrive. If the reply ends inside an object, the
+# open strings and brackets are closed so a truncated answer still yields its fields.
+# repair_json_text() rewrites the common defects (trailing commas, single or curly
+# quotes, bare words, Python literals) into strict JSON, and coerce_verdict()
+# validates the result against the verdict schema. Whatever cannot be recovered
+# raises InvalidLLMResponse so the caller can re-ask for just the JSON.
+
+VERDICTS = ('TRUE', 'FALSE', 'MIXED', 'UNVERIFIABLE')
+VERDICT_ALIASES = {
+    'TRUE': 'TRUE', 'CORRECT': 'TRUE', 'ACCURATE': 'TRUE', 'MOSTLY TRUE': 'TRUE', 'YES': 'TRUE',
+    'FALSE': 'FALSE', 'INCORRECT': 'FALSE', 'INACCURATE': 'FALSE', 'MOSTLY FALSE': 'FALSE', 'FAKE': 'FALSE',
+    'NO': 'FALSE', 'DEBUNKED': 'FALSE',
+    'MIXED': 'MIXED', 'PARTLY TRUE': 'MIXED', 'PARTIALLY TRUE': 'MIXED', 'HALF TRUE': 'MIXED',
+    'MISLEADING': 'MIXED', 'MIXTURE': 'MIXED',
+    'UNVERIFIABLE': 'UNVERIFIABLE', 'UNVERIFIED': 'UNVERIFIABLE', 'UNKNOWN': 'UNVERIFIABLE',
+    'UNPROVEN': 'UNVERIFIABLE', 'INCONCLUSIVE': 'UNVERIFIABLE'
+}
+TEXT_FIELDS = ('explanation', 'historical_context', 'first_verified', 'last_updated')
+
+NUMBER_RE = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?$')
+CONFIDENCE_RE = re.compile(r'-?\d+(?:\.\d+)?')
+OPEN_QUOTES = {'"': '"', "'": "'", '“': '”', '‘': '’'}
+STRUCTURAL = '{}[],:'
+
+
+class InvalidLLMResponse(ValueError):
+    def __init__(self, message, problems=None):
+        super().__init__(message)
+        self.problems = problems or [message]
+
+
+class JsonObjectScanner:
+    def __init__(self):
+        self._buffer = []
+        self._stack = []
+        self._quote = None
+        self._escape = False
+        # A non-standard closing quote only counts if the next non-space char is a delimiter
+        self._tentative = False
+
+    def feed(self, chunk):
+        # Returns the balanced objects completed by this chunk, in order
+        completed = []
+        for ch in chunk:
+            if not self._stack:
+                if ch == '{':
+                    self._stack.append('}')
+                    self._buffer = [ch]
+                continue
+            self._buffer.append(ch)
+            if self._tentative:
+                if ch.isspace():
+                    continue
+                self._tentative = False
+                if ch in STRUCTURAL:
+                    self._quote = None
+            if self._quote is not None:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == self._quote or (self._quote == '”' and ch == '"'):
+                    if self._quote == '"':
+                        self._quote = None
+                    else:
+                        self._tentative = True
+            elif ch in OPEN_QUOTES:
+                self._quote = OPEN_QUOTES[ch]
+            elif ch in '{[':
+                self._stack.append('}' if ch == '{' else ']')
+            elif ch in '}]':
+                if ch == self._stack[-1]:
+                    self._stack.pop()
+                    if not self._stack:
+                        completed.append(''.join(self._buffer))
+                        self._buffer = []
+        return completed
+
+    def pending(self):
+        # The unfinished object at end of input, closed off, or None
+        if not self._stack:
+            return None
+        text = ''.join(self._buffer)
+        if self._quote is not None and not self._tentative:
+            text += self._quote
+        text = text.rstrip().rstrip(',').rstrip()
+        if text.endswith(':'):
+            text += ' null'
+        elif text.endswith('"') and self._stack[-1] == '}' and re.search(r'[{,]\s*"[^"]*"$', text):
+            # Cut off right after a key
+            text += ': null'
+        return text + ''.join(reversed(self._stack))
+
+
+def read_quoted(text, start, closer):
+    # (string contents, index after the closing quote) with JSON-style escapes kept.
+    # Non-standard quotes only close when followed by a delimiter, so apostrophes survive.
+    i = start
+    chars = []
+    strict = closer == '"'
+    while i < len(text):
+        ch = text[i]
+        if ch == '\\' and i + 1 < len(text):
+            chars.append(text[i:i + 2])
+            i += 2
+            continue
+        if ch == closer or (closer == '”' and ch == '"'):
+            rest = text[i + 1:].lstrip()
+            if strict or not rest or rest[0] in STRUCTURAL:
+                return ''.join(chars), i + 1
+        chars.append(ch)
+        i += 1
+    return ''.join(chars), i
+
+
+def repair_json_text(text):
+    # Rewrite near-JSON into strict JSON; returns (text, set of repairs applied)
+    out = []
+    repairs = set()
+    stack = []
+    last = ''
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if ch.isspace():
+            out.append(ch)
+            i += 1
+            continue
+        if ch in OPEN_QUOTES:
+            contents, i = read_quoted(text, i + 1, OPEN_QUOTES[ch])
+            if ch != '"':
+                repairs.add('quotes')
+                contents = contents.replace("\\'", "'")
+                contents = re.sub(r'(?<!\\)"', '\\"', contents)
+            out.append('"' + contents + '"')
+            last = '"'
+            continue
+        if ch == ',':
+            rest = text[i + 1:].lstrip()
+            if not rest or rest[0] in '}]' or last in ',{[':
+                repairs.add('trailing_comma')
+            else:
+                out.append(ch)
+                last = ch
+            i += 1
+            continue
+        if ch in '{[':
+            stack.append(ch)
+        elif ch in '}]':
+            if stack:
+                stack.pop()
+        if ch in STRUCTURAL:
+            out.append(ch)
+            last = ch
+            i += 1
+            continue
+
+        # A bare token: a key up to ':', or a value up to the next delimiter
+        in_object = bool(stack) and stack[-1] == '{'
+        is_key = in_object and last in '{,'
+        stop = ':' if is_key else ',}]\n'
+        j = i
+        while j < len(text) and text[j] not in stop and not (is_key and text[j] in '{}'):
+            j += 1
+        token = text[i:j].strip()
+        i = j
+        if not is_key and (token in ('true', 'false', 'null') or NUMBER_RE.match(token)):
+            out.append(token)
+        elif not is_key and token in ('True', 'False', 'None'):
+            repairs.add('python_literal')
+            out.append({'True': 'true', 'False': 'false', 'None': 'null'}[token])
+        else:
+            repairs.add('bare_word')
+            out.append(json.dumps(token))
+        last = '"'
+    return ''.join(out), repairs
+
+
+def parse_json_object(text):
+    # Strict parse first; repaired parse second. Returns (dict, repairs) or None.
+    try:
+        value = json.loads(text, strict=False)
+        repairs = set()
+    except ValueError:
+        repaired, repairs = repair_json_text(text)
+        try:
+            value = json.loads(repaired, strict=False)
+        except ValueError:
+            return None
+    if not isinstance(value, dict):
+        return None
+    return value, repairs
+
+
+def extract_json_object(content):
+    # First object in the reply that parses (possibly after repair): (dict, repairs) or None
+    scanner = JsonObjectScanner()
+    for candidate in scanner.feed(content or ''):
+        parsed = parse_json_object(candidate)
+        if parsed is not None:
+            return parsed
+    pending = scanner.pending()
+    if pending is not None:
+        parsed = parse_json_object(pending)
+        if parsed is not None:
+            value, repairs = parsed
+            return value, repairs | {'truncated'}
+    return None
+
+
+def coerce_confidence(value):
+    # 95, "95", "95%", "95.5 %", 0.95 -> number in [0, 100]; None if unusable
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        number = float(value)
+    elif isinstance(value, str):
+        match = CONFIDENCE_RE.search(value)
+        if not match:
+            return None
+        number = float(match.group())
+        if '%' not in value and 0 < number <= 1 and '.' in match.group():
+            number *= 100
+    else:
+        return None
+    if isinstance(value, float) and 0 < number <= 1:
+        number *= 100
+    return max(0.0, min(100.0, number))
+
+
+def coerce_text(value):
+    if value is None:
+        return ''
+    if isinstance(value, list):
+        return '; '.join(coerce_text(v) for v in value)
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return str(value).strip()
+
+
+def coerce_sources(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        value = [value]
+    sources = []
+    for item in value:
+        if isinstance(item, dict):
+            item = item.get('url') or item.get('title') or json.dumps(item)
+        item = coerce_text(item)
+        if item:
+            sources.append(item)
+    return sources
+
+
+def coerce_verdict(data):
+    # Validate and normalize to the verdict schema; raises InvalidLLMResponse.
+    # 'confidence' stays a "95%" string for API compatibility, 'confidence_score'
+    # carries the number.
+    problems = []
+    fields = {str(k).strip().lower().replace(' ', '_'): v for k, v in data.items()}
+
+    verdict = fields.get('verdict')
+    if isinstance(verdict, bool):
+        verdict = 'TRUE' if verdict else 'FALSE'
+    verdict = VERDICT_ALIASES.get(re.sub(r'[\s_-]+', ' ', coerce_text(verdict).upper()).strip())
+    if verdict is None:
+        problems.append(f"'verdict' must be one of {', '.join(VERDICTS)}")
+
+    confidence = coerce_confidence(fields.get('confidence'))
+    if confidence is None:
+        problems.append("'confidence' must be a percentage between 0 and 100")
+
+    if problems:
+        raise InvalidLLMResponse('; '.join(problems), problems)
+
+    result = dict(fields)
+    result['verdict'] = verdict
+    result['confidence_score'] = round(confidence, 1)
+    result['confidence'] = f"{confidence:g}%"
+    for name in TEXT_FIELDS:
+        result[name] = coerce_text(fields.get(name))
+    result['sources'] = coerce_sources(fields.get('sources'))
+    return result
+
+
+def parse_verdict(content):
+    # (verdict dict, sorted list of repairs applied) or InvalidLLMResponse
+    extracted = extract_json_object(content)
+    if extracted is None:
+        raise InvalidLLMResponse('No JSON object found in the response')
+    data, repairs = extracted
+    result = coerce_verdict(data)
+    if 'truncated' in repairs:
+        # Fields after the cut are missing or partial: usable once, never worth caching
+        result['truncated'] = True
+    return result, sorted(repairs)
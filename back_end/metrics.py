@@ -0,0 +1,274 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics for TruthLense, rendered in the Prometheus text format by /metrics.
+#
+# Counters, gauges and histograms are plain dicts keyed by label values behind one
+# lock each; an observation is a bisect plus a few additions, so instrumenting the
+# hot path costs a few microseconds. stage() times one processing step into the
+# shared stage histogram and, when a request has called start_timings(), into that
+# request's timings dict, which becomes the Server-Timing header.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names, values, extra=None):
+    pairs = [f'{n}="{escape_label_value(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, None, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for name, key, extra, value in self.samples():
+            lines.append(f'{name}{format_labels(self.labelnames, key, extra)} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # [per-bucket counts (last is +Inf), sum, count]
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            snapshot = [(key, list(s[0]), s[1], s[2]) for key, s in self._values.items()]
+        samples = []
+        for key, counts, total, count in snapshot:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                samples.append((self.name + '_bucket', key, f'le="{format_value(bound)}"', cumulative))
+            samples.append((self.name + '_sum', key, None, total))
+            samples.append((self.name + '_count', key, None, count))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        # collector() returns metrics built at scrape time, e.g. from cache stats()
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        for collector in collectors:
+            try:
+                metrics.extend(collector())
+            except Exception as e:
+                print(f"Warning: metrics collector failed: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'truthlense_stage_duration_seconds',
+    'Time spent in each processing stage.',
+    ['stage']
+)
+HTTP_REQUESTS = REGISTRY.counter(
+    'truthlense_http_requests_total',
+    'HTTP requests by route and status code.',
+    ['route', 'status']
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'truthlense_http_request_duration_seconds',
+    'HTTP request latency by route, including streamed bodies.',
+    ['route']
+)
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    'truthlense_http_requests_in_flight',
+    'HTTP requests currently being served.',
+    ['route']
+)
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    'truthlense_upstream_requests_total',
+    'Perplexity API calls by outcome.',
+    ['outcome']
+)
+UPSTREAM_IN_FLIGHT = REGISTRY.gauge(
+    'truthlense_upstream_requests_in_flight',
+    'Perplexity API calls currently waiting for a response.'
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    'truthlense_upstream_retries_total',
+    'Perplexity API attempts retried after a retryable error.'
+)
+UPSTREAM_SHORT_CIRCUITED = REGISTRY.counter(
+    'truthlense_upstream_short_circuited_total',
+    'Perplexity API calls refused because the circuit breaker was open.'
+)
+DEGRADED_RESPONSES = REGISTRY.counter(
+    'truthlense_degraded_responses_total',
+    'Verifications answered from the local model because the upstream was unavailable.'
+)
+LLM_PARSE_FAILURES = REGISTRY.counter(
+    'truthlense_llm_parse_failures_total',
+    'LLM responses that could not be parsed into a verdict, including re-ask replies.'
+)
+LLM_JSON_REPAIRS = REGISTRY.counter(
+    'truthlense_llm_json_repairs_total',
+    'LLM responses that parsed only after a repair, by repair kind.',
+    ['repair']
+)
+LLM_REASKS = REGISTRY.counter(
+    'truthlense_llm_reasks_total',
+    'Follow-up calls asking the LLM to reformat an unparseable answer, by outcome.',
+    ['outcome']
+)
+LLM_SCHEDULER_REJECTIONS = REGISTRY.counter(
+    'truthlense_llm_scheduler_rejections_total',
+    'LLM calls refused with 429 by the scheduler, by reason (rate, queue, timeout) and priority.',
+    ['reason', 'priority']
+)
+IMAGE_JOBS_IN_FLIGHT = REGISTRY.gauge(
+    'truthlense_image_jobs_in_flight',
+    'Images submitted to the forensics process pool and not yet finished.'
+)
+
+_timings = contextvars.ContextVar('truthlense_timings', default=None)
+
+
+def start_timings():
+    # Begin collecting per-stage durations for the current request (or pool job)
+    timings = {}
+    _timings.set(timings)
+    return timings
+
+
+def observe_stage(name, seconds):
+    STAGE_SECONDS.observe(seconds, stage=name)
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(name, time.perf_counter() - start)
+
+
+@contextmanager
+def upstream_call():
+    # Times one Perplexity call and counts it as ok/error
+    UPSTREAM_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        UPSTREAM_REQUESTS.inc(outcome='error')
+        raise
+    else:
+        UPSTREAM_REQUESTS.inc(outcome='ok')
+    finally:
+        UPSTREAM_IN_FLIGHT.dec()
+        observe_stage('llm', time.perf_counter() - start)
+
+
+def server_timing_header(timings, total=None):
+    parts = [f'{name};dur={seconds * 1000:.2f}' for name, seconds in timings.items()]
+    if total is not None:
+        parts.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(parts)
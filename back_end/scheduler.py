@@ -0,0 +1,326 @@
+import asyncio
+import contextvars
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+
+import metrics
+
+# Admission control and fair scheduling for upstream LLM capacity.
+#
+# Every uncached LLM call takes one of `capacity` slots. Before queueing, the caller's
+# token bucket (keyed by API key or IP) is charged one token; an empty bucket or a
+# full queue raises RateLimitedError, which the routes turn into 429 + Retry-After.
+# A caller that will share another caller's upstream call (single-flight) only pays
+# its token with charge(); the caller that makes the call then takes a slot with
+# charged=True, so waiting on a shared call never holds capacity or a queue place.
+# Waiting calls sit in one queue per priority class ('interactive', 'batch'). Freed
+# slots go to the class with the lowest stride pass (pass += 1 / weight per grant),
+# so with weights 4:1 interactive calls get four slots for every batch call while
+# both are backlogged, and neither class ever starves. Within a class, clients are
+# served round-robin, so one busy client cannot push everyone else's calls back.
+# The caller identity travels in a context variable set by the HTTP layer.
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+PRIORITIES = (INTERACTIVE, BATCH)
+
+_caller = contextvars.ContextVar('truthlense_llm_caller', default=('anonymous', INTERACTIVE))
+
+
+def set_caller(client, priority=INTERACTIVE):
+    _caller.set((client, priority if priority in PRIORITIES else INTERACTIVE))
+
+
+def current_caller():
+    return _caller.get()
+
+
+class RateLimitedError(Exception):
+    def __init__(self, message, retry_after, reason):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+
+    def take(self, rate, burst, now):
+        # Seconds until a token is available; 0.0 means one was taken
+        self.tokens = min(burst, self.tokens + (now - self.updated) * rate)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / rate
+
+
+class _Ticket:
+    def __init__(self, client, priority, loop=None):
+        self.client = client
+        self.priority = priority
+        self.granted = False
+        self.enqueued = time.perf_counter()
+        self._loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        # Called with the scheduler lock held, possibly from another thread
+        if self.event is not None:
+            self.event.set()
+        else:
+            self._loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class _ClassQueue:
+    # FIFO per client, clients served round-robin
+    def __init__(self, weight):
+        self.weight = float(weight)
+        self.pass_value = 0.0
+        self.clients = OrderedDict()
+        self.depth = 0
+
+    def push(self, ticket):
+        self.clients.setdefault(ticket.client, deque()).append(ticket)
+        self.depth += 1
+
+    def pop(self):
+        client, tickets = next(iter(self.clients.items()))
+        ticket = tickets.popleft()
+        del self.clients[client]
+        if tickets:
+            self.clients[client] = tickets
+        self.depth -= 1
+        return ticket
+
+    def remove(self, ticket):
+        tickets = self.clients.get(ticket.client)
+        if tickets is not None and ticket in tickets:
+            tickets.remove(ticket)
+            if not tickets:
+                del self.clients[ticket.client]
+            self.depth -= 1
+
+
+class LLMScheduler:
+    def __init__(self, capacity=8, weights=None, max_queue=None, rate=0.0, burst=60,
+                 queue_timeout=30.0, max_clients=100000):
+        self.capacity = max(1, int(capacity))
+        weights = weights or {INTERACTIVE: 4, BATCH: 1}
+        max_queue = max_queue or {INTERACTIVE: 200, BATCH: 1000}
+        self.max_queue = {p: max(0, int(max_queue.get(p, 0))) for p in PRIORITIES}
+        # rate <= 0 turns per-client limits off
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self.queue_timeout = float(queue_timeout)
+        self.max_clients = max(1, int(max_clients))
+        self._queues = {p: _ClassQueue(max(0.01, float(weights.get(p, 1)))) for p in PRIORITIES}
+        self._buckets = OrderedDict()
+        self._active = 0
+        self._virtual_time = 0.0
+        # Moving average of how long a slot is held, for Retry-After estimates
+        self._service_seconds = 1.0
+        self._lock = threading.Lock()
+        self._stats = {'granted': 0, 'rejected_rate': 0, 'rejected_queue': 0, 'rejected_timeout': 0}
+
+    # --- Admission ---
+
+    def _charge(self, client, now):
+        if self.rate <= 0:
+            return 0.0
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.burst, now)
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take(self.rate, self.burst, now)
+
+    def _refund(self, client):
+        bucket = self._buckets.get(client)
+        if bucket is not None and self.rate > 0:
+            bucket.tokens = min(self.burst, bucket.tokens + 1.0)
+
+    def _reject(self, message, retry_after, reason, priority):
+        self._stats['rejected_' + reason] += 1
+        metrics.LLM_SCHEDULER_REJECTIONS.inc(reason=reason, priority=priority)
+        return RateLimitedError(message, max(1, math.ceil(retry_after)), reason)
+
+    def _estimated_wait(self, depth):
+        return (depth + 1) * self._service_seconds / self.capacity
+
+    def _take_token(self, client, priority):
+        # Called with the lock held
+        wait = self._charge(client, time.monotonic())
+        if wait > 0:
+            raise self._reject('Rate limit exceeded for this client', wait, 'rate', priority)
+
+    def _admit(self, ticket, charged=False):
+        # Grant immediately, enqueue, or raise; called with the lock held
+        if not charged:
+            self._take_token(ticket.client, ticket.priority)
+        queue = self._queues[ticket.priority]
+        if self._active < self.capacity and not any(q.depth for q in self._queues.values()):
+            self._grant(ticket)
+            return
+        if queue.depth >= self.max_queue[ticket.priority]:
+            self._refund(ticket.client)
+            raise self._reject(
+                f'Too many queued {ticket.priority} requests', self._estimated_wait(queue.depth), 'queue', ticket.priority
+            )
+        if not queue.depth:
+            # A class that was idle rejoins at the current virtual time instead of
+            # spending credit saved up while it had nothing queued
+            queue.pass_value = max(queue.pass_value, self._virtual_time)
+        queue.push(ticket)
+
+    def _grant(self, ticket):
+        self._active += 1
+        self._stats['granted'] += 1
+        ticket.granted = True
+        ticket.wake()
+
+    def _dispatch(self):
+        # Hand free slots to waiting tickets, lowest pass first; lock held
+        while self._active < self.capacity:
+            backlogged = [q for q in self._queues.values() if q.depth]
+            if not backlogged:
+                return
+            queue = min(backlogged, key=lambda q: q.pass_value)
+            self._virtual_time = queue.pass_value
+            queue.pass_value += 1.0 / queue.weight
+            self._grant(queue.pop())
+
+    def _abandon(self, ticket):
+        # A waiter gave up; returns True if it had been granted meanwhile and must release
+        with self._lock:
+            if ticket.granted:
+                return True
+            self._queues[ticket.priority].remove(ticket)
+            return False
+
+    def _timed_out(self, ticket):
+        with self._lock:
+            return self._reject(
+                'Timed out waiting for LLM capacity',
+                self._estimated_wait(self._queues[ticket.priority].depth), 'timeout', ticket.priority
+            )
+
+    def release(self, held_seconds=None):
+        with self._lock:
+            self._active -= 1
+            if held_seconds is not None:
+                self._service_seconds += 0.1 * (held_seconds - self._service_seconds)
+            self._dispatch()
+
+    def set_capacity(self, capacity):
+        with self._lock:
+            self.capacity = max(1, int(capacity))
+            self._dispatch()
+
+    # --- Acquire ---
+
+    def charge(self, client=None, priority=None):
+        # Takes one token from the caller's bucket without taking a slot; raises
+        # RateLimitedError when it is empty
+        if client is None:
+            client, priority = current_caller()
+        with self._lock:
+            self._take_token(client, priority)
+
+    def acquire(self, client, priority, charged=False):
+        # Blocks until a slot is granted; returns the wait in seconds
+        ticket = _Ticket(client, priority)
+        with self._lock:
+            self._admit(ticket, charged)
+        if not ticket.event.wait(self.queue_timeout) and not ticket.granted:
+            if not self._abandon(ticket):
+                raise self._timed_out(ticket)
+        return time.perf_counter() - ticket.enqueued
+
+    async def acquire_async(self, client, priority, charged=False):
+        ticket = _Ticket(client, priority, loop=asyncio.get_running_loop())
+        with self._lock:
+            self._admit(ticket, charged)
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if not self._abandon(ticket):
+                raise self._timed_out(ticket)
+        except asyncio.CancelledError:
+            if self._abandon(ticket):
+                self.release()
+            raise
+        return time.perf_counter() - ticket.enqueued
+
+    @contextmanager
+    def slot(self, client=None, priority=None, charged=False):
+        if client is None:
+            client, priority = current_caller()
+        waited = self.acquire(client, priority, charged)
+        metrics.observe_stage('llm_schedule', waited)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    @asynccontextmanager
+    async def slot_async(self, client=None, priority=None, charged=False):
+        if client is None:
+            client, priority = current_caller()
+        waited = await self.acquire_async(client, priority, charged)
+        metrics.observe_stage('llm_schedule', waited)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - started)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                'capacity': self.capacity,
+                'active': self._active,
+                'queued': {p: q.depth for p, q in self._queues.items()},
+                'weights': {p: q.weight for p, q in self._queues.items()},
+                'max_queue': dict(self.max_queue),
+                'client_rate_per_second': self.rate,
+                'client_burst': self.burst,
+                'tracked_clients': len(self._buckets),
+                'avg_slot_seconds': round(self._service_seconds, 3)
+            })
+        return stats
+
+
+def api_key_digests(keys):
+    # The form client_id() checks API keys against, so raw keys need not be kept around
+    return frozenset(hashlib.sha256(k.encode('utf-8')).hexdigest() for k in keys if k)
+
+
+def client_id(api_key=None, remote_addr=None, forwarded_for=None, known_keys=frozenset(), proxy_hops=1):
+    # Bucket key: the API key when it is one of known_keys (see api_key_digests), else the
+    # client address. Any other key is ignored, so inventing keys buys no fresh bursts.
+    # forwarded_for is only passed in behind proxy_hops trusted proxies: the client is the
+    # entry the outermost of them appended, and everything left of it is client-supplied.
+    if api_key:
+        digest = hashlib.sha256(api_key.encode('utf-8')).hexdigest()
+        if digest in known_keys:
+            return 'key:' + digest[:16]
+    hops = [h.strip() for h in (forwarded_for or '').split(',') if h.strip()]
+    if hops:
+        return 'ip:' + hops[max(0, len(hops) - max(1, proxy_hops))]
+    return 'ip:' + (remote_addr or 'unknown')
@@ -0,0 +1,119 @@
+import os
+import sys
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Route tests import app.py once per session with a dummy key and a base URL nobody
+# listens on, so a call that slipped past the stub client would fail rather than reach
+# Perplexity. Engines load on first use and every persistent store is off.
+# load_dotenv() never overrides variables that are already set.
+os.environ.update({
+    'PERPLEXITY_API_KEY': 'test-dummy-key',
+    'PERPLEXITY_BASE_URL': 'http://127.0.0.1:9',
+    'STARTUP_MODE': 'lazy',
+    'STARTUP_WARMUP': '0',
+    'HISTORY_DB': '',
+    'VERDICT_CACHE_DB': '',
+    'CLAIM_INDEX_PATH': '',
+    'IMAGE_HASH_INDEX_PATH': '',
+    'ENSEMBLE_PATH': '',
+    'UPSTREAM_BACKOFF_BASE_SECONDS': '0'
+})
+
+VERDICT_JSON = (
+    '{"verdict": "FALSE", "confidence": "90%", "explanation": "Debunked.", '
+    '"historical_context": "", "first_verified": "", "last_updated": "", "sources": ["https://example.org"]}'
+)
+
+
+class FakeClock:
+    # Stands in for the time module inside the module under test
+    def __init__(self, start=1000000.0):
+        self.now = start
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def perf_counter(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeLLM:
+    # Stands in for the Perplexity client: counts calls and answers with `content`,
+    # a string or a function of the user prompt
+    def __init__(self):
+        self.content = VERDICT_JSON
+        self.delay = 0.0
+        self.error = None
+        self.calls = 0
+        self.prompts = []
+        self._lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=self)
+
+    def _reply(self, messages):
+        prompt = messages[-1]['content']
+        with self._lock:
+            self.calls += 1
+            self.prompts.append(prompt)
+        if self.error is not None:
+            raise self.error
+        content = self.content(prompt) if callable(self.content) else self.content
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    def create(self, model, messages, timeout=None, **kwargs):
+        time.sleep(self.delay)
+        return self._reply(messages)
+
+
+class FakeAsyncLLM(FakeLLM):
+    async def create(self, model, messages, timeout=None, **kwargs):
+        import asyncio
+        await asyncio.sleep(self.delay)
+        return self._reply(messages)
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def llm():
+    return FakeLLM()
+
+
+@pytest.fixture
+def core(llm, monkeypatch):
+    # app.py with the stub client and fresh caches, scheduler, breaker and flight
+    import app
+    import engines
+    from scheduler import LLMScheduler
+    from singleflight import SingleFlight
+    from upstream import CircuitBreaker
+
+    monkeypatch.setattr(app.llm_client_engine, 'value', llm)
+    monkeypatch.setattr(app.llm_client_engine, 'state', engines.READY)
+    monkeypatch.setattr(app, 'llm_scheduler', LLMScheduler())
+    monkeypatch.setattr(app, 'llm_flight', SingleFlight())
+    monkeypatch.setattr(app.upstream, 'breaker', CircuitBreaker())
+    monkeypatch.setattr(app, 'history_store', None)
+    app.verdict_cache.clear()
+    monkeypatch.setattr(app.claim_index_engine, 'value', app.load_claim_index())
+    monkeypatch.setattr(app.claim_index_engine, 'state', engines.READY)
+    return app
+
+
+@pytest.fixture
+def client(core):
+    return core.app.test_client()
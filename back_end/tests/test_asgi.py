@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from conftest import FakeAsyncLLM
+from singleflight import AsyncSingleFlight
+
+
+@pytest.fixture
+def async_llm():
+    return FakeAsyncLLM()
+
+
+@pytest.fixture
+def serve(core, async_llm, monkeypatch):
+    # Runs `requests(client)` against asgi.application on a fresh event loop
+    import asgi
+    monkeypatch.setattr(asgi, 'async_client', async_llm)
+    monkeypatch.setattr(asgi, 'llm_semaphore', None)
+    monkeypatch.setattr(asgi, 'llm_flight', AsyncSingleFlight())
+
+    def run(requests):
+        async def main():
+            transport = httpx.ASGITransport(app=asgi.application, client=('10.0.0.1', 1234))
+            async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+                return await requests(client)
+        return asyncio.run(main())
+
+    return run
+
+
+def test_verify_is_served_on_the_event_loop(serve, async_llm, llm):
+    response = serve(lambda c: c.post('/api/verify', json={'text': 'The moon is made of cheese'}))
+    assert response.status_code == 200
+    body = response.json()
+    assert body['verdict'] == 'FALSE'
+    assert 'meta_analysis' in body
+    assert async_llm.calls == 1
+    assert llm.calls == 0
+
+
+def test_identical_claims_share_one_call(core, serve, async_llm):
+    async_llm.delay = 0.05
+
+    async def requests(client):
+        return await asyncio.gather(*(
+            client.post('/api/verify', json={'text': 'The moon is made of cheese'}) for _ in range(10)
+        ))
+
+    responses = serve(requests)
+    assert [r.status_code for r in responses] == [200] * 10
+    assert async_llm.calls == 1
+    assert core.llm_scheduler.stats()['granted'] == 1
+
+
+def test_batch_keeps_input_order(serve, async_llm):
+    async_llm.content = lambda prompt: json.dumps({
+        'verdict': 'TRUE' if 'Water' in prompt else 'FALSE', 'confidence': '70%', 'explanation': '',
+        'historical_context': '', 'first_verified': '', 'last_updated': '', 'sources': []
+    })
+    texts = ['Water boils at 100 degrees', '', 'The moon is made of cheese']
+    body = serve(lambda c: c.post('/api/verify/batch', json={'texts': texts})).json()
+    assert body['errors'] == 1
+    assert [r.get('verdict') for r in body['results']] == ['TRUE', None, 'FALSE']
+    assert 'meta_analysis' in body['results'][2]
+
+
+def test_stream_matches_the_flask_event_order(serve):
+    response = serve(lambda c: c.post('/api/verify/stream', json={'text': 'The moon is made of cheese'}))
+    assert response.headers['content-type'] == 'application/x-ndjson'
+    events = [json.loads(line)['event'] for line in response.text.splitlines()]
+    assert events == ['ml_model', 'heuristics', 'llm', 'meta_analysis', 'result', 'done']
+
+
+def test_bad_requests_and_other_routes(serve):
+    async def requests(client):
+        return (
+            await client.post('/api/verify', json={'claim': 'x'}),
+            await client.post('/api/verify/batch', json={'texts': []}),
+            await client.get('/api/cache/stats')
+        )
+
+    missing_text, empty_batch, stats = serve(requests)
+    assert missing_text.status_code == 400
+    assert empty_batch.status_code == 400
+    # Routes without a native handler go to the Flask app
+    assert stats.status_code == 200
+    assert 'single_flight' in stats.json()
@@ -0,0 +1,84 @@
+import json
+import re
+import threading
+import time
+
+from scheduler import LLMScheduler
+
+STATEMENT = re.compile(r"Statement: '(.*)'\n")
+
+
+def echo_verdict(prompt):
+    # Answers every claim with its own text as the explanation; "garbled" claims and the
+    # follow-up asking to reformat them get prose instead of JSON
+    match = STATEMENT.search(prompt)
+    if match is None or 'garbled' in match.group(1):
+        return 'Sorry, I cannot answer that in JSON.'
+    return json.dumps({
+        'verdict': 'FALSE', 'confidence': '80%', 'explanation': match.group(1),
+        'historical_context': '', 'first_verified': '', 'last_updated': '', 'sources': []
+    })
+
+
+def asked(llm):
+    return [m.group(1) for m in map(STATEMENT.search, llm.prompts) if m is not None]
+
+
+def test_results_keep_input_order(client, llm):
+    llm.content = echo_verdict
+    texts = [f'Claim number {i} about the moon' for i in range(12)]
+    body = client.post('/api/verify/batch', json={'texts': texts}).get_json()
+    assert body['count'] == 12
+    assert body['errors'] == 0
+    assert [r['explanation'] for r in body['results']] == texts
+    assert sorted(asked(llm)) == sorted(texts)
+
+
+def test_bad_items_fail_in_place(client, llm):
+    llm.content = echo_verdict
+    texts = ['The moon is made of cheese', '', 42, 'A garbled claim', '   ']
+    body = client.post('/api/verify/batch', json={'texts': texts}).get_json()
+    results = body['results']
+    assert body['count'] == 5
+    assert body['errors'] == 4
+    assert results[0]['explanation'] == 'The moon is made of cheese'
+    assert results[1] == results[2] == results[4] == {'error': 'No text provided'}
+    assert results[3] == {'error': 'Failed to parse AI response'}
+
+
+def test_malformed_bodies_are_rejected(client):
+    assert client.post('/api/verify/batch', json={'text': 'one claim'}).status_code == 400
+    assert client.post('/api/verify/batch', json={'texts': 'one claim'}).status_code == 400
+    assert client.post('/api/verify/batch', json={'texts': []}).status_code == 400
+
+
+def test_batches_over_the_cap_are_rejected(core, client, llm, monkeypatch):
+    monkeypatch.setattr(core, 'BATCH_MAX_ITEMS', 3)
+    response = client.post('/api/verify/batch', json={'texts': ['a', 'b', 'c', 'd']})
+    assert response.status_code == 413
+    assert 'at most 3' in response.get_json()['error']
+    assert llm.calls == 0
+    assert client.post('/api/verify/batch', json={'texts': ['a', 'b', 'c']}).status_code == 200
+
+
+def test_small_batch_is_not_stuck_behind_a_large_one(core, client, llm, monkeypatch):
+    # One upstream slot: the scheduler alternates between the two callers, so the second
+    # caller's claims go out long before the first caller's batch has drained
+    monkeypatch.setattr(core, 'llm_scheduler', LLMScheduler(capacity=1))
+    llm.content = echo_verdict
+    llm.delay = 0.03
+    large = [f'Claim {i} from the large batch' for i in range(20)]
+    small = ['First small claim', 'Second small claim']
+
+    big = threading.Thread(target=client.post, args=('/api/verify/batch',), kwargs={'json': {'texts': large}})
+    big.start()
+    time.sleep(0.1)
+    body = core.app.test_client().post(
+        '/api/verify/batch', json={'texts': small}, environ_base={'REMOTE_ADDR': '10.0.0.2'}
+    ).get_json()
+    big.join()
+
+    assert body['errors'] == 0
+    order = asked(llm)
+    assert len(order) == 22
+    assert max(order.index(text) for text in small) < 10
@@ -0,0 +1,84 @@
+import csv
+import json
+
+import pytest
+
+import bulk_score
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    # Ten claims, one with a quoted newline, and the id column the output should carry
+    path = tmp_path / 'claims.csv'
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'tweet'])
+        for i in range(10):
+            text = f'Claim number {i}: BREAKING NEWS!!! see https://example.org/{i}'
+            writer.writerow([f'c{i}', text + '\nsecond line' if i == 4 else text])
+    return path
+
+
+def score(corpus, output, *extra):
+    args = bulk_score.parse_args([
+        str(corpus), str(output), '--id-column', 'id', '--chunk-size', '3', '--workers', '1', '--ensemble', '', *extra
+    ])
+    return bulk_score.run(args)
+
+
+def interrupt_at_chunk(monkeypatch, index):
+    score_chunk = bulk_score.score_chunk
+
+    def interrupted(chunk, *args):
+        if chunk['index'] == index:
+            raise KeyboardInterrupt
+        return score_chunk(chunk, *args)
+    monkeypatch.setattr(bulk_score, 'score_chunk', interrupted)
+
+
+def test_csv_output_has_one_row_per_record(corpus, tmp_path):
+    output = tmp_path / 'scores.csv'
+    checkpoint = score(corpus, output)
+    with open(output, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [r['id'] for r in rows] == [f'c{i}' for i in range(10)]
+    assert rows[0]['num_urls'] == '1'
+    assert rows[0]['ml_label'] in ('Real', 'Fake')
+    assert (checkpoint['rows'], checkpoint['chunks'], checkpoint['complete']) == (10, 4, True)
+
+
+def test_interrupted_run_resumes_to_the_same_output(corpus, tmp_path, monkeypatch):
+    expected = tmp_path / 'expected.jsonl'
+    score(corpus, expected)
+
+    output = tmp_path / 'scores.jsonl'
+    interrupt_at_chunk(monkeypatch, 2)
+    with pytest.raises(SystemExit) as exit_info:
+        score(corpus, output)
+    assert exit_info.value.code == 130
+    with open(str(output) + '.checkpoint.json') as f:
+        assert json.load(f)['rows'] == 6
+    # A torn write past the checkpoint is discarded on resume
+    with open(output, 'ab') as f:
+        f.write(b'{"offset": 12')
+
+    monkeypatch.undo()
+    checkpoint = score(corpus, output)
+    assert checkpoint['rows'] == 10
+    assert output.read_bytes() == expected.read_bytes()
+
+
+def test_resume_refuses_other_settings_and_finished_runs(corpus, tmp_path, monkeypatch, capsys):
+    output = tmp_path / 'scores.jsonl'
+    interrupt_at_chunk(monkeypatch, 1)
+    with pytest.raises(SystemExit):
+        score(corpus, output)
+    monkeypatch.undo()
+    with pytest.raises(SystemExit, match='different settings'):
+        score(corpus, output, '--include-text')
+
+    score(corpus, output)
+    before = output.read_bytes()
+    assert score(corpus, output)['complete']
+    assert 'already complete' in capsys.readouterr().out
+    assert output.read_bytes() == before
@@ -0,0 +1,157 @@
+import json
+
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+import claim_index
+from claim_index import ClaimIndex, claim_guard
+
+CORPUS = [
+    "Vaccines cause autism in children",
+    "The moon landing was staged in a film studio",
+    "Drinking coffee every day improves memory",
+    "The Great Wall of China is visible from space",
+    "Eating carrots improves night vision",
+    "The unemployment rate fell to 4 percent in 2019"
+]
+
+
+@pytest.fixture
+def vectorizer():
+    # English stop words include "not" and "no", as in the trained vectorizer
+    return TfidfVectorizer(stop_words='english').fit(CORPUS)
+
+
+@pytest.fixture
+def index(vectorizer, clock, monkeypatch):
+    monkeypatch.setattr(claim_index, 'time', clock)
+    return ClaimIndex(vectorizer, threshold=0.8, ttl_seconds=60, fingerprint='v1')
+
+
+def test_guard_counts_negations_and_numbers():
+    assert claim_guard("Vaccines don't cause autism") == (1, [])
+    assert claim_guard('Vaccines do NOT cause autism, never') == (2, [])
+    assert claim_guard('It fell to 4.5 percent in 2,019') == (0, ['2019', '4.5'])
+
+
+def test_paraphrase_reuses_the_verdict(index):
+    index.add('k1', 'Vaccines cause autism in children', {'verdict': 'FALSE'})
+    match = index.lookup('vaccines CAUSE autism in children!')
+    assert match['key'] == 'k1'
+    assert match['verdict'] == {'verdict': 'FALSE'}
+    assert match['similarity'] >= 0.8
+
+
+def test_negated_claim_is_not_matched(index):
+    index.add('k1', 'Vaccines cause autism in children', {'verdict': 'FALSE'})
+    assert index.lookup('Vaccines do not cause autism in children') is None
+    assert index.lookup("Vaccines don't cause autism in children") is None
+    stats = index.stats()
+    assert stats['guard_rejections'] == 2
+    assert stats['hits'] == 0
+
+
+def test_claim_with_other_numbers_is_not_matched(index):
+    index.add('k1', 'The unemployment rate fell to 4 percent in 2019', {'verdict': 'TRUE'})
+    assert index.lookup('The unemployment rate fell to 9 percent in 2019') is None
+    assert index.lookup('The unemployment rate fell to 4 percent in 2019')['key'] == 'k1'
+
+
+def test_expired_entries_are_not_served(index, clock):
+    index.add('k1', 'Vaccines cause autism in children', {'verdict': 'FALSE'})
+    clock.advance(20)
+    assert index.lookup('Vaccines cause autism in children')['expires_at'] == clock.now + 40
+    clock.advance(40)
+    assert index.lookup('Vaccines cause autism in children') is None
+    assert index.stats()['expired'] == 1
+
+
+def test_log_from_another_vectorizer_is_rebuilt(vectorizer, tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(claim_index, 'time', clock)
+    path = str(tmp_path / 'claims.jsonl')
+    ClaimIndex(vectorizer, path=path, fingerprint='v1').add('k1', 'Vaccines cause autism in children', {'verdict': 'FALSE'})
+
+    retrained = TfidfVectorizer(stop_words='english').fit(list(reversed(CORPUS)) + ['Bananas are berries'])
+    reloaded = ClaimIndex(retrained, path=path, fingerprint='v2')
+    assert reloaded.lookup('Vaccines cause autism in children')['key'] == 'k1'
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    assert [r['fingerprint'] for r in records] == ['v2']
+
+
+def test_expired_records_are_dropped_on_load(vectorizer, tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(claim_index, 'time', clock)
+    path = str(tmp_path / 'claims.jsonl')
+    first = ClaimIndex(vectorizer, path=path, ttl_seconds=60, fingerprint='v1')
+    first.add('k1', 'Vaccines cause autism in children', {'verdict': 'FALSE'})
+    clock.advance(30)
+    first.add('k2', 'Eating carrots improves night vision', {'verdict': 'MIXED'})
+    clock.advance(30)
+    reloaded = ClaimIndex(vectorizer, path=path, ttl_seconds=60, fingerprint='v1')
+    assert len(reloaded) == 1
+    assert reloaded.lookup('Eating carrots improves night vision')['key'] == 'k2'
+    with open(path) as f:
+        assert [json.loads(line)['key'] for line in f] == ['k2']
+
+
+@pytest.fixture
+def topics(clock, monkeypatch):
+    # One distinct claim per topic word, added a second apart
+    monkeypatch.setattr(claim_index, 'time', clock)
+    claims = [f'Report about topic{i}' for i in range(20)]
+    vectorizer = TfidfVectorizer().fit(claims)
+
+    def fill(index, count):
+        for i in range(count):
+            index.add(f'k{i}', claims[i], {'verdict': 'TRUE'})
+            clock.advance(1)
+    return vectorizer, claims, fill
+
+
+def test_oldest_claims_are_evicted_past_the_cap(topics):
+    vectorizer, claims, fill = topics
+    index = ClaimIndex(vectorizer, threshold=0.9, max_entries=10, fingerprint='v1')
+    fill(index, 10)
+    # Re-verifying the oldest claim makes it the newest
+    index.add('k0', claims[0], {'verdict': 'FALSE'})
+    index.add('k10', claims[10], {'verdict': 'TRUE'})
+    # 11 claims against a cap of 10: trimmed to 9 in one batch
+    assert len(index) == 9
+    assert index.stats()['evictions'] == 2
+    assert index.lookup(claims[1]) is None
+    assert index.lookup(claims[2]) is None
+    assert index.lookup(claims[0])['verdict'] == {'verdict': 'FALSE'}
+    assert index.lookup(claims[10])['key'] == 'k10'
+
+
+def test_eviction_compacts_the_log(topics, tmp_path):
+    vectorizer, claims, fill = topics
+    path = str(tmp_path / 'claims.jsonl')
+    index = ClaimIndex(vectorizer, threshold=0.9, path=path, max_entries=10, fingerprint='v1')
+    fill(index, 11)
+    with open(path) as f:
+        assert [json.loads(line)['key'] for line in f] == [f'k{i}' for i in range(2, 11)]
+    reloaded = ClaimIndex(vectorizer, threshold=0.9, path=path, max_entries=10, fingerprint='v1')
+    assert reloaded.lookup(claims[5])['key'] == 'k5'
+
+
+def test_oversized_log_is_trimmed_on_load(topics, tmp_path):
+    vectorizer, claims, fill = topics
+    path = str(tmp_path / 'claims.jsonl')
+    fill(ClaimIndex(vectorizer, path=path, max_entries=100, fingerprint='v1'), 20)
+    reloaded = ClaimIndex(vectorizer, threshold=0.9, path=path, max_entries=10, fingerprint='v1')
+    assert len(reloaded) == 9
+    assert reloaded.lookup(claims[10]) is None
+    assert reloaded.lookup(claims[19])['key'] == 'k19'
+    with open(path) as f:
+        assert len(f.readlines()) == 9
+
+
+def test_reverified_claims_do_not_grow_the_log(topics, tmp_path):
+    vectorizer, claims, _ = topics
+    path = str(tmp_path / 'claims.jsonl')
+    index = ClaimIndex(vectorizer, path=path, max_entries=2, fingerprint='v1')
+    for verdict in ('TRUE', 'FALSE', 'MIXED', 'TRUE', 'FALSE'):
+        index.add('k0', claims[0], {'verdict': verdict})
+    with open(path) as f:
+        assert [json.loads(line)['verdict'] for line in f] == [{'verdict': 'FALSE'}]
@@ -0,0 +1,98 @@
+import threading
+
+import pytest
+
+import engines
+from engines import COLD, FAILED, READY, WARMING, EngineRegistry
+
+
+@pytest.fixture
+def registry(clock, monkeypatch):
+    monkeypatch.setattr(engines, 'time', clock)
+    return EngineRegistry()
+
+
+def loader(clock, seconds, value='loaded'):
+    def load():
+        clock.advance(seconds)
+        return value
+    return load
+
+
+def broken():
+    raise RuntimeError('missing artifact')
+
+
+def test_engine_loads_once_and_records_failures(registry):
+    calls = []
+    engine = registry.register('model', lambda: calls.append(1) or 'model')
+    threads = [threading.Thread(target=engine.get) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert calls == [1]
+    assert (engine.state, engine.get()) == (READY, 'model')
+
+    failing = registry.register('index', broken)
+    assert failing.peek() is None
+    assert failing.get() is None
+    assert failing.status()['state'] == FAILED
+    assert failing.status()['error'] == 'missing artifact'
+
+
+def test_lazy_registry_is_ready_while_engines_are_cold(registry, clock):
+    registry.register('model', loader(clock, 2))
+    assert registry.is_ready()
+    status = registry.status()
+    assert status['engines']['model']['state'] == COLD
+    assert status['seconds_to_ready'] is None
+
+
+def test_warming_registry_waits_for_required_engines(registry, clock):
+    model = registry.register('model', loader(clock, 2))
+    registry._warming = True
+    assert not registry.is_ready()
+    model.state = WARMING
+    assert not registry.is_ready()
+    model.get()
+    assert registry.is_ready()
+
+
+def test_failed_required_engine_counts_as_settled(registry):
+    registry.register('index', broken)
+    registry._warming = True
+    registry.warm_all()
+    assert registry.is_ready()
+    assert registry.status()['seconds_to_ready'] == 0
+
+
+def test_optional_engines_do_not_delay_readiness(registry, clock):
+    registry.register('client', loader(clock, 1))
+    registry.register('model', loader(clock, 2))
+    registry.register('forensics', loader(clock, 30), required=False)
+    registry.register('image_index', loader(clock, 30), required=False)
+    registry._warming = True
+    registry.warm_all()
+    status = registry.status()
+    assert status['seconds_to_ready'] == 3
+    assert [e['state'] for e in status['engines'].values()] == [READY] * 4
+
+
+def test_seconds_to_ready_with_only_optional_engines(registry, clock):
+    registry.register('forensics', loader(clock, 30), required=False)
+    registry.warm_all()
+    assert registry.status()['seconds_to_ready'] == 0
+
+
+def test_ready_route(core, client, monkeypatch):
+    # The test app starts without a warm-up, so nothing is being waited on
+    response = client.get('/api/ready')
+    assert response.status_code == 200
+    assert response.get_json()['engines']['image_forensics']['required'] is False
+
+    monkeypatch.setattr(core.engine_registry, '_warming', True)
+    monkeypatch.setattr(core.claim_index_engine, 'state', WARMING)
+    response = client.get('/api/ready')
+    assert response.status_code == 503
+    assert response.get_json()['ready'] is False
@@ -0,0 +1,91 @@
+import json
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from ensemble import CalibratedEnsemble, LegacyEnsemble, ensemble_inputs, load_ensemble
+
+
+def inputs_for(verdict, confidence, ml_label, ml_confidence, risk=0.0):
+    prob_real = ml_confidence / 100.0 if ml_label == 'Real' else 1 - ml_confidence / 100.0
+    ml = {'label': ml_label, 'confidence': ml_confidence, 'raw_probs': {'real': prob_real}}
+    return ensemble_inputs(
+        [{'verdict': verdict, 'confidence': f'{confidence}%'}], [ml], [{'heuristic_risk_bonus': risk}]
+    )
+
+
+def test_legacy_formula():
+    scores = LegacyEnsemble().score(inputs_for('TRUE', 90, 'Real', 80, risk=4))
+    assert scores['combined_confidence_score'][0] == pytest.approx(90 * 0.6 + 80 * 0.4 + 2)
+    assert bool(scores['engines_agree'][0]) is True
+    scores = LegacyEnsemble().score(inputs_for('TRUE', 90, 'Fake', 80))
+    assert scores['combined_confidence_score'][0] == pytest.approx(90 * 0.5 + 80 * 0.5 - 15)
+
+
+@pytest.fixture
+def fitted(tmp_path):
+    # fit_ensemble() on a synthetic held-out set: one informative feature and claims
+    # whose LLM verdicts are right 85% of the time
+    import train
+    rng = np.random.default_rng(0)
+    n = 600
+    y = rng.integers(0, 2, n)
+    X = (y + rng.normal(0, 1.2, n)).reshape(-1, 1)
+    clf = LogisticRegression().fit(X, y)
+    texts = np.array([f'Synthetic claim number {i}' for i in range(n)], dtype=object)
+    model_out, vectorizer_out = tmp_path / 'model.pkl', tmp_path / 'vectorizer.pkl'
+    model_out.write_bytes(b'model')
+    vectorizer_out.write_bytes(b'vectorizer')
+    verdicts_path = tmp_path / 'llm.jsonl'
+    with open(verdicts_path, 'w') as f:
+        for text, label in zip(texts, y):
+            right = rng.random() < 0.85
+            f.write(json.dumps({'claim': text, 'verdict': 'TRUE' if bool(label) == right else 'FALSE', 'confidence': '80%'}) + '\n')
+
+    def fit(llm_verdicts):
+        args = SimpleNamespace(
+            phrases=None, calibration='platt', llm_verdicts=str(verdicts_path) if llm_verdicts else None,
+            model_out=str(model_out), vectorizer_out=str(vectorizer_out),
+            ensemble_out=str(tmp_path / ('with_llm.json' if llm_verdicts else 'without_llm.json'))
+        )
+        params = train.fit_ensemble(clf, X, y, texts, args)
+        return params, args.ensemble_out, [str(model_out), str(vectorizer_out)]
+
+    return fit
+
+
+def test_ensemble_with_fitted_llm_weight_is_served(fitted):
+    params, path, sources = fitted(llm_verdicts=True)
+    assert params['llm_weight_fitted'] is True
+    assert params['weights']['llm_evidence'] > 0
+    scorer = load_ensemble(path, sources)
+    assert isinstance(scorer, CalibratedEnsemble)
+    agree = scorer.score(inputs_for('TRUE', 90, 'Real', 80))['combined_confidence_score'][0]
+    disagree = scorer.score(inputs_for('TRUE', 90, 'Fake', 80))['combined_confidence_score'][0]
+    assert 0 <= disagree < agree <= 100
+
+
+def test_unfitted_llm_weight_keeps_the_legacy_score(fitted):
+    # A plain `python train.py` has no LLM verdicts; serving that file would drop the
+    # Perplexity verdict from combined_confidence_score
+    params, path, sources = fitted(llm_verdicts=False)
+    assert params['llm_weight_fitted'] is False
+    assert params['weights']['llm_evidence'] == 0.0
+    assert isinstance(load_ensemble(path, sources), LegacyEnsemble)
+
+
+def test_ensemble_for_another_model_is_not_served(fitted, tmp_path):
+    _, path, sources = fitted(llm_verdicts=True)
+    with open(sources[0], 'wb') as f:
+        f.write(b'retrained model')
+    assert isinstance(load_ensemble(path, sources), LegacyEnsemble)
+    assert isinstance(load_ensemble(str(tmp_path / 'missing.json'), sources), LegacyEnsemble)
+
+
+def test_verify_reports_the_scorer_in_meta_analysis(client):
+    response = client.post('/api/verify', json={'text': 'Eating carrots improves night vision'})
+    meta = response.get_json()['meta_analysis']
+    assert meta['scorer'] == 'legacy'
+    assert 0 <= meta['combined_confidence_score'] <= 100
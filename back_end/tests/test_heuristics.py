@@ -0,0 +1,84 @@
+import re
+
+import numpy as np
+import pytest
+
+from heuristics import FEATURE_NAMES, HeuristicEngine, load_phrases
+
+PHRASES = ["you won't believe", "shocking truth", "what they don't want you to know", "breaking news"]
+
+
+def reference(text):
+    # The regex and substring checks that HeuristicEngine replaced
+    words = text.split()
+    num_words = len(words)
+    num_exclam = text.count('!')
+    has_all_caps_word = any(len(w) > 4 and w.isupper() for w in words)
+    num_urls = len(re.findall(r"https?://\S+", text))
+    has_sensational_phrase = any(p.lower() in text.lower() for p in PHRASES)
+    heuristic_risk = 0
+    if num_exclam >= 3:
+        heuristic_risk += 10
+    if has_all_caps_word:
+        heuristic_risk += 10
+    if num_urls >= 2:
+        heuristic_risk += 10
+    if has_sensational_phrase:
+        heuristic_risk += 15
+    if num_words < 8 or num_words > 200:
+        heuristic_risk += 5
+    return {
+        'length_chars': len(text),
+        'length_words': num_words,
+        'num_exclamation_marks': num_exclam,
+        'num_urls': num_urls,
+        'has_all_caps_word': has_all_caps_word,
+        'has_sensational_phrase': has_sensational_phrase,
+        'heuristic_risk_bonus': min(40, heuristic_risk)
+    }
+
+
+TEXTS = [
+    "",
+    "The moon is made of cheese",
+    "BREAKING NEWS!!! You Won't Believe what they DON'T want you to know!",
+    "Sources: https://a.example/x http://b.example and https://c.example/y?z=1",
+    "A bare scheme http:// or https:// is not a link, but http://x is",
+    "Glued links https://a.exhttp://b.ex count once; so does xhttps://y",
+    "A scheme at the end of a word: see https://",
+    "shocking\ttruth\nacross lines " + "word " * 210,
+    "Ünïcödé SHOUTING ÄÖÜÄÖ and breaking newsroom"
+]
+
+
+@pytest.fixture
+def engine():
+    return HeuristicEngine(PHRASES)
+
+
+@pytest.mark.parametrize('text', TEXTS)
+def test_features_match_the_regex_implementation(engine, text):
+    assert engine.extract(text) == reference(text)
+
+
+def test_random_texts_match_the_regex_implementation(engine):
+    rng = np.random.default_rng(0)
+    pieces = ['http://', 'https://', 'x', 'http', '!', ' ', '\n', 'SHOUT', 'breaking news', "you won't believe"]
+    for _ in range(500):
+        text = ''.join(rng.choice(pieces, size=rng.integers(0, 20)))
+        assert engine.extract(text) == reference(text), text
+
+
+def test_matched_phrases_and_feature_matrix(engine):
+    assert engine.matched_phrases('Shocking truth: BREAKING NEWS') == ['breaking news', 'shocking truth']
+    matrix = engine.feature_matrix(TEXTS[:3])
+    assert matrix.shape == (3, len(FEATURE_NAMES))
+    assert list(matrix[2]) == [float(reference(TEXTS[2])[name]) for name in FEATURE_NAMES]
+
+
+def test_phrase_file_skips_comments_and_blank_lines(tmp_path):
+    path = tmp_path / 'phrases.txt'
+    path.write_text('# comment\n\n  miracle cure  \nbig pharma\n')
+    assert load_phrases(str(path)) == ['miracle cure', 'big pharma']
+    engine = HeuristicEngine.from_file(str(path))
+    assert engine.extract('This MIRACLE cure works')['has_sensational_phrase']
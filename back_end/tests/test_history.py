@@ -0,0 +1,103 @@
+import pytest
+
+import history_store
+from conftest import VERDICT_JSON
+from history_store import VerificationHistory, fts_query
+
+
+def verdict(label, confidence=80, combined=None):
+    result = {'verdict': label, 'confidence': f'{confidence}%', 'ml_model': {'label': 'Fake', 'confidence': 70.0}}
+    if combined is not None:
+        result['meta_analysis'] = {'combined_confidence_score': combined}
+    return result
+
+
+@pytest.fixture
+def history(tmp_path):
+    store = VerificationHistory(str(tmp_path / 'history.db'), flush_seconds=0.01)
+    yield store
+    store.close()
+
+
+def test_fts_query_quotes_every_word():
+    assert fts_query('vaccines "cause" OR autism*') == '"vaccines" "cause" "OR" "autism"'
+    assert fts_query('!!!') == ''
+
+
+def test_records_are_searchable_newest_first(history):
+    history.record('Vaccines cause autism', verdict('FALSE', 95, 12.5), 'api')
+    history.record('The moon landing was staged', verdict('FALSE'), 'batch')
+    history.record('Coffee improves memory', verdict('MIXED'), 'stream')
+    history.flush()
+
+    items, cursor = history.search()
+    assert [i['claim'] for i in items] == ['Coffee improves memory', 'The moon landing was staged', 'Vaccines cause autism']
+    assert cursor is None
+    assert items[2]['confidence'] == 95.0
+    assert items[2]['combined_score'] == 12.5
+    assert items[2]['ml_label'] == 'Fake'
+
+    assert [i['claim'] for i in history.search(q='vaccine autism')[0]] == []
+    assert [i['claim'] for i in history.search(q='VACCINES autism')[0]] == ['Vaccines cause autism']
+    assert [i['source'] for i in history.search(verdict='FALSE')[0]] == ['batch', 'api']
+    assert [i['claim'] for i in history.search(text='vaccines CAUSE autism!')[0]] == ['Vaccines cause autism']
+    assert history.get(items[0]['id'])['result']['verdict'] == 'MIXED'
+    assert history.get(10 ** 6) is None
+
+
+def test_pages_follow_the_cursor(history):
+    for i in range(7):
+        history.record(f'Claim number {i}', verdict('TRUE'), 'api')
+    history.flush()
+    seen = []
+    cursor = None
+    while True:
+        items, cursor = history.search(q='claim', cursor=cursor, limit=3)
+        seen.append([i['claim'][-1] for i in items])
+        if cursor is None:
+            break
+    assert seen == [['6', '5', '4'], ['3', '2', '1'], ['0']]
+
+
+def test_time_window(history, clock, monkeypatch):
+    monkeypatch.setattr(history_store, 'time', clock)
+    history.record('Old claim', verdict('TRUE'), 'api')
+    clock.advance(100)
+    history.record('New claim', verdict('TRUE'), 'api')
+    history.flush()
+    since = clock.now - 50
+    assert [i['claim'] for i in history.search(since=since)[0]] == ['New claim']
+    assert [i['claim'] for i in history.search(until=since)[0]] == ['Old claim']
+
+
+@pytest.fixture
+def stored(core, history, monkeypatch):
+    monkeypatch.setattr(core, 'history_store', history)
+    return history
+
+
+def test_answered_verifications_are_recorded(client, llm, stored):
+    assert client.post('/api/verify', json={'text': 'The moon is made of cheese'}).status_code == 200
+    llm.content = 'not json'
+    assert client.post('/api/verify', json={'text': 'Bananas are berries'}).status_code == 500
+    llm.content = VERDICT_JSON
+    client.post('/api/verify/batch', json={'texts': ['Coffee improves memory', '']})
+    stored.flush()
+
+    body = client.get('/api/history').get_json()
+    assert [(i['claim'], i['source']) for i in body['items']] == [
+        ('Coffee improves memory', 'batch'), ('The moon is made of cheese', 'api')
+    ]
+    record = client.get(f"/api/history/{body['items'][1]['id']}").get_json()
+    assert record['result']['meta_analysis']['combined_confidence_score'] == record['combined_score']
+    assert client.get('/api/history?verdict=false&q=moon').get_json()['count'] == 1
+    assert client.get('/api/history/stats').get_json()['written'] == 2
+
+
+def test_history_route_errors(client, core, stored, monkeypatch):
+    assert client.get('/api/history?limit=ten').status_code == 400
+    assert client.get('/api/history?since=yesterday').status_code == 400
+    assert client.get('/api/history?since=2026-01-01T00:00:00Z').status_code == 200
+    assert client.get('/api/history/12345').status_code == 404
+    monkeypatch.setattr(core, 'history_store', None)
+    assert client.get('/api/history').status_code == 404
@@ -0,0 +1,105 @@
+import io
+import json
+import multiprocessing
+import tarfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import engines
+
+
+def jpeg_bytes(seed, size=(96, 64)):
+    pixels = np.random.default_rng(seed).integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def zip_upload(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, data in members.items():
+            archive.writestr(name, data)
+    buffer.seek(0)
+    return buffer
+
+
+def events_of(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+@pytest.fixture(scope='module')
+def pool():
+    # One real spawn worker: checks that analyze_image_bytes runs without app.py
+    executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'))
+    yield executor
+    executor.shutdown()
+
+
+@pytest.fixture
+def batch(core, client, pool, monkeypatch):
+    monkeypatch.setattr(core, 'get_image_executor', lambda: pool)
+    monkeypatch.setattr(core.image_hash_engine, 'value', None)
+    monkeypatch.setattr(core.image_hash_engine, 'state', engines.READY)
+
+    def post(data):
+        return client.post('/api/analyze-image/batch', data=data, content_type='multipart/form-data')
+    return post
+
+
+def test_files_and_archive_members_stream_back_with_their_index(batch):
+    archive = zip_upload({
+        'album/one.jpg': jpeg_bytes(1),
+        'album/notes.txt': b'not an image',
+        '__MACOSX/album/._one.jpg': b'resource fork',
+        'album/broken.png': b'not really a png'
+    })
+    response = batch({
+        'images': [(io.BytesIO(jpeg_bytes(2)), 'a.jpg'), (io.BytesIO(jpeg_bytes(3)), 'b.jpg')],
+        'archive': (archive, 'album.zip')
+    })
+    assert response.mimetype == 'application/x-ndjson'
+    events = events_of(response)
+    assert events[-1] == {'event': 'done', 'data': {'count': 4, 'errors': 1}}
+    images = sorted((e['data'] for e in events[:-1]), key=lambda d: d['index'])
+    assert [d['filename'] for d in images] == ['a.jpg', 'b.jpg', 'album/one.jpg', 'album/broken.png']
+    assert all('verdict' in d['result'] for d in images[:3])
+    assert images[3]['error'].startswith('Failed to process image')
+
+
+def test_tar_archives_are_read_as_a_stream(batch):
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as archive:
+        data = jpeg_bytes(4)
+        info = tarfile.TarInfo('shots/x.jpg')
+        info.size = len(data)
+        archive.addfile(info, io.BytesIO(data))
+    buffer.seek(0)
+    events = events_of(batch({'archive': (buffer, 'shots.tar.gz')}))
+    assert events[0]['data']['filename'] == 'shots/x.jpg'
+    assert 'result' in events[0]['data']
+    assert events[-1]['data'] == {'count': 1, 'errors': 0}
+
+
+def test_limits_fail_single_items(core, batch, monkeypatch):
+    monkeypatch.setattr(core, 'IMAGE_BATCH_MAX_FILES', 2)
+    monkeypatch.setattr(core, 'IMAGE_MAX_BYTES', 20000)
+    response = batch({'images': [
+        (io.BytesIO(jpeg_bytes(5)), 'small.jpg'),
+        (io.BytesIO(jpeg_bytes(6, size=(400, 300))), 'large.jpg'),
+        (io.BytesIO(jpeg_bytes(7)), 'extra.jpg')
+    ]})
+    data = {e['data']['filename']: e['data'] for e in events_of(response)[:-1]}
+    assert 'result' in data['small.jpg']
+    assert data['large.jpg']['error'] == 'Image is larger than 20000 bytes'
+    assert data['extra.jpg']['error'] == 'Batch limit of 2 images exceeded'
+
+
+def test_bad_uploads_are_rejected(batch):
+    assert batch({}).status_code == 400
+    events = events_of(batch({'archive': (io.BytesIO(b'plain text'), 'notes.rar')}))
+    assert events[0]['data']['error'] == 'Failed to read archive: Archive must be a zip or tar file'
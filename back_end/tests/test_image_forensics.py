@@ -0,0 +1,78 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import engines
+import image_forensics
+from image_forensics import error_level_analysis, load_working_image, open_image
+
+
+def noise_image(width, height, seed=0):
+    pixels = np.random.default_rng(seed).integers(0, 256, (height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+def encode(image, fmt='JPEG', **params):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    buffer.seek(0)
+    return buffer
+
+
+def test_heatmap_has_one_cell_per_tile():
+    image = noise_image(200, 100)
+    score, tiles = error_level_analysis(image, tile_size=64)
+    assert tiles.shape == (2, 4)
+    assert 0 < score < 1
+    # The global score is the pixel-weighted mean of the tiles
+    heights = np.array([64, 36])[:, None]
+    widths = np.array([64, 64, 64, 8])[None, :]
+    assert score == pytest.approx(float((tiles * heights * widths).sum() / (200 * 100)))
+
+
+def test_flat_image_scores_lower_than_noise():
+    flat_score, _ = error_level_analysis(Image.new('RGB', (128, 128), (120, 130, 140)), tile_size=64)
+    noise_score, _ = error_level_analysis(noise_image(128, 128), tile_size=64)
+    assert flat_score < noise_score
+
+
+def test_working_image_is_bounded():
+    for fmt in ('JPEG', 'PNG'):
+        working = load_working_image(Image.open(encode(noise_image(1000, 800), fmt)), max_pixels=100000)
+        assert working.mode == 'RGB'
+        assert working.size[0] * working.size[1] <= 100000
+
+
+def test_oversized_image_is_rejected_before_decoding(monkeypatch):
+    monkeypatch.setattr(image_forensics, 'IMAGE_MAX_PIXELS', 1000)
+    with pytest.raises(image_forensics.ImageTooLargeError):
+        open_image(encode(noise_image(100, 100)))
+
+
+@pytest.fixture
+def no_hash_index(core, monkeypatch):
+    monkeypatch.setattr(core.image_hash_engine, 'value', None)
+    monkeypatch.setattr(core.image_hash_engine, 'state', engines.READY)
+
+
+def test_analyze_image_route(client, no_hash_index):
+    upload = encode(noise_image(300, 200), quality=85)
+    response = client.post('/api/analyze-image', data={'image': (upload, 'photo.jpg')})
+    assert response.status_code == 200
+    body = response.get_json()
+    heatmap = body['ela_heatmap']
+    assert (heatmap['rows'], heatmap['cols']) == (len(heatmap['values']), len(heatmap['values'][0]))
+    assert heatmap['scale'] == 1.0
+    assert body['forensic_flags']['width'] == 300
+    assert body['verdict'] in ('Original', 'Tampering Detected')
+
+
+def test_analyze_image_route_errors(client, no_hash_index, monkeypatch):
+    assert client.post('/api/analyze-image', data={}).status_code == 400
+    monkeypatch.setattr(image_forensics, 'IMAGE_MAX_PIXELS', 1000)
+    response = client.post('/api/analyze-image', data={'image': (encode(noise_image(100, 100)), 'big.jpg')})
+    assert response.status_code == 413
+    response = client.post('/api/analyze-image', data={'image': (io.BytesIO(b'not an image'), 'x.jpg')})
+    assert response.status_code == 500
@@ -0,0 +1,126 @@
+import io
+import json
+
+import numpy as np
+from PIL import Image
+
+import engines
+import image_hash
+from image_hash import BKTree, ImageHashIndex, format_hash, hamming_distance, phash_image
+
+RESULT = {
+    'verdict': 'Tampering Detected', 'authenticity_score': 41, 'tamper_risk': 45,
+    'ela_heatmap': {'values': [[0.1, 0.2]]}, 'exif_metadata': {'software': 'GIMP'}
+}
+
+
+def photo(seed=0, size=(256, 192)):
+    # Smooth colour waves whose low frequencies differ from seed to seed
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size[1], 0:size[0]] / 64.0
+    pixels = np.zeros((size[1], size[0], 3))
+    for channel in range(3):
+        a, b, c = rng.uniform(-2, 2, 3)
+        pixels[..., channel] = 127 + 120 * np.sin(a * x + b * y + c)
+    return Image.fromarray(pixels.astype(np.uint8))
+
+
+def reopen(image, fmt='JPEG', **params):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **params)
+    buffer.seek(0)
+    return Image.open(buffer)
+
+
+def test_phash_survives_resizing_and_recompression():
+    original = photo(1)
+    value = phash_image(reopen(original, quality=95))
+    assert hamming_distance(value, phash_image(reopen(original.resize((128, 96)), quality=60))) <= 8
+    assert hamming_distance(value, phash_image(reopen(original, 'PNG'))) <= 8
+    assert hamming_distance(value, phash_image(reopen(photo(2)))) > 8
+
+
+def test_bk_tree_radius_query_and_remove():
+    tree = BKTree()
+    for value, item in ((0b0000, 'a'), (0b0001, 'b'), (0b0111, 'c'), (0b1111, 'd')):
+        tree.add(value, item)
+    assert tree.query(0b0000, 1) == [(0, 'a'), (1, 'b')]
+    assert tree.remove(0b0001, 'b')
+    assert not tree.remove(0b0001, 'b')
+    assert tree.query(0b0000, 3) == [(0, 'a'), (3, 'c')]
+    assert len(tree) == 3
+
+
+def test_matches_carry_a_summary_and_no_filename(clock, monkeypatch):
+    monkeypatch.setattr(image_hash, 'time', clock)
+    index = ImageHashIndex(max_distance=4)
+    index.add(0xff00, RESULT, sha256='s1')
+    assert index.lookup(0xff00, sha256='s1') == [{
+        'phash': format_hash(0xff00), 'distance': 0, 'identical': True, 'first_seen': clock.now,
+        'verdict': 'Tampering Detected', 'authenticity_score': 41, 'tamper_risk': 45
+    }]
+    near = index.lookup(0xff01, sha256='s2')
+    assert [(m['distance'], m['identical']) for m in near] == [(1, False)]
+    assert index.lookup(0x00ff) == []
+    # Identical content is stored once
+    assert not index.add(0xff00, RESULT, sha256='s1')
+    assert len(index) == 1
+
+
+def test_least_recently_matched_image_is_evicted():
+    index = ImageHashIndex(max_distance=0, max_entries=2)
+    index.add(1, RESULT, sha256='a')
+    index.add(2, RESULT, sha256='b')
+    index.lookup(1)
+    index.add(3, RESULT, sha256='c')
+    assert index.lookup(2) == []
+    assert [m['phash'] for m in index.lookup(1) + index.lookup(3)] == [format_hash(1), format_hash(3)]
+    assert index.stats()['evictions'] == 1
+
+
+def test_log_holds_only_summaries_and_is_compacted(tmp_path):
+    path = str(tmp_path / 'images.jsonl')
+    index = ImageHashIndex(max_distance=0, path=path, max_entries=2)
+    for value in range(1, 6):
+        index.add(value, RESULT, sha256=f's{value}')
+    with open(path) as f:
+        records = [json.loads(line) for line in f]
+    # Five appends against a bound of two: compacted once the log passed four lines
+    assert index.stats()['compactions'] == 1
+    assert [r['sha256'] for r in records] == ['s4', 's5']
+    assert set(records[0]) == {'phash', 'sha256', 'created_at', 'summary'}
+    assert 'heatmap' not in json.dumps(records)
+
+    reloaded = ImageHashIndex(max_distance=0, path=path, max_entries=2)
+    assert len(reloaded) == 2
+    assert reloaded.lookup(5, sha256='s5')[0]['identical']
+
+
+def test_old_logs_are_trimmed_on_load(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(image_hash, 'time', clock)
+    path = tmp_path / 'images.jsonl'
+    old = {'phash': format_hash(7), 'sha256': 'x', 'filename': 'secret-name.jpg', 'result': RESULT, 'created_at': 5.0}
+    path.write_text(json.dumps(old) + '\n' + json.dumps(old) + '\n{"phash": "torn')
+    index = ImageHashIndex(path=str(path))
+    assert index.lookup(7)[0]['first_seen'] == 5.0
+    assert path.read_text().splitlines() == [json.dumps({
+        'phash': format_hash(7), 'sha256': 'x', 'created_at': 5.0,
+        'summary': {'verdict': 'Tampering Detected', 'authenticity_score': 41, 'tamper_risk': 45}
+    })]
+
+
+def test_route_reports_earlier_uploads_without_filenames(core, client, monkeypatch):
+    monkeypatch.setattr(core.image_hash_engine, 'value', ImageHashIndex())
+    monkeypatch.setattr(core.image_hash_engine, 'state', engines.READY)
+    upload = io.BytesIO()
+    photo(3).save(upload, 'JPEG', quality=90)
+    data = upload.getvalue()
+
+    first = client.post('/api/analyze-image', data={'image': (io.BytesIO(data), 'alice.jpg')}).get_json()
+    assert first['seen_before'] == []
+    second = client.post('/api/analyze-image', data={'image': (io.BytesIO(data), 'bob.jpg')}).get_json()
+    assert [m['identical'] for m in second['seen_before']] == [True]
+    assert second['seen_before'][0]['verdict'] == first['verdict']
+    assert 'alice' not in json.dumps(second)
+    # The index holds no heatmap: this one comes from analyzing the upload again
+    assert second['ela_heatmap'] == first['ela_heatmap']
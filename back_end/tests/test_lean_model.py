@@ -0,0 +1,78 @@
+import json
+import os
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+
+from lean_model import LeanScorer, export_lean_model
+
+BACK_END = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TEXTS = [
+    "Vaccines cause autism in children",
+    "The moon landing was staged in a film studio",
+    "Drinking coffee every day improves memory",
+    "The Great Wall of China is visible from space",
+    "Eating carrots improves night vision",
+    "The unemployment rate fell to 4 percent in 2019",
+    "SHOCKING: doctors hate this one weird trick!!!",
+    "Parliament passed the budget bill on Tuesday"
+]
+PROBES = TEXTS + ["", "!!!", "Coffee coffee COFFEE and the moon", "words nobody trained on"]
+
+
+def fit(**vectorizer_params):
+    vectorizer = TfidfVectorizer(stop_words='english', **vectorizer_params)
+    model = LogisticRegression().fit(vectorizer.fit_transform(TEXTS), [0, 1, 1, 0, 0, 1, 0, 1])
+    return model, vectorizer
+
+
+@pytest.mark.parametrize('params', [{}, {'sublinear_tf': True}, {'binary': True, 'norm': 'l1'}, {'lowercase': False}])
+def test_lean_scorer_matches_scikit_learn(params, tmp_path):
+    model, vectorizer = fit(**params)
+    scorer = LeanScorer.load(export_lean_model(model, vectorizer, str(tmp_path / 'lean')))
+    expected = model.predict_proba(vectorizer.transform(PROBES))
+    np.testing.assert_allclose(scorer.predict_proba(scorer.transform(PROBES)), expected, atol=1e-12)
+    # Columns are in sorted-vocabulary order; the row norms are the same
+    np.testing.assert_allclose(
+        np.sort(scorer.transform(PROBES).toarray(), axis=1),
+        np.sort(vectorizer.transform(PROBES).toarray(), axis=1),
+        atol=1e-12
+    )
+
+
+def test_unsupported_vectorizers_are_refused(tmp_path):
+    model, vectorizer = fit(ngram_range=(1, 2))
+    with pytest.raises(ValueError):
+        export_lean_model(model, vectorizer, str(tmp_path / 'lean'))
+
+
+def test_stale_artifact_is_refused(tmp_path):
+    model, vectorizer = fit()
+    sources = [str(tmp_path / 'model.pkl'), str(tmp_path / 'vectorizer.pkl')]
+    joblib.dump(model, sources[0])
+    joblib.dump(vectorizer, sources[1])
+    out = export_lean_model(model, vectorizer, str(tmp_path / 'lean'), source_paths=sources)
+    LeanScorer.load(out, source_paths=sources)
+    # Retrained: same vocabulary, new weights
+    model.intercept_ = model.intercept_ + 1.0
+    joblib.dump(model, sources[0])
+    with pytest.raises(ValueError):
+        LeanScorer.load(out, source_paths=sources)
+
+
+def test_shipped_artifact_matches_the_shipped_pickles():
+    lean_dir = os.path.join(BACK_END, 'model_lean')
+    sources = [os.path.join(BACK_END, 'model.pkl'), os.path.join(BACK_END, 'vectorizer.pkl')]
+    scorer = LeanScorer.load(lean_dir, source_paths=sources)
+    with open(os.path.join(lean_dir, 'meta.json')) as f:
+        assert set(json.load(f)['source_sha256']) == {'model.pkl', 'vectorizer.pkl'}
+    model, vectorizer = joblib.load(sources[0]), joblib.load(sources[1])
+    np.testing.assert_allclose(
+        scorer.predict_proba(scorer.transform(PROBES)),
+        model.predict_proba(vectorizer.transform(PROBES)),
+        atol=1e-12
+    )
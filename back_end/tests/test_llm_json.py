@@ -0,0 +1,85 @@
+import pytest
+
+from llm_json import InvalidLLMResponse, JsonObjectScanner, parse_verdict
+
+
+def test_strict_json_needs_no_repair():
+    result, repairs = parse_verdict('{"verdict": "FALSE", "confidence": "90%", "explanation": "No."}')
+    assert result['verdict'] == 'FALSE'
+    assert result['confidence'] == '90%'
+    assert result['confidence_score'] == 90.0
+    assert result['explanation'] == 'No.'
+    assert result['sources'] == []
+    assert repairs == []
+    assert 'truncated' not in result
+
+
+def test_object_inside_code_fence_and_prose():
+    content = 'Here is my answer:\n```json\n{"verdict": "TRUE", "confidence": 85}\n```\nHope it helps.'
+    result, repairs = parse_verdict(content)
+    assert result['verdict'] == 'TRUE'
+    assert result['confidence_score'] == 85.0
+    assert repairs == []
+
+
+def test_trailing_commas():
+    result, repairs = parse_verdict('{"verdict": "MIXED", "confidence": "60%", "sources": ["a", "b",],}')
+    assert result['verdict'] == 'MIXED'
+    assert result['sources'] == ['a', 'b']
+    assert repairs == ['trailing_comma']
+
+
+def test_single_and_curly_quotes():
+    result, repairs = parse_verdict("{'verdict': 'FALSE', 'confidence': '75%', 'explanation': 'It isn't so'}")
+    assert result['explanation'] == "It isn't so"
+    assert 'quotes' in repairs
+
+    result, repairs = parse_verdict('{“verdict”: “TRUE”, “confidence”: “80%”}')
+    assert result['verdict'] == 'TRUE'
+    assert 'quotes' in repairs
+
+
+def test_bare_words_and_python_literals():
+    result, repairs = parse_verdict('{verdict: FALSE, confidence: 90%, sources: None}')
+    assert result['verdict'] == 'FALSE'
+    assert result['confidence_score'] == 90.0
+    assert result['sources'] == []
+    assert repairs == ['bare_word', 'python_literal']
+
+
+def test_verdict_aliases_and_fractional_confidence():
+    result, _ = parse_verdict('{"Verdict": "Mostly True", "Confidence": 0.72}')
+    assert result['verdict'] == 'TRUE'
+    assert result['confidence_score'] == 72.0
+
+
+def test_truncated_reply_is_closed_and_flagged():
+    result, repairs = parse_verdict('{"verdict": "FALSE", "confidence": "80%", "explanation": "Truncated')
+    assert result['verdict'] == 'FALSE'
+    assert result['explanation'] == 'Truncated'
+    assert result['truncated'] is True
+    assert 'truncated' in repairs
+
+
+def test_scanner_yields_objects_across_chunks():
+    scanner = JsonObjectScanner()
+    assert scanner.feed('noise {"a": "}", ') == []
+    assert scanner.feed('"b": [1, 2]} tail') == ['{"a": "}", "b": [1, 2]}']
+    assert scanner.pending() is None
+
+
+@pytest.mark.parametrize('content', [
+    '',
+    'The claim is mostly false.',
+    '{"verdict": "PROBABLY", "confidence": "90%"}',
+    '{"verdict": "TRUE"}'
+])
+def test_unrecoverable_replies_raise(content):
+    with pytest.raises(InvalidLLMResponse):
+        parse_verdict(content)
+
+
+def test_problems_list_every_invalid_field():
+    with pytest.raises(InvalidLLMResponse) as excinfo:
+        parse_verdict('{"verdict": "maybe", "confidence": "high"}')
+    assert len(excinfo.value.problems) == 2
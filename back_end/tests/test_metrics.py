@@ -0,0 +1,84 @@
+import metrics
+from metrics import Registry
+
+
+def sample(text, series):
+    # Value of one rendered series, e.g. 'name{label="x"}', or 0 if absent
+    for line in text.splitlines():
+        if line.startswith(series + ' '):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_registry_renders_the_prometheus_text_format():
+    registry = Registry()
+    requests = registry.counter('demo_requests_total', 'Requests.', ['route'])
+    registry.gauge('demo_in_flight', 'In flight.').set(3)
+    latency = registry.histogram('demo_seconds', 'Latency.', buckets=(0.1, 1.0))
+    requests.inc(route='/a"b')
+    requests.inc(2, route='/a"b')
+    for value in (0.05, 0.5, 5.0):
+        latency.observe(value)
+
+    assert registry.render().splitlines() == [
+        '# HELP demo_requests_total Requests.',
+        '# TYPE demo_requests_total counter',
+        'demo_requests_total{route="/a\\"b"} 3',
+        '# HELP demo_in_flight In flight.',
+        '# TYPE demo_in_flight gauge',
+        'demo_in_flight 3',
+        '# HELP demo_seconds Latency.',
+        '# TYPE demo_seconds histogram',
+        'demo_seconds_bucket{le="0.1"} 1',
+        'demo_seconds_bucket{le="1"} 2',
+        'demo_seconds_bucket{le="+Inf"} 3',
+        'demo_seconds_sum 5.55',
+        'demo_seconds_count 3'
+    ]
+
+
+def test_failing_collector_does_not_break_the_scrape():
+    registry = Registry()
+    registry.counter('demo_total', 'Demo.').inc()
+    registry.add_collector(lambda: 1 / 0)
+    assert 'demo_total 1' in registry.render()
+
+
+def test_stages_are_timed_into_the_current_request():
+    timings = metrics.start_timings()
+    with metrics.stage('demo_stage'):
+        pass
+    metrics.observe_stage('demo_stage', 0.25)
+    assert set(timings) == {'demo_stage'}
+    assert timings['demo_stage'] >= 0.25
+    assert metrics.server_timing_header({'llm': 0.0125}, total=0.5) == 'llm;dur=12.50, total;dur=500.00'
+
+
+def test_requests_show_up_in_metrics(client):
+    before = client.get('/metrics').get_data(as_text=True)
+    verify = client.post('/api/verify', json={'text': 'The moon is made of cheese'})
+    assert verify.status_code == 200
+    # Request metrics are recorded once the response is closed
+    verify.close()
+    response = client.get('/metrics')
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    after = response.get_data(as_text=True)
+
+    def delta(series):
+        return sample(after, series) - sample(before, series)
+
+    assert delta('truthlense_http_requests_total{route="/api/verify",status="200"}') == 1
+    assert delta('truthlense_upstream_requests_total{outcome="ok"}') == 1
+    assert delta('truthlense_stage_duration_seconds_count{stage="llm"}') == 1
+    assert 'truthlense_cache_lookups_total{cache="verdict",result="miss"}' in after
+
+
+def test_server_timing_header_and_disabled_metrics(core, client, monkeypatch):
+    assert 'Server-Timing' not in client.post('/api/verify', json={'text': 'Vaccines cause autism'}).headers
+    monkeypatch.setattr(core, 'SERVER_TIMING_ENABLED', True)
+    header = client.post('/api/verify', json={'text': 'The Great Wall is visible from space'}).headers['Server-Timing']
+    names = [part.split(';')[0] for part in header.split(', ')]
+    assert 'llm' in names
+    assert names[-1] == 'total'
+    monkeypatch.setattr(core, 'METRICS_ENABLED', False)
+    assert client.get('/metrics').status_code == 404
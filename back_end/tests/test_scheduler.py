@@ -0,0 +1,175 @@
+import asyncio
+from collections import Counter
+
+import pytest
+
+import scheduler
+from scheduler import BATCH, INTERACTIVE, LLMScheduler, RateLimitedError, api_key_digests, client_id
+
+
+def grant_order(llm_scheduler, callers):
+    # Queues every (client, priority) behind one held slot, then lets them through one at a time
+    order = []
+
+    async def call(client, priority):
+        async with llm_scheduler.slot_async(client, priority):
+            order.append((client, priority))
+
+    async def run():
+        await llm_scheduler.acquire_async('holder', INTERACTIVE)
+        tasks = []
+        for client, priority in callers:
+            tasks.append(asyncio.ensure_future(call(client, priority)))
+            await asyncio.sleep(0)
+        assert llm_scheduler.stats()['queued'] == {
+            INTERACTIVE: sum(p == INTERACTIVE for _, p in callers),
+            BATCH: sum(p == BATCH for _, p in callers)
+        }
+        llm_scheduler.release()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+    return order
+
+
+def test_weighted_share_while_both_classes_are_backlogged():
+    llm_scheduler = LLMScheduler(capacity=1, weights={INTERACTIVE: 4, BATCH: 1})
+    callers = [('i', INTERACTIVE)] * 20 + [('b', BATCH)] * 20
+    order = grant_order(llm_scheduler, callers)
+    assert Counter(p for _, p in order[:20]) == {INTERACTIVE: 16, BATCH: 4}
+    # Batch is slowed down, never starved
+    assert ('b', BATCH) in order[:5]
+
+
+def test_clients_take_turns_within_a_class():
+    llm_scheduler = LLMScheduler(capacity=1)
+    callers = [('a', INTERACTIVE)] * 3 + [('b', INTERACTIVE), ('c', INTERACTIVE)]
+    order = grant_order(llm_scheduler, callers)
+    assert [client for client, _ in order] == ['a', 'b', 'c', 'a', 'a']
+
+
+def test_token_bucket_limits_each_client(clock, monkeypatch):
+    monkeypatch.setattr(scheduler, 'time', clock)
+    llm_scheduler = LLMScheduler(capacity=10, rate=0.5, burst=2)
+    for _ in range(2):
+        with llm_scheduler.slot('a', INTERACTIVE):
+            pass
+    with pytest.raises(RateLimitedError) as excinfo:
+        with llm_scheduler.slot('a', INTERACTIVE):
+            pass
+    assert excinfo.value.reason == 'rate'
+    assert excinfo.value.retry_after == 2
+    # Other clients have buckets of their own
+    with llm_scheduler.slot('b', INTERACTIVE):
+        pass
+    clock.advance(2)
+    with llm_scheduler.slot('a', INTERACTIVE):
+        pass
+    stats = llm_scheduler.stats()
+    assert stats['rejected_rate'] == 1
+    assert stats['granted'] == 4
+    assert stats['active'] == 0
+
+
+def test_full_queue_rejects_and_refunds_the_token():
+    llm_scheduler = LLMScheduler(capacity=1, max_queue={INTERACTIVE: 1, BATCH: 1}, rate=1.0, burst=5)
+    llm_scheduler.acquire('holder', INTERACTIVE)
+
+    async def run():
+        waiting = asyncio.ensure_future(llm_scheduler.acquire_async('a', INTERACTIVE))
+        await asyncio.sleep(0)
+        with pytest.raises(RateLimitedError) as excinfo:
+            await llm_scheduler.acquire_async('b', INTERACTIVE)
+        assert excinfo.value.reason == 'queue'
+        # The batch class has its own queue
+        queued_batch = asyncio.ensure_future(llm_scheduler.acquire_async('b', BATCH))
+        await asyncio.sleep(0)
+        llm_scheduler.release()
+        await waiting
+        llm_scheduler.release()
+        await queued_batch
+        llm_scheduler.release()
+
+    asyncio.run(run())
+    # Only the admitted batch call cost 'b' a token
+    assert llm_scheduler._buckets['b'].tokens == pytest.approx(4.0, abs=0.1)
+    assert llm_scheduler.stats()['rejected_queue'] == 1
+
+
+def test_waiting_too_long_times_out():
+    llm_scheduler = LLMScheduler(capacity=1, queue_timeout=0.01)
+    llm_scheduler.acquire('holder', INTERACTIVE)
+    with pytest.raises(RateLimitedError) as excinfo:
+        llm_scheduler.acquire('a', INTERACTIVE)
+    assert excinfo.value.reason == 'timeout'
+    stats = llm_scheduler.stats()
+    assert stats['queued'] == {INTERACTIVE: 0, BATCH: 0}
+    assert stats['active'] == 1
+
+
+def test_client_id_only_trusts_known_api_keys():
+    known = api_key_digests(['secret'])
+    assert client_id('secret', '10.0.0.1', known_keys=known).startswith('key:')
+    assert 'secret' not in client_id('secret', known_keys=known)
+    # A made-up key is ignored, so it cannot buy a fresh bucket
+    assert client_id('made-up', '10.0.0.1', known_keys=known) == 'ip:10.0.0.1'
+    assert client_id('secret', '10.0.0.1') == 'ip:10.0.0.1'
+
+
+def test_client_id_uses_the_hop_appended_by_the_trusted_proxy():
+    # The client wrote 198.51.100.1; the proxy appended the address it really saw
+    assert client_id(None, '10.0.0.1', '198.51.100.1, 203.0.113.7') == 'ip:203.0.113.7'
+    assert client_id(None, '10.0.0.2', '198.51.100.1, 203.0.113.7, 10.0.0.1', proxy_hops=2) == 'ip:203.0.113.7'
+    assert client_id(None, '10.0.0.1', '203.0.113.7', proxy_hops=2) == 'ip:203.0.113.7'
+    assert client_id(None, '10.0.0.1', ' ') == 'ip:10.0.0.1'
+
+
+def test_spoofed_forwarded_for_shares_one_bucket(core, client, monkeypatch):
+    monkeypatch.setattr(core, 'TRUST_PROXY_HEADERS', True)
+    monkeypatch.setattr(core, 'llm_scheduler', LLMScheduler(rate=0.001, burst=1))
+    statuses = [
+        client.post('/api/verify', json={'text': f'Claim number {i}'}, headers={
+            'X-Forwarded-For': f'198.51.100.{i}, 203.0.113.7', 'X-API-Key': f'random-{i}'
+        }).status_code
+        for i in range(3)
+    ]
+    assert statuses == [200, 429, 429]
+
+
+def post_concurrently(core, requests):
+    # (status, body) per (text, api_key), all sent at once from their own threads
+    import threading
+    results = [None] * len(requests)
+
+    def post(i, text, api_key):
+        response = core.app.test_client().post('/api/verify', json={'text': text}, headers={'X-API-Key': api_key})
+        results[i] = (response.status_code, response.get_json())
+
+    threads = [threading.Thread(target=post, args=(i, text, key)) for i, (text, key) in enumerate(requests)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_identical_concurrent_claims_share_one_call_and_hold_no_slots(core, llm, monkeypatch):
+    # One slot and one queue place: coalesced callers that each took a slot got 429s here
+    monkeypatch.setattr(core, 'llm_scheduler', LLMScheduler(capacity=1, max_queue={INTERACTIVE: 1, BATCH: 1}))
+    llm.delay = 0.3
+    results = post_concurrently(core, [('The moon landing was staged in a film studio', 'k')] * 10)
+    assert [status for status, _ in results] == [200] * 10
+    assert llm.calls == 1
+    assert core.llm_flight.stats()['coalesced'] == 9
+    assert core.llm_scheduler.stats()['granted'] == 1
+
+
+def test_coalesced_caller_is_still_rate_limited_as_itself(core, client, llm, monkeypatch):
+    monkeypatch.setattr(core, 'LLM_CLIENT_API_KEYS', api_key_digests(['a', 'b', 'c']))
+    monkeypatch.setattr(core, 'llm_scheduler', LLMScheduler(rate=0.001, burst=1))
+    assert client.post('/api/verify', json={'text': 'Coffee improves memory'}, headers={'X-API-Key': 'b'}).status_code == 200
+    llm.delay = 0.3
+    results = post_concurrently(core, [('Vaccines cause autism in children', key) for key in ('a', 'b', 'c')])
+    assert [status for status, _ in results] == [200, 429, 200]
+    assert results[1][1]['rate_limited'] is True
+    assert llm.calls == 2
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from singleflight import AsyncSingleFlight, SingleFlight
+
+
+def run_together(n, target):
+    threads = [threading.Thread(target=target) for _ in range(n)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_callers_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls, results = [], []
+
+    def work():
+        calls.append(1)
+        release.wait(5)
+        return {'verdict': 'FALSE'}
+
+    def caller():
+        results.append(flight.do('k', work))
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+    followers = threading.Thread(target=run_together, args=(5, caller))
+    followers.start()
+    while flight.stats()['coalesced'] < 5:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    followers.join()
+
+    assert len(calls) == 1
+    assert results == [{'verdict': 'FALSE'}] * 6
+    assert flight.stats() == {'executions': 1, 'coalesced': 5, 'in_flight': 0}
+
+
+def test_waiters_see_the_leaders_error():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def work():
+        release.wait(5)
+        raise RuntimeError('upstream down')
+
+    def caller():
+        try:
+            flight.do('k', work)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=caller)
+    leader.start()
+    while flight.in_flight() == 0:
+        time.sleep(0.001)
+    follower = threading.Thread(target=caller)
+    follower.start()
+    while flight.stats()['coalesced'] < 1:
+        time.sleep(0.001)
+    release.set()
+    leader.join()
+    follower.join()
+
+    assert errors == ['upstream down', 'upstream down']
+    # A failed call is not remembered; the next caller runs again
+    assert flight.do('k', lambda: 'ok') == 'ok'
+    assert flight.stats()['executions'] == 2
+
+
+def test_async_waiter_cancellation_does_not_cancel_the_call():
+    async def main():
+        flight = AsyncSingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return 'verdict'
+
+        leader = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        waiter = asyncio.ensure_future(flight.do('k', work))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        release.set()
+        assert await leader == 'verdict'
+        return flight.stats()
+
+    assert asyncio.run(main()) == {'executions': 1, 'coalesced': 1, 'in_flight': 0}
+
+
+def test_identical_claims_make_one_upstream_call(core, client, llm):
+    llm.delay = 0.2
+    statuses = []
+    misses = core.verdict_cache.stats()['misses']
+
+    def post():
+        statuses.append(client.post('/api/verify', json={'text': 'The moon is made of cheese'}).status_code)
+
+    run_together(6, post)
+    assert statuses == [200] * 6
+    assert llm.calls == 1
+    assert core.llm_flight.stats()['coalesced'] == 5
+    # Every request missed the cache once; the leader's second look is not counted
+    assert core.verdict_cache.stats()['misses'] - misses == 6
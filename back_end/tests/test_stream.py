@@ -0,0 +1,55 @@
+import json
+
+from upstream import CircuitBreaker
+
+CLAIM = {'text': 'The Great Wall of China is visible from space'}
+
+
+def ndjson_events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_ndjson_events_arrive_local_first(client, llm):
+    response = client.post('/api/verify/stream', json=CLAIM)
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = ndjson_events(response)
+    assert [e['event'] for e in events] == ['ml_model', 'heuristics', 'llm', 'meta_analysis', 'result', 'done']
+    data = {e['event']: e['data'] for e in events}
+    assert data['llm']['verdict'] == 'FALSE'
+    assert data['result']['meta_analysis'] == data['meta_analysis']
+    assert data['result']['ml_model'] == data['ml_model']
+    assert llm.calls == 1
+
+
+def test_sse_format(client):
+    response = client.post('/api/verify/stream?format=sse', json=CLAIM)
+    assert response.mimetype == 'text/event-stream'
+    blocks = response.get_data(as_text=True).split('\n\n')
+    assert blocks[-1] == ''
+    names = [block.split('\n')[0] for block in blocks[:-1]]
+    assert names == ['event: ' + e for e in ('ml_model', 'heuristics', 'llm', 'meta_analysis', 'result', 'done')]
+    result = blocks[4].split('\n')[1]
+    assert result.startswith('data: ')
+    assert json.loads(result[len('data: '):])['verdict'] == 'FALSE'
+
+
+def test_unparseable_answer_ends_with_an_error_event(client, llm):
+    llm.content = 'No JSON here, sorry.'
+    events = ndjson_events(client.post('/api/verify/stream', json=CLAIM))
+    assert [e['event'] for e in events] == ['ml_model', 'heuristics', 'error', 'done']
+    assert events[2]['data'] == {'error': 'Failed to parse AI response'}
+
+
+def test_open_circuit_streams_the_local_result(core, client, llm, monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record_failure()
+    monkeypatch.setattr(core.upstream, 'breaker', breaker)
+    events = ndjson_events(client.post('/api/verify/stream', json=CLAIM))
+    assert [e['event'] for e in events] == ['ml_model', 'heuristics', 'result', 'done']
+    assert events[2]['data']['degraded'] is True
+    assert llm.calls == 0
+
+
+def test_missing_text_is_rejected(client):
+    assert client.post('/api/verify/stream', json={'claim': 'x'}).status_code == 400
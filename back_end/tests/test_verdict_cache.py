@@ -0,0 +1,68 @@
+import pytest
+
+import verdict_cache
+from verdict_cache import VerdictCache, claim_key, normalize_claim
+
+
+@pytest.fixture
+def cache(clock, monkeypatch):
+    monkeypatch.setattr(verdict_cache, 'time', clock)
+    return VerdictCache(max_entries=3, ttl_seconds=60)
+
+
+def test_claims_differing_in_case_and_punctuation_share_a_key():
+    assert normalize_claim('5G causes COVID!!') == '5g causes covid'
+    assert claim_key('5G   causes COVID!!') == claim_key('5g causes covid')
+
+
+def test_entry_expires_after_ttl(cache, clock):
+    cache.set('The moon is made of cheese', {'verdict': 'FALSE'})
+    clock.advance(59)
+    assert cache.get('the moon is made of cheese') == {'verdict': 'FALSE'}
+    clock.advance(1)
+    assert cache.get('The moon is made of cheese') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expired']) == (1, 1, 1)
+    assert stats['size'] == 0
+
+
+def test_per_entry_ttl_overrides_the_default(cache, clock):
+    cache.set('Claim A', {'verdict': 'TRUE'}, ttl_seconds=5)
+    clock.advance(5)
+    assert cache.get('Claim A') is None
+
+
+def test_returned_values_are_copies(cache):
+    cache.set('Claim A', {'verdict': 'TRUE', 'sources': []})
+    cache.get('Claim A')['sources'].append('mutated')
+    assert cache.get('Claim A')['sources'] == []
+
+
+def test_least_recently_used_entry_is_evicted(cache):
+    for name in ('A', 'B', 'C'):
+        cache.set(f'Claim {name}', {'verdict': name})
+    cache.get('Claim A')
+    cache.set('Claim D', {'verdict': 'D'})
+    assert cache.get('Claim B') is None
+    assert cache.get('Claim A') == {'verdict': 'A'}
+    assert cache.stats()['evictions'] == 1
+
+
+def test_second_look_does_not_count_in_the_hit_rate(cache):
+    key = claim_key('Claim A')
+    assert cache.get_by_key(key, record_stats=False) is None
+    cache.set_by_key(key, {'verdict': 'TRUE'})
+    assert cache.get_by_key(key, record_stats=False) == {'verdict': 'TRUE'}
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['hit_rate']) == (0, 0, 0.0)
+
+
+def test_disk_tier_survives_restart_and_expires(tmp_path, clock, monkeypatch):
+    monkeypatch.setattr(verdict_cache, 'time', clock)
+    path = str(tmp_path / 'verdicts.db')
+    VerdictCache(ttl_seconds=60, db_path=path).set('Claim A', {'verdict': 'TRUE'})
+    reopened = VerdictCache(ttl_seconds=60, db_path=path)
+    assert reopened.get('Claim A') == {'verdict': 'TRUE'}
+    assert reopened.stats()['disk_hits'] == 1
+    clock.advance(60)
+    assert VerdictCache(ttl_seconds=60, db_path=path).get('Claim A') is None
@@ -1,25 +1,40 @@
 import os
+import json
+import time
+import sqlite3
+import shutil
+import tempfile
+import argparse
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 import joblib
-from sklearn.model_selection import train_test_split
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics import classification_report
+from sklearn.model_selection import train_test_split, GridSearchCV, StratifiedKFold
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer, TfidfTransformer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
+from sklearn.isotonic import IsotonicRegression
+from sklearn.metrics import classification_report, accuracy_score, log_loss
+from sklearn.pipeline import Pipeline, make_pipeline
+from sklearn.compose import ColumnTransformer
+from sklearn.preprocessing import OneHotEncoder
 from dotenv import load_dotenv
 from perplexity import Perplexity
+from lean_model import export_lean_model, file_sha256
+from ensemble import (
+    ENSEMBLE_FORMAT_VERSION, CalibratedEnsemble, feature_matrix, llm_evidence, logit, verdict_confidence
+)
+from heuristics import HeuristicEngine
+from verdict_cache import claim_key
 
 # Load environment variables
 load_dotenv()
 api_key = os.getenv('PERPLEXITY_API_KEY')
-client = Perplexity(api_key=api_key)
 
-# Load dataset
-df = pd.read_csv('Truth_Seeker_Model_Dataset.csv')
-# Filter NA if needed
-df = df.dropna(subset=[
+DATASET_PATH = 'Truth_Seeker_Model_Dataset.csv'
+REQUIRED_COLUMNS = [
     'author', 'statement', 'target', 'BinaryNumTarget',
     'manual_keywords', 'tweet', '5_label_majority_answer', '3_label_majority_answer'
-])
+]
 
 # Features and label
 feature_columns = [
@@ -28,29 +43,364 @@ feature_columns = [
     'manual_keywords',  # Text/Keywords
     'tweet'             # Tweet Text
 ]
-X_text = df['tweet'].astype(str)
-y = df['BinaryNumTarget'].astype(int)  # 1: True/Real, 0: Fake
 
-# Vectorize tweet text (you can concatenate statement and keywords if preferred)
-vectorizer = TfidfVectorizer(stop_words='english', max_features=4000)
-X = vectorizer.fit_transform(X_text)
 
-# Model training
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
-clf = LogisticRegression(max_iter=1000)
-clf.fit(X_train, y_train)
+def train_full(args):
+    # Load dataset
+    df = pd.read_csv(args.data)
+    # Filter NA if needed
+    df = df.dropna(subset=REQUIRED_COLUMNS)
+
+    X_text = df['tweet'].astype(str)
+    y = df['BinaryNumTarget'].astype(int)  # 1: True/Real, 0: Fake
+
+    # Vectorize tweet text (you can concatenate statement and keywords if preferred)
+    vectorizer = TfidfVectorizer(stop_words='english', max_features=4000)
+    X = vectorizer.fit_transform(X_text)
+
+    # Model training
+    X_train, X_test, y_train, y_test, _, text_test = train_test_split(X, y, X_text, test_size=0.2, random_state=42)
+    clf = LogisticRegression(max_iter=1000)
+    clf.fit(X_train, y_train)
+
+    # Evaluation
+    y_pred = clf.predict(X_test)
+    print(classification_report(y_test, y_pred))
+
+    # Save the model and vectorizer
+    joblib.dump(clf, args.model_out)
+    joblib.dump(vectorizer, args.vectorizer_out)
+    print("Model and vectorizer saved to disk.")
+
+    # Keep the lean NumPy artifact in sync with the pickles
+    if args.lean_out:
+        export_lean_model(clf, vectorizer, args.lean_out, source_paths=[args.model_out, args.vectorizer_out])
+        print(f"Lean model exported to {args.lean_out}/.")
+
+    if args.ensemble_out:
+        fit_ensemble(clf, X_test, y_test.to_numpy(), text_test.to_numpy(), args)
+    return df
+
+
+# --- Calibrated ensemble ---
+# Fits the combined score used by app.py (see ensemble.py) on the held-out 20%: one
+# half fits the probability calibration and the combination weights, the other half
+# measures them. LLM verdicts for the training claims are optional (--llm-verdicts,
+# e.g. a history.db filled by running the dataset through /api/verify/batch); without
+# them the LLM weight is 0.0 and the file is marked llm_weight_fitted=false, which
+# app.py does not serve: it keeps the legacy combined score rather than drop the LLM.
+
+MIN_LLM_ROWS = 50
+
+
+def load_llm_verdicts(path):
+    # claim_key -> (verdict, confidence 0-100) from a verification history DB or JSONL.
+    # Only answers that came from the LLM count: degraded fallbacks and local-only answers
+    # carry the local model's confidence (and no meta_analysis, hence no combined_score).
+    verdicts = {}
+    if os.path.splitext(path)[1].lower() in ('.db', '.sqlite', '.sqlite3'):
+        db = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            rows = db.execute(
+                "SELECT claim_key, verdict, confidence FROM verifications"
+                " WHERE verdict IS NOT NULL AND degraded = 0 AND combined_score IS NOT NULL ORDER BY id"
+            )
+            for key, verdict, confidence in rows:
+                verdicts[key] = (verdict, np.nan if confidence is None else float(confidence))
+        finally:
+            db.close()
+        return verdicts
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            text = record.get('claim', record.get('text'))
+            if text is None or not record.get('verdict') or record.get('degraded'):
+                continue
+            if 'ml_model' in record and 'meta_analysis' not in record:
+                # A dumped local-only answer
+                continue
+            verdicts[claim_key(text)] = (str(record['verdict']).upper(), verdict_confidence(record))
+    return verdicts
+
+
+def calibration_report(y, p, bins=10):
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    # Expected calibration error: |accuracy - confidence| per probability bin, weighted by size
+    which = np.minimum((p * bins).astype(int), bins - 1)
+    ece = sum(
+        abs(y[which == b].mean() - p[which == b].mean()) * (which == b).mean()
+        for b in range(bins) if (which == b).any()
+    )
+    return {
+        'brier': round(float(np.mean((p - y) ** 2)), 4),
+        'log_loss': round(float(log_loss(y, p, labels=[0, 1])), 4),
+        'ece': round(float(ece), 4),
+        'accuracy': round(float(np.mean((p >= 0.5) == y)), 4)
+    }
+
+
+def fit_ensemble(clf, X_held, y_held, texts_held, args):
+    prob_real = np.asarray(clf.predict_proba(X_held), dtype=np.float64)[:, 1]
+    engine = HeuristicEngine.from_file(args.phrases)
+    risk = np.array([h['heuristic_risk_bonus'] for h in engine.extract_batch(texts_held)], dtype=np.float64)
+    verdicts = np.full(len(texts_held), '', dtype=object)
+    confidence = np.full(len(texts_held), np.nan)
+    if args.llm_verdicts:
+        known = load_llm_verdicts(args.llm_verdicts)
+        for i, text in enumerate(texts_held):
+            verdicts[i], confidence[i] = known.get(claim_key(text), ('', np.nan))
+    has_llm = verdicts != ''
+
+    fit_rows, eval_rows = train_test_split(
+        np.arange(len(y_held)), test_size=0.5, random_state=42, stratify=y_held
+    )
+    y_fit = y_held[fit_rows]
+
+    if args.calibration == 'isotonic':
+        iso = IsotonicRegression(out_of_bounds='clip', y_min=1e-4, y_max=1 - 1e-4)
+        iso.fit(prob_real[fit_rows], y_fit)
+        calibration = {'method': 'isotonic', 'x': iso.X_thresholds_.tolist(), 'y': iso.y_thresholds_.tolist()}
+    else:
+        platt = LogisticRegression(C=1e6, max_iter=1000)
+        platt.fit(logit(prob_real[fit_rows]).reshape(-1, 1), y_fit)
+        calibration = {'method': 'platt', 'a': float(platt.coef_[0][0]), 'b': float(platt.intercept_[0])}
+    calibrate = CalibratedEnsemble({
+        'calibration': calibration,
+        'weights': {'intercept': 0.0, 'ml_logit': 0.0, 'heuristic_risk': 0.0, 'llm_evidence': 0.0}
+    }).calibrate
+    calibrated = calibrate(prob_real)
+
+    # Combination weights over the same features ensemble.py builds at serving time
+    features = feature_matrix(logit(calibrated), risk, llm_evidence(verdicts, confidence))
+    llm_fitted = int(has_llm[fit_rows].sum()) >= MIN_LLM_ROWS
+    combiner = LogisticRegression(max_iter=1000)
+    if llm_fitted:
+        combiner.fit(features[fit_rows], y_fit)
+        weights = combiner.coef_[0]
+    else:
+        # The other weights were fitted without LLM evidence; adding it on top at any
+        # fixed weight would leave the combined score uncalibrated
+        combiner.fit(features[fit_rows][:, :2], y_fit)
+        weights = np.append(combiner.coef_[0], 0.0)
+    params = {
+        'format_version': ENSEMBLE_FORMAT_VERSION,
+        'calibration': calibration,
+        'weights': {
+            'intercept': float(combiner.intercept_[0]),
+            'ml_logit': float(weights[0]),
+            'heuristic_risk': float(weights[1]),
+            'llm_evidence': float(weights[2])
+        },
+        'llm_weight_fitted': llm_fitted,
+        'rows': {
+            'fit': int(len(fit_rows)),
+            'evaluation': int(len(eval_rows)),
+            'with_llm_verdict': int(has_llm.sum())
+        },
+        # Fingerprints of the model this was fitted for; app.py ignores a stale ensemble
+        'source_sha256': {
+            os.path.basename(p): file_sha256(p) for p in (args.model_out, args.vectorizer_out)
+        }
+    }
+
+    ensemble = CalibratedEnsemble(params)
+    combined = ensemble.probability_real(prob_real, risk, verdicts, confidence)
+    y_eval = y_held[eval_rows]
+    params['evaluation'] = {
+        'ml_raw': calibration_report(y_eval, prob_real[eval_rows]),
+        'ml_calibrated': calibration_report(y_eval, calibrated[eval_rows]),
+        'ensemble': calibration_report(y_eval, combined[eval_rows])
+    }
+    with open(args.ensemble_out, 'w') as f:
+        json.dump(params, f, indent=2)
+    for name, report in params['evaluation'].items():
+        print(f"  {name:<14} brier={report['brier']} log_loss={report['log_loss']} "
+              f"ece={report['ece']} accuracy={report['accuracy']}")
+    print(f"Calibrated ensemble ({args.calibration}) saved to {args.ensemble_out}"
+          f"{'' if llm_fitted else ' (LLM weight not fitted: app.py keeps the legacy combined score; pass --llm-verdicts)'}.")
+    return params
+
+
+# --- Streaming training for corpora larger than RAM ---
+# Text is hashed with a stateless HashingVectorizer, so no vocabulary is held in
+# memory. Pass 1 streams the CSV to count document frequencies for the IDF weights;
+# pass 2 (repeated per epoch) streams it again and trains an SGD logistic regression
+# with partial_fit. Every 5th row is held out for evaluation, matching test_size=0.2.
 
-# Evaluation
-y_pred = clf.predict(X_test)
-print(classification_report(y_test, y_pred))
+def iter_chunks(path, chunk_size):
+    reader = pd.read_csv(path, usecols=REQUIRED_COLUMNS, chunksize=chunk_size)
+    row_offset = 0
+    for chunk in reader:
+        positions = np.arange(row_offset, row_offset + len(chunk))
+        row_offset += len(chunk)
+        keep = chunk.notna().all(axis=1).to_numpy()
+        yield (
+            chunk['tweet'].astype(str).to_numpy()[keep],
+            chunk['BinaryNumTarget'].to_numpy()[keep].astype(int),
+            positions[keep] % 5 == 0
+        )
+
+
+def train_stream(args):
+    hasher = HashingVectorizer(
+        stop_words='english',
+        n_features=args.n_features,
+        alternate_sign=False,
+        norm=None
+    )
+
+    # Pass 1: document frequencies over the training rows
+    doc_freq = np.zeros(args.n_features, dtype=np.int64)
+    n_docs = 0
+    for texts, _, is_test in iter_chunks(args.data, args.chunk_size):
+        counts = hasher.transform(texts[~is_test])
+        doc_freq += np.bincount(counts.indices, minlength=args.n_features)
+        n_docs += counts.shape[0]
+    if n_docs == 0:
+        raise SystemExit(f"No usable training rows found in {args.data}")
+    print(f"Pass 1 complete: {n_docs} training documents.")
+
+    # Same smoothed IDF as TfidfVectorizer's default
+    tfidf = TfidfTransformer()
+    tfidf.fit(sp.csr_matrix((1, args.n_features)))
+    tfidf.idf_ = np.log((1 + n_docs) / (1 + doc_freq)) + 1.0
+    vectorizer = make_pipeline(hasher, tfidf)
+
+    # Pass 2: incremental training
+    clf = SGDClassifier(loss='log_loss', alpha=args.alpha, random_state=42)
+    rng = np.random.default_rng(42)
+    classes = np.array([0, 1])
+    for epoch in range(args.epochs):
+        confusion = np.zeros((2, 2), dtype=np.int64)
+        for texts, labels, is_test in iter_chunks(args.data, args.chunk_size):
+            X = vectorizer.transform(texts)
+            train_rows = np.flatnonzero(~is_test)
+            if len(train_rows):
+                # Shuffle within the chunk so sorted input does not bias SGD
+                rng.shuffle(train_rows)
+                clf.partial_fit(X[train_rows], labels[train_rows], classes=classes)
+            if is_test.any() and hasattr(clf, 'coef_'):
+                y_true = labels[is_test]
+                y_pred = clf.predict(X[is_test])
+                confusion += np.bincount(y_true * 2 + y_pred, minlength=4).reshape(2, 2)
+        print(f"Epoch {epoch + 1}/{args.epochs}")
+        print_confusion_report(confusion)
+
+    joblib.dump(clf, args.model_out)
+    joblib.dump(vectorizer, args.vectorizer_out)
+    print(f"Streaming model saved to {args.model_out} and vectorizer to {args.vectorizer_out}.")
+
+
+def print_confusion_report(confusion):
+    total = confusion.sum()
+    if total == 0:
+        print("  No held-out rows evaluated.")
+        return
+    for label, name in ((0, 'Fake'), (1, 'Real')):
+        tp = confusion[label, label]
+        predicted = confusion[:, label].sum()
+        actual = confusion[label, :].sum()
+        precision = tp / predicted if predicted else 0.0
+        recall = tp / actual if actual else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        print(f"  {name}: precision={precision:.3f} recall={recall:.3f} f1={f1:.3f} support={actual}")
+    print(f"  accuracy={np.trace(confusion) / total:.3f} on {total} held-out rows")
+
+
+# --- Multi-feature hyperparameter search ---
+# Builds one feature matrix from all feature_columns and cross-validates a grid of
+# vectorizer/classifier settings with GridSearchCV on a process pool (n_jobs=-1 uses
+# every core). The pipeline is given a joblib memory, so a fitted feature
+# transformer is reused across classifier settings for the same fold.
+
+def build_feature_pipeline(cache_dir):
+    features = ColumnTransformer([
+        ('author', OneHotEncoder(handle_unknown='ignore', min_frequency=2), ['author']),
+        ('statement', TfidfVectorizer(stop_words='english', max_features=4000), 'statement'),
+        ('manual_keywords', TfidfVectorizer(token_pattern=r"[^,;]+", max_features=2000), 'manual_keywords'),
+        ('tweet', TfidfVectorizer(stop_words='english', max_features=4000), 'tweet')
+    ])
+    return Pipeline([
+        ('features', features),
+        ('clf', LogisticRegression(max_iter=1000))
+    ], memory=cache_dir)
+
+
+SEARCH_PARAM_GRID = {
+    'features__tweet__max_features': [4000, 20000],
+    'features__tweet__ngram_range': [(1, 1), (1, 2)],
+    'clf__C': [0.1, 1.0, 10.0]
+}
+
+
+def train_search(args):
+    df = pd.read_csv(args.data, usecols=REQUIRED_COLUMNS)
+    df = df.dropna(subset=REQUIRED_COLUMNS)
+    X = df[feature_columns].astype(str)
+    y = df['BinaryNumTarget'].astype(int)
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix='truthlense-search-')
+    try:
+        search = GridSearchCV(
+            build_feature_pipeline(cache_dir),
+            SEARCH_PARAM_GRID,
+            cv=StratifiedKFold(n_splits=args.cv, shuffle=True, random_state=42),
+            scoring='accuracy',
+            n_jobs=args.n_jobs,
+            verbose=1
+        )
+        started = time.perf_counter()
+        search.fit(X_train, y_train)
+        search_seconds = time.perf_counter() - started
+    finally:
+        if not args.cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+    best = search.best_estimator_
+    # The cache directory may be gone; the refit model no longer needs it
+    best.set_params(memory=None)
+    y_pred = best.predict(X_test)
+    print(classification_report(y_test, y_pred))
+
+    cv = search.cv_results_
+    report = {
+        'mode': 'search',
+        'data': args.data,
+        'rows': {'train': int(len(X_train)), 'test': int(len(X_test))},
+        'cv_folds': args.cv,
+        'n_jobs': args.n_jobs,
+        'cpu_count': os.cpu_count(),
+        'search_seconds': round(search_seconds, 3),
+        'best_params': {k: list(v) if isinstance(v, tuple) else v for k, v in search.best_params_.items()},
+        'best_cv_accuracy': round(float(search.best_score_), 4),
+        'test_accuracy': round(float(accuracy_score(y_test, y_pred)), 4),
+        'candidates': [
+            {
+                'params': {k: list(v) if isinstance(v, tuple) else v for k, v in params.items()},
+                'mean_cv_accuracy': round(float(cv['mean_test_score'][i]), 4),
+                'std_cv_accuracy': round(float(cv['std_test_score'][i]), 4),
+                'mean_fit_seconds': round(float(cv['mean_fit_time'][i]), 3),
+                'mean_score_seconds': round(float(cv['mean_score_time'][i]), 3),
+                'rank': int(cv['rank_test_score'][i])
+            }
+            for i, params in enumerate(cv['params'])
+        ]
+    }
+    report['candidates'].sort(key=lambda c: c['rank'])
+
+    joblib.dump(best, args.model_out)
+    with open(args.report_out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Best params: {report['best_params']} (cv accuracy {report['best_cv_accuracy']}, "
+          f"test accuracy {report['test_accuracy']}, search took {report['search_seconds']}s)")
+    print(f"Multi-feature pipeline saved to {args.model_out}; report written to {args.report_out}.")
 
-# Save the model and vectorizer
-joblib.dump(clf, 'model.pkl')
-joblib.dump(vectorizer, 'vectorizer.pkl')
-print("Model and vectorizer saved to disk.")
 
 # Perplexity API prediction example
-def classify_with_perplexity(statement, tweet):
+def classify_with_perplexity(client, statement, tweet):
     prompt = (
         "You are a fake news expert. Statement: '{}'. Tweet: '{}'. "
         "Classify if the tweet shares real or fake news (return 'Real' or 'Fake' with confidence score)."
@@ -64,10 +414,59 @@ def classify_with_perplexity(statement, tweet):
     )
     return response.choices[0].message.content
 
-# Example usage
-sample_row = df.iloc[0]
-perplexity_result = classify_with_perplexity(
-    sample_row['statement'],
-    sample_row['tweet']
-)
-print("Perplexity API result:", perplexity_result)
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Train the TruthLense local fake-news classifier.")
+    parser.add_argument('--mode', choices=['full', 'stream', 'search'], default='full',
+                        help="full: in-memory TF-IDF + LogisticRegression; stream: chunked hashing + SGD for large corpora; "
+                             "search: cross-validated hyperparameter search over all feature columns")
+    parser.add_argument('--data', default=DATASET_PATH, help="Path to the training CSV")
+    parser.add_argument('--model-out', default=None,
+                        help="Defaults to model.pkl (model_multifeature.pkl in search mode)")
+    parser.add_argument('--vectorizer-out', default='vectorizer.pkl')
+    parser.add_argument('--lean-out', default='model_lean',
+                        help="Lean NumPy export of the full-mode model for app.py (empty to skip)")
+    parser.add_argument('--ensemble-out', default='ensemble.json',
+                        help="Calibrated combined-score parameters for app.py, fitted in full mode (empty to skip)")
+    parser.add_argument('--calibration', choices=['platt', 'isotonic'], default='platt',
+                        help="Probability calibration for the ensemble; isotonic needs more held-out rows")
+    parser.add_argument('--llm-verdicts', default=None,
+                        help="history.db or JSONL (claim/text, verdict, confidence) with LLM verdicts for the "
+                             "training claims, to fit the LLM weight")
+    parser.add_argument('--phrases', default=os.getenv('HEURISTICS_PHRASES_PATH') or None,
+                        help="Sensational phrase list for the heuristics feature")
+    parser.add_argument('--chunk-size', type=int, default=100000, help="Rows per chunk in stream mode")
+    parser.add_argument('--n-features', type=int, default=2 ** 20, help="Hashing space size in stream mode")
+    parser.add_argument('--epochs', type=int, default=3, help="Passes of partial_fit in stream mode")
+    parser.add_argument('--alpha', type=float, default=1e-6, help="SGD regularization strength in stream mode")
+    parser.add_argument('--cv', type=int, default=3, help="Cross-validation folds in search mode")
+    parser.add_argument('--n-jobs', type=int, default=-1, help="Worker processes in search mode (-1 = all cores)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Keep fitted feature transformers here between runs in search mode (default: temporary)")
+    parser.add_argument('--report-out', default='search_report.json', help="Timing/accuracy report in search mode")
+    parser.add_argument('--skip-perplexity-example', action='store_true')
+    args = parser.parse_args()
+    if args.model_out is None:
+        args.model_out = 'model_multifeature.pkl' if args.mode == 'search' else 'model.pkl'
+    return args
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.mode == 'stream':
+        train_stream(args)
+    elif args.mode == 'search':
+        train_search(args)
+    else:
+        df = train_full(args)
+
+        if not args.skip_perplexity_example:
+            # Example usage
+            client = Perplexity(api_key=api_key)
+            sample_row = df.iloc[0]
+            perplexity_result = classify_with_perplexity(
+                client,
+                sample_row['statement'],
+                sample_row['tweet']
+            )
+            print("Perplexity API result:", perplexity_result)
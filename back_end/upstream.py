@@ -0,0 +1,207 @@
+import asyncio
+import random
+import threading
+import time
+
+import metrics
+
+# Resilience layer around the Perplexity API, shared by app.py and asgi.py.
+#
+# Every call gets an overall deadline; each attempt gets whatever is left of it (at
+# most attempt_timeout, with a separate connect timeout). Retryable errors (timeouts,
+# connection errors, 408/409/429 and 5xx) are retried with capped exponential backoff
+# and full jitter, as long as the deadline allows. A circuit breaker counts consecutive retryable failures; once
+# it opens, calls fail fast with CircuitOpenError until reset_seconds have passed,
+# then a single probe call decides whether to close it again. Callers treat
+# UpstreamUnavailableError as "degrade to the local model".
+
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+
+class UpstreamUnavailableError(Exception):
+    pass
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    pass
+
+
+def is_retryable(exc):
+    # Imported here (cached after the first call) so importing this module stays cheap
+    from perplexity import APIConnectionError, APIStatusError, APITimeoutError
+    if isinstance(exc, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code in RETRYABLE_STATUS_CODES or exc.status_code >= 500
+    return False
+
+
+class CircuitBreaker:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0):
+        self.failure_threshold = max(1, int(failure_threshold))
+        self.reset_seconds = float(reset_seconds)
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._stats = {'opened': 0, 'short_circuited': 0, 'successes': 0, 'failures': 0}
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = self.HALF_OPEN
+        return self._state
+
+    def allow(self):
+        # True if a call may go upstream now; half-open lets exactly one probe through
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self._stats['short_circuited'] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._stats['successes'] += 1
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._stats['failures'] += 1
+            self._failures += 1
+            state = self._current_state()
+            if state == self.HALF_OPEN or (state == self.CLOSED and self._failures >= self.failure_threshold):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._stats['opened'] += 1
+            self._probe_in_flight = False
+
+    def release(self):
+        # A call ended without a verdict on upstream health (e.g. a 400); free the probe slot
+        with self._lock:
+            self._probe_in_flight = False
+
+    def retry_after(self):
+        with self._lock:
+            if self._current_state() != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['state'] = self._current_state()
+            stats['consecutive_failures'] = self._failures
+            stats['failure_threshold'] = self.failure_threshold
+            stats['reset_seconds'] = self.reset_seconds
+        stats['retry_after_seconds'] = round(self.retry_after(), 3)
+        return stats
+
+
+class ResilientUpstream:
+    def __init__(self, breaker, max_attempts=3, attempt_timeout=30.0, deadline=60.0,
+                 backoff_base=0.5, backoff_max=8.0, connect_timeout=5.0):
+        self.breaker = breaker
+        self.max_attempts = max(1, int(max_attempts))
+        self.attempt_timeout = float(attempt_timeout)
+        self.connect_timeout = float(connect_timeout)
+        self.deadline = float(deadline)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+        self._random = random.Random()
+        self._stats = {'calls': 0, 'retries': 0, 'gave_up': 0}
+        self._lock = threading.Lock()
+
+    def backoff(self, attempt):
+        # Full jitter: uniform in [0, min(max, base * 2^attempt)]
+        return self._random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _before_attempt(self, started):
+        # httpx timeout for the next attempt, or raise if the call cannot go upstream
+        if not self.breaker.allow():
+            metrics.UPSTREAM_SHORT_CIRCUITED.inc()
+            raise CircuitOpenError(
+                f"Upstream circuit is open; retry in {self.breaker.retry_after():.0f}s"
+            )
+        import httpx
+        timeout = max(0.001, min(self.attempt_timeout, self.deadline - (time.monotonic() - started)))
+        return httpx.Timeout(timeout, connect=min(self.connect_timeout, timeout))
+
+    def _after_failure(self, exc, attempt, started):
+        # Seconds to wait before retrying, or raise if this failure is final
+        if not is_retryable(exc):
+            self.breaker.release()
+            raise exc
+        self.breaker.record_failure()
+        delay = self.backoff(attempt)
+        remaining = self.deadline - (time.monotonic() - started)
+        if attempt + 1 >= self.max_attempts or delay >= remaining:
+            self._count('gave_up')
+            raise UpstreamUnavailableError(
+                f"Upstream failed after {attempt + 1} attempt(s): {exc}"
+            ) from exc
+        self._count('retries')
+        metrics.UPSTREAM_RETRIES.inc()
+        return delay
+
+    def call(self, fn):
+        # fn(timeout) performs one upstream attempt
+        self._count('calls')
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            timeout = self._before_attempt(started)
+            try:
+                result = fn(timeout)
+            except Exception as e:
+                time.sleep(self._after_failure(e, attempt, started))
+                continue
+            self.breaker.record_success()
+            return result
+
+    async def call_async(self, fn):
+        # Async twin of call(): fn(timeout) returns a coroutine
+        self._count('calls')
+        started = time.monotonic()
+        for attempt in range(self.max_attempts):
+            timeout = self._before_attempt(started)
+            try:
+                result = await fn(timeout)
+            except asyncio.CancelledError:
+                self.breaker.release()
+                raise
+            except Exception as e:
+                await asyncio.sleep(self._after_failure(e, attempt, started))
+                continue
+            self.breaker.record_success()
+            return result
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({
+            'max_attempts': self.max_attempts,
+            'attempt_timeout_seconds': self.attempt_timeout,
+            'connect_timeout_seconds': self.connect_timeout,
+            'deadline_seconds': self.deadline,
+            'breaker': self.breaker.stats()
+        })
+        return stats
@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+# Punctuation and symbols are folded to whitespace so "5G causes COVID!!" and
+# "5g causes covid" share a cache entry.
+_NON_WORD_RE = re.compile(r"[^\w\s]+", re.UNICODE)
+_WHITESPACE_RE = re.compile(r"\s+", re.UNICODE)
+
+
+def normalize_claim(text):
+    text = unicodedata.normalize('NFKC', text or "").casefold()
+    text = _NON_WORD_RE.sub(' ', text)
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def claim_key(text):
+    return hashlib.sha256(normalize_claim(text).encode('utf-8')).hexdigest()
+
+
+# Content-addressed LLM verdict cache.
+# Entries live in a size-bounded in-memory LRU. When db_path is given every entry
+# is also written to SQLite so the cache survives restarts; a memory miss falls
+# through to disk and promotes the row back into memory.
+class VerdictCache:
+    def __init__(self, max_entries=10000, ttl_seconds=7 * 24 * 3600, db_path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            'hits': 0,
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'expired': 0,
+            'evictions': 0,
+            'stores': 0
+        }
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    def _open_db(self, db_path):
+        directory = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS verdict_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_verdict_cache_last_access"
+            " ON verdict_cache (last_access)"
+        )
+        self._db.execute("DELETE FROM verdict_cache WHERE expires_at <= ?", (time.time(),))
+        self._db.commit()
+
+    def get(self, text):
+        return self.get_by_key(claim_key(text))
+
+    def get_by_key(self, key, record_stats=True):
+        # record_stats=False for a second look within the same request, which must
+        # not count as another lookup in the hit rate
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    if record_stats:
+                        self._stats['hits'] += 1
+                        self._stats['memory_hits'] += 1
+                    return json.loads(value)
+                del self._entries[key]
+                self._stats['expired'] += 1
+                self._delete_from_db(key)
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM verdict_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if expires_at > now:
+                        self._db.execute(
+                            "UPDATE verdict_cache SET last_access = ? WHERE key = ?", (now, key)
+                        )
+                        self._db.commit()
+                        self._insert_memory(key, expires_at, value)
+                        if record_stats:
+                            self._stats['hits'] += 1
+                            self._stats['disk_hits'] += 1
+                        return json.loads(value)
+                    self._stats['expired'] += 1
+                    self._delete_from_db(key)
+
+            if record_stats:
+                self._stats['misses'] += 1
+            return None
+
+    def set(self, text, value, ttl_seconds=None):
+        self.set_by_key(claim_key(text), value, ttl_seconds)
+
+    def set_by_key(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else float(ttl_seconds)
+        now = time.time()
+        expires_at = now + ttl
+        payload = json.dumps(value)
+        with self._lock:
+            self._insert_memory(key, expires_at, payload)
+            self._stats['stores'] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO verdict_cache (key, value, expires_at, last_access)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, payload, expires_at, now)
+                )
+                self._trim_db()
+                self._db.commit()
+
+    def _insert_memory(self, key, expires_at, payload):
+        self._entries[key] = (expires_at, payload)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _trim_db(self):
+        # Keep the on-disk tier bounded too, dropping the least recently used rows.
+        (count,) = self._db.execute("SELECT COUNT(*) FROM verdict_cache").fetchone()
+        overflow = count - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM verdict_cache WHERE key IN ("
+                " SELECT key FROM verdict_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def _delete_from_db(self, key):
+        if self._db is not None:
+            self._db.execute("DELETE FROM verdict_cache WHERE key = ?", (key,))
+            self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM verdict_cache")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['size'] = len(self._entries)
+            stats['max_entries'] = self.max_entries
+            stats['ttl_seconds'] = self.ttl_seconds
+            stats['persistent'] = self._db is not None
+            if self._db is not None:
+                (stats['disk_size'],) = self._db.execute(
+                    "SELECT COUNT(*) FROM verdict_cache"
+                ).fetchone()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        return stats